@@ -2,22 +2,34 @@ import os
 import json
 import uuid
 import base64
+import io
 from datetime import datetime, timedelta
 import random
+import math
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, render_template, make_response, url_for, send_from_directory
+from flask import Flask, request, jsonify, render_template, url_for, send_from_directory, send_file, Response, stream_with_context
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import simpleSplit
-from PIL import Image, ImageDraw, ImageFont
-import traceback
+from urllib3.connection import HTTPConnection
+import socket
+import threading
+import sqlite3
+from functools import lru_cache, wraps
+import hashlib
+import heapq
+import atexit
+import importlib
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+from collections import OrderedDict, deque
+import logging
+import bisect
+from contextlib import contextmanager
 import mimetypes
 import time
-from gtts import gTTS
 import re
+import zipfile
+import weakref
 
 load_dotenv()
 app = Flask(__name__)
@@ -28,99 +40,1011 @@ PROOF_DIR = os.path.abspath(os.path.join(app.root_path, 'doc', 'proofs'))
 # Define AUDIO_OUTPUT_DIR in the project root
 AUDIO_OUTPUT_DIR = os.path.abspath(os.path.join(app.root_path, 'audio_files'))
 
-# Define SAVED_EXCUSES_FILE in the project root
+# Define SAVED_EXCUSES_FILE in the project root (legacy JSON store, migrated into SAVED_EXCUSES_DB on startup)
 SAVED_EXCUSES_FILE = os.path.abspath(os.path.join(app.root_path, 'saved_excuses.json'))
+SAVED_EXCUSES_DB = os.path.abspath(os.getenv("SAVED_EXCUSES_DB", os.path.join(app.root_path, 'saved_excuses.db')))
+# Shared, persistent state for generated excuses, feedback and insight counters
+STATE_DB = os.path.abspath(os.getenv("STATE_DB", os.path.join(app.root_path, 'excusify_state.db')))
+EXCUSE_RETENTION_DAYS = float(os.getenv("EXCUSE_RETENTION_DAYS", "30"))
+EXCUSE_RETENTION_MAX_ROWS = int(os.getenv("EXCUSE_RETENTION_MAX_ROWS", "100000"))
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "2"))
+SAVED_EXCUSES_PAGE_SIZE = int(os.getenv("SAVED_EXCUSES_PAGE_SIZE", "20"))
+SAVED_EXCUSES_MAX_PAGE_SIZE = int(os.getenv("SAVED_EXCUSES_MAX_PAGE_SIZE", "200"))
+
+# Leveled logging. Per-request detail is DEBUG and formatted lazily, so it costs one level check when disabled.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+logger = logging.getLogger("excusify")
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(
+        JsonLogFormatter() if LOG_FORMAT == "json"
+        else logging.Formatter("%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s")
+    )
+    logger.addHandler(_log_handler)
+    logger.propagate = False
+logger.setLevel(LOG_LEVEL)
+
+logger.info(
+    "paths root=%s proof_dir=%s audio_dir=%s saved_excuses_file=%s saved_excuses_db=%s state_db=%s",
+    app.root_path, PROOF_DIR, AUDIO_OUTPUT_DIR, SAVED_EXCUSES_FILE, SAVED_EXCUSES_DB, STATE_DB
+)
+
+class _ShardOwner:
+    # Lives in a thread's local storage; it is dropped when the thread exits
+    __slots__ = ("__weakref__",)
+
+
+class ShardedCounter:
+    # Each thread increments its own dict, so hot-path updates never wait on a lock;
+    # readers merge the per-thread shards. Shards of exited threads are folded into
+    # _base, so the shard count follows live threads rather than requests served.
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = {}
+        self._base = {}
+        self._retired = deque()
+        self._registry_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            owner = self._local.owner = _ShardOwner()
+            shard_id = id(shard)
+            # Only queues the shard: finalizers may run while this thread holds _registry_lock
+            weakref.finalize(owner, self._retired.append, shard_id)
+            with self._registry_lock:
+                self._shards[shard_id] = shard
+                self._fold_retired()
+        return shard
+
+    def _fold_retired(self):
+        # Caller holds _registry_lock; a retired shard is no longer written to
+        while self._retired:
+            shard = self._shards.pop(self._retired.popleft(), None)
+            for key, value in list((shard or {}).items()):
+                self._base[key] = self._base.get(key, 0) + value
+
+    def incr(self, key, amount=1):
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._registry_lock:
+            self._fold_retired()
+            shards = list(self._shards.values())
+            totals = dict(self._base)
+        for shard in shards:
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def get(self, key):
+        return self.snapshot().get(key, 0)
+
+
+# Prometheus-style metrics exported at /metrics. Metric families are declared once below;
+# collectors add gauges derived from component stats at scrape time.
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class MetricsRegistry:
+    # Samples land in per-thread shards like every other counter here, so instrumenting a hot
+    # path is a dict update; /metrics merges the shards and renders the text format
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._families = {}
+        self._values = ShardedCounter()
+        self._collectors = []
+
+    def counter(self, name, help_text):
+        self._families[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_LATENCY_BUCKETS):
+        self._families[name] = ("histogram", help_text, tuple(buckets))
+
+    def add_collector(self, collector):
+        # collector() yields (name, kind, help_text, labels, value) tuples
+        self._collectors.append(collector)
+
+    def inc(self, name, amount=1, **labels):
+        self._values.incr((name, tuple(sorted(labels.items())), None), amount)
+
+    def observe(self, name, value, **labels):
+        labels = tuple(sorted(labels.items()))
+        buckets = self._families[name][2]
+        self._values.incr((name, labels, bisect.bisect_left(buckets, value)))
+        self._values.incr((name, labels, "sum"), value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        escaped = (
+            f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+            for key, value in labels
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def _header(self, lines, full_name, kind, help_text):
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {kind}")
+
+    def render(self):
+        series = {}
+        for (name, labels, slot), value in self._values.snapshot().items():
+            series.setdefault(name, {}).setdefault(labels, {})[slot] = value
+
+        lines = []
+        for name, (kind, help_text, buckets) in self._families.items():
+            full_name = f"{self.namespace}_{name}"
+            self._header(lines, full_name, kind, help_text)
+            for labels, slots in sorted(series.get(name, {}).items()):
+                if kind != "histogram":
+                    lines.append(f"{full_name}{self._format_labels(labels)} {slots.get(None, 0)}")
+                    continue
+                cumulative = 0
+                for index, bound in enumerate(buckets + (float("inf"),)):
+                    cumulative += slots.get(index, 0)
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{full_name}_bucket{self._format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{full_name}_sum{self._format_labels(labels)} {slots.get('sum', 0)}")
+                lines.append(f"{full_name}_count{self._format_labels(labels)} {cumulative}")
+
+        collected = {}
+        for collector in list(self._collectors):
+            try:
+                for name, kind, help_text, labels, value in collector():
+                    family = collected.setdefault(name, (kind, help_text, []))
+                    family[2].append((tuple(sorted(labels.items())), value))
+            except Exception:
+                logger.exception("metrics collector failed collector=%s", getattr(collector, "__qualname__", collector))
+        for name, (kind, help_text, samples) in collected.items():
+            full_name = f"{self.namespace}_{name}"
+            self._header(lines, full_name, kind, help_text)
+            for labels, value in samples:
+                lines.append(f"{full_name}{self._format_labels(labels)} {int(value) if isinstance(value, bool) else value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry("excusify")
+metrics.histogram("http_request_duration_seconds", "Time to produce a response, by endpoint and status.")
+metrics.histogram("inference_duration_seconds", "Upstream inference API calls, including urllib3 retries, by outcome.")
+metrics.histogram("inference_first_token_seconds", "Time from sending a streaming inference call to its first token.")
+metrics.histogram("cleaning_duration_seconds", "Post-processing of raw model output.", buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01))
+metrics.histogram("proof_render_duration_seconds", "Rendering a proof document, by format.")
+metrics.histogram("tts_duration_seconds", "Speech synthesis, by engine.")
+metrics.histogram("file_serve_duration_seconds", "Preparing a stored proof or audio file response, by kind.")
+metrics.counter("upstream_retries_total", "Inference API retries performed by urllib3, by reason.")
+metrics.counter("excuse_requests_total", "Excuse generations, by source (cache, pool, model or local) and outcome.")
+metrics.histogram("excuse_pool_refill_lag_seconds", "Time from a pooled key falling below its target depth to being full again.", buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+metrics.counter("errors_total", "Failures, by stage.")
+
+
+# Quotas for generated files; both directories are swept periodically and trimmed oldest-access first
+STORAGE_SWEEP_INTERVAL = float(os.getenv("STORAGE_SWEEP_INTERVAL", "300"))
+PROOF_STORE_MAX_MB = float(os.getenv("PROOF_STORE_MAX_MB", "512"))
+PROOF_STORE_MAX_FILES = int(os.getenv("PROOF_STORE_MAX_FILES", "20000"))
+PROOF_STORE_TTL = float(os.getenv("PROOF_STORE_TTL", "86400"))
+AUDIO_STORE_MAX_MB = float(os.getenv("AUDIO_STORE_MAX_MB", "256"))
+AUDIO_STORE_MAX_FILES = int(os.getenv("AUDIO_STORE_MAX_FILES", "20000"))
+AUDIO_STORE_TTL = float(os.getenv("AUDIO_STORE_TTL", "604800"))
+
+
+class FileStore:
+    # Files keep flat public names but live in root/<2-char shard>/ to keep directory listings small.
+    # Shard directories are never removed, since writers create them before they open their file.
+    TEMP_SUFFIX = ".tmp"
+    # Files still being written and status markers beside stored files; never served or counted toward quota
+    MARKER_SUFFIXES = (TEMP_SUFFIX, ".pending", ".failed")
+
+    def __init__(self, root, max_bytes, max_files, ttl, wakeup=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._approx_bytes = 0
+        self._approx_files = 0
+        self._wakeup = wakeup
+        self.evicted = 0
+        self.expired = 0
+        self.last_sweep = None
+
+    @staticmethod
+    def is_valid_name(filename):
+        return bool(filename) and os.path.basename(filename) == filename and not filename.startswith('.')
+
+    def shard_dir(self, filename):
+        return os.path.join(self.root, hashlib.md5(filename.encode("utf-8")).hexdigest()[:2])
+
+    def path_for(self, filename):
+        shard = self.shard_dir(filename)
+        os.makedirs(shard, exist_ok=True)
+        return os.path.join(shard, filename)
+
+    def resolve(self, filename):
+        if not self.is_valid_name(filename) or filename.endswith(self.MARKER_SUFFIXES):
+            return None
+        path = os.path.join(self.shard_dir(filename), filename)
+        if os.path.isfile(path):
+            return path
+        # Files written before sharding was introduced still sit at the top level
+        legacy_path = os.path.join(self.root, filename)
+        return legacy_path if os.path.isfile(legacy_path) else None
+
+    def write(self, filename, data):
+        # Writes bytes under a temp name first so a partial file is never served, then counts them
+        path = self.path_for(filename)
+        tmp_path = f"{path}.{uuid.uuid4().hex}{self.TEMP_SUFFIX}"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.register(path)
+        return path
+
+    def touch(self, path):
+        # Record the access time ourselves so LRU works on relatime/noatime mounts too
+        try:
+            st = os.stat(path)
+            os.utime(path, (time.time(), st.st_mtime))
+        except OSError:
+            pass
+
+    def register(self, path):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self._approx_bytes += size
+            self._approx_files += 1
+            over_quota = self._approx_bytes > self.max_bytes or self._approx_files > self.max_files
+        if over_quota and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _scan(self):
+        entries = []
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_size, st.st_mtime, st.st_atime))
+        return entries
+
+    def discard(self, filename):
+        path = self.resolve(filename)
+        return path is not None and self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def sweep(self):
+        now = time.time()
+        kept = []
+        for path, size, mtime, atime in self._scan():
+            if now - mtime > self.ttl and self._remove(path):
+                self.expired += 1
+            elif not path.endswith(self.MARKER_SUFFIXES):
+                # Files still being written and markers are left alone until their TTL marks them abandoned
+                kept.append((path, size, mtime, atime))
+        total_bytes = sum(entry[1] for entry in kept)
+        # Trim to 90% of the quota so a busy store is not swept on every write
+        target_bytes = self.max_bytes * 0.9
+        target_files = int(self.max_files * 0.9)
+        if total_bytes > self.max_bytes or len(kept) > self.max_files:
+            kept.sort(key=lambda entry: entry[3])
+            while kept and (total_bytes > target_bytes or len(kept) > target_files):
+                path, size, _mtime, _atime = kept.pop(0)
+                if self._remove(path):
+                    self.evicted += 1
+                    total_bytes -= size
+        with self._lock:
+            self._approx_bytes = total_bytes
+            self._approx_files = len(kept)
+        self.last_sweep = now
+
+    def stats(self):
+        with self._lock:
+            return {
+                "root": self.root,
+                "approx_bytes": self._approx_bytes,
+                "approx_files": self._approx_files,
+                "max_bytes": self.max_bytes,
+                "max_files": self.max_files,
+                "ttl_seconds": self.ttl,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "last_sweep": self.last_sweep
+            }
+
+
+_storage_wakeup = threading.Event()
+proof_store = FileStore(PROOF_DIR, PROOF_STORE_MAX_MB * 1024 * 1024, PROOF_STORE_MAX_FILES, PROOF_STORE_TTL, _storage_wakeup)
+audio_store = FileStore(AUDIO_OUTPUT_DIR, AUDIO_STORE_MAX_MB * 1024 * 1024, AUDIO_STORE_MAX_FILES, AUDIO_STORE_TTL, _storage_wakeup)
+file_stores = (proof_store, audio_store)
+# Periodic housekeeping run by the sweeper thread; other subsystems append their own cleanup here
+maintenance_tasks = [store.sweep for store in file_stores]
+# Run in a child process after fork(), e.g. gunicorn workers forked from a --preload master. Threads are not
+# inherited and SQLite connections must not be shared, so subsystems append hooks that restart or reopen them.
+after_fork_hooks = []
+
+
+def _run_after_fork_hooks():
+    for hook in after_fork_hooks:
+        try:
+            hook()
+        except Exception:
+            logger.exception("after-fork hook failed hook=%s", getattr(hook, '__qualname__', hook))
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_run_after_fork_hooks)
+
+# Starters for the background threads (sweeper, flusher, pool refiller). They run with the first request a
+# process serves, not at import, so tools and tests that import app start no threads; forked workers start
+# their own the same way.
+background_tasks = []
+_background_started = False
+_background_lock = threading.Lock()
+
+
+def start_background_tasks():
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+        for start in background_tasks:
+            try:
+                start()
+            except Exception:
+                logger.exception("failed to start background task task=%s", getattr(start, '__qualname__', start))
+
+
+def _reset_background_tasks():
+    global _background_started, _background_lock
+    _background_started = False
+    _background_lock = threading.Lock()
+
+
+after_fork_hooks.append(_reset_background_tasks)
 
-# Ensure directories exist at startup
-os.makedirs(PROOF_DIR, exist_ok=True)
-os.makedirs(AUDIO_OUTPUT_DIR, exist_ok=True)
 
-print(f"Flask App Root Path: {app.root_path}")
-print(f"Absolute PROOF_DIR: {PROOF_DIR}")
-print(f"Absolute AUDIO_OUTPUT_DIR: {AUDIO_OUTPUT_DIR}")
-print(f"Absolute SAVED_EXCUSES_FILE: {SAVED_EXCUSES_FILE}")
+@app.before_request
+def _ensure_background_tasks():
+    if not _background_started:
+        start_background_tasks()
+
+
+def _storage_sweeper():
+    while True:
+        for task in list(maintenance_tasks):
+            try:
+                task()
+            except Exception:
+                metrics.inc("errors_total", stage="maintenance")
+                logger.exception("maintenance task failed task=%s", getattr(task, '__qualname__', task))
+        # Sleep until the next interval, or wake early when a store reports it has gone over quota
+        _storage_wakeup.wait(STORAGE_SWEEP_INTERVAL)
+        _storage_wakeup.clear()
+
+
+def _start_storage_sweeper():
+    threading.Thread(target=_storage_sweeper, name="storage-sweeper", daemon=True).start()
+
+
+background_tasks.append(_start_storage_sweeper)
+
+
+# Proof files are immutable once written, so clients and CDNs may cache them for their whole lifetime
+PROOF_CACHE_MAX_AGE = int(os.getenv("PROOF_CACHE_MAX_AGE", str(int(PROOF_STORE_TTL))))
+# Audio lives for AUDIO_STORE_TTL, so it must not be cached for longer than that
+AUDIO_CACHE_MAX_AGE = int(os.getenv("AUDIO_CACHE_MAX_AGE", str(int(AUDIO_STORE_TTL))))
+PROOF_MIMETYPES = {'.pdf': 'application/pdf', '.png': 'image/png', '.json': 'application/json'}
 
 # Route to serve files from the 'doc/proofs' directory
 @app.route('/proofs/<path:filename>')
 def serve_proof(filename):
-    if not os.path.isdir(PROOF_DIR):
-        print(f"Error: Proof directory not found at {PROOF_DIR}")
-        return "Internal Server Error: Proofs directory missing.", 500
-    
-    full_filepath = os.path.join(PROOF_DIR, filename)
-    print(f"Attempting to serve file: {filename} from full path: {full_filepath}")
-    
-    if not os.path.exists(full_filepath):
-        print(f"Error: Requested file not found on disk at {full_filepath}")
-        return "Not Found", 404
+    full_filepath = proof_store.resolve(filename)
+    if full_filepath is None:
+        logger.debug("proof not on disk (expired, evicted or never created) filename=%s", filename)
+        return jsonify({"error": "This proof is no longer available. Please generate it again."}), 404
+    proof_store.touch(full_filepath)
 
     try:
-        mimetype, _ = mimetypes.guess_type(filename)
+        mimetype = PROOF_MIMETYPES.get(os.path.splitext(filename)[1].lower())
         if mimetype is None:
-            if filename.endswith('.pdf'):
-                mimetype = 'application/pdf'
-            elif filename.endswith('.png'):
-                mimetype = 'image/png'
-            elif filename.endswith('.json'):
-                mimetype = 'application/json'
-            else:
-                mimetype = 'application/octet-stream'
-
-        with open(full_filepath, 'rb') as f:
-            file_content = f.read()
-
-        response = make_response(file_content)
-        response.headers['Content-Type'] = mimetype
-        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-        response.headers["Pragma"] = "no-cache"
-        response.headers["Expires"] = "0"
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        # send_file streams via the server's file wrapper (sendfile where available) and
+        # handles ETag/Last-Modified, If-None-Match/If-Modified-Since and Range requests
+        with metrics.timer("file_serve_duration_seconds", kind="proof"):
+            response = send_file(
+                full_filepath,
+                mimetype=mimetype,
+                as_attachment=True,
+                download_name=filename,
+                conditional=True,
+                etag=True,
+                max_age=PROOF_CACHE_MAX_AGE
+            )
+        response.cache_control.public = True
+        response.cache_control.immutable = True
         response.headers["X-Content-Type-Options"] = "nosniff"
-
-        print(f"Successfully prepared response headers for {filename}. Mimetype: {mimetype}, Disposition: {response.headers['Content-Disposition']}")
         return response
-    except Exception as e:
-        print(f"Error serving file {filename} from {PROOF_DIR}: {e}")
-        traceback.print_exc()
+    except FileNotFoundError:
+        # Evicted between resolve() and open()
+        return jsonify({"error": "This proof is no longer available. Please generate it again."}), 404
+    except Exception:
+        metrics.inc("errors_total", stage="file_serve")
+        logger.exception("failed to serve proof filename=%s proof_dir=%s", filename, PROOF_DIR)
         return "Internal Server Error: Failed to serve file.", 500
 
 
 #SERVING AUDIO FILES FROM THE NEW DIRECTORY
 @app.route('/audio_files/<path:filename>')
 def serve_audio_file(filename):
-    return send_from_directory(AUDIO_OUTPUT_DIR, filename)
+    full_filepath = audio_store.resolve(filename)
+    if full_filepath is None:
+        return jsonify({"error": "This audio file is no longer available. Please request it again."}), 404
+    audio_store.touch(full_filepath)
+    # Audio names are content hashes, so the same URL always means the same bytes
+    with metrics.timer("file_serve_duration_seconds", kind="audio"):
+        return send_from_directory(os.path.dirname(full_filepath), filename, max_age=AUDIO_CACHE_MAX_AGE)
 
 HUGGINGFACE_API_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN")
-# Using the specific Mixtral model URL
-API_URL = "https://api-inference.huggingface.co/models/mistralai/Mixtral-8x7B-Instruct-v0.1"
+# Using the specific Mixtral model URL; HF_API_URL points it elsewhere (e.g. the stub in bench/stub_server.py)
+API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models/mistralai/Mixtral-8x7B-Instruct-v0.1")
 VALID_SCENARIOS = ["late for work", "missed class", "forgot anniversary", "missed deadline", "didn't text back"]
 
-insights_db = {
-    "frequent_scenarios": {},
-    "daily_counts": {},
-    "excuse_feedback": {}
+def open_sqlite(db_path):
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteStore:
+    # Thread-local connections to one SQLite file. The file and its tables are created by the first
+    # connection rather than by the constructor, so importing app does not touch the disk.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _create_schema(self, conn):
+        pass
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = open_sqlite(self.db_path)
+            if not self._schema_ready:
+                with self._schema_lock:
+                    if not self._schema_ready:
+                        self._create_schema(conn)
+                        self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def reset_after_fork(self):
+        # Connections and locks copied from the parent process must not be used here
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+
+
+class StateStore(SQLiteStore):
+    # Generated excuses, feedback and insight counters shared by every worker process through one SQLite file.
+    # Excuse text is stored once in excuse_texts; excuse rows keep a 16-byte id and a text reference.
+    def __init__(self, db_path, retention_days, max_excuses, top_k=5, flush_interval=2.0):
+        super().__init__(db_path)
+        self.flush_interval = flush_interval
+        # Insight counters are buffered per thread and flushed as deltas, so /generate does not
+        # contend on SQLite's write lock for three counter rows on every request
+        self.pending = ShardedCounter()
+        self._flushed = {}
+        self._flush_lock = threading.Lock()
+        self.retention_seconds = retention_days * 86400
+        self.max_excuses = max_excuses
+        self.top_k = top_k
+        self.pruned = 0
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS excuse_texts (
+                    id INTEGER PRIMARY KEY, text TEXT NOT NULL UNIQUE,
+                    effective_count INTEGER NOT NULL DEFAULT 0, total_feedback INTEGER NOT NULL DEFAULT 0,
+                    scenario TEXT, language TEXT);
+                CREATE INDEX IF NOT EXISTS idx_texts_ratio ON excuse_texts
+                    ((CAST(effective_count AS REAL) / total_feedback) DESC, id) WHERE total_feedback > 0;
+                CREATE TABLE IF NOT EXISTS excuses (
+                    id BLOB PRIMARY KEY, text_id INTEGER NOT NULL, scenario TEXT, user_role TEXT,
+                    recipient TEXT, believability TEXT, created_at INTEGER NOT NULL,
+                    effective_count INTEGER NOT NULL DEFAULT 0, total_feedback INTEGER NOT NULL DEFAULT 0);
+                CREATE INDEX IF NOT EXISTS idx_excuses_created_at ON excuses (created_at);
+                CREATE INDEX IF NOT EXISTS idx_excuses_text_id ON excuses (text_id);
+                CREATE TABLE IF NOT EXISTS scenario_counts (scenario TEXT PRIMARY KEY, count INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS daily_counts (day TEXT PRIMARY KEY, count INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS hour_counts (hour INTEGER PRIMARY KEY, count INTEGER NOT NULL);
+            """)
+            # Databases created before texts carried their scenario and language
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(excuse_texts)")}
+            for column in ("scenario", "language"):
+                if column not in columns:
+                    try:
+                        conn.execute(f"ALTER TABLE excuse_texts ADD COLUMN {column} TEXT")
+                    except sqlite3.OperationalError:
+                        # Added by another worker in the meantime
+                        pass
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_texts_scenario_language ON excuse_texts (scenario, language) "
+                "WHERE total_feedback > 0"
+            )
+
+    @staticmethod
+    def _id_bytes(excuse_id):
+        try:
+            return uuid.UUID(str(excuse_id)).bytes
+        except ValueError:
+            return None
+
+    COUNTER_TABLES = {"scenario": ("scenario_counts", "scenario"), "day": ("daily_counts", "day"), "hour": ("hour_counts", "hour")}
+
+    def _unflushed(self):
+        # Caller holds _flush_lock
+        deltas = {}
+        for key, total in self.pending.snapshot().items():
+            delta = total - self._flushed.get(key, 0)
+            if delta:
+                deltas[key] = delta
+        return deltas
+
+    def flush(self):
+        with self._flush_lock:
+            deltas = self._unflushed()
+            if not deltas:
+                return
+            with self._connect() as conn:
+                for (kind, value), delta in deltas.items():
+                    table, column = self.COUNTER_TABLES[kind]
+                    conn.execute(
+                        f"INSERT INTO {table} ({column}, count) VALUES (?, ?) ON CONFLICT({column}) DO UPDATE SET count = count + excluded.count",
+                        (value, delta)
+                    )
+            for key, delta in deltas.items():
+                self._flushed[key] = self._flushed.get(key, 0) + delta
+
+    def reset_after_fork(self):
+        super().reset_after_fork()
+        self._flush_lock = threading.Lock()
+
+    def run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                metrics.inc("errors_total", stage="state_flush")
+                logger.exception("failed to flush insight counters db=%s", self.db_path)
+
+    def _counts(self, kind):
+        # Flushed totals from SQLite (all workers) plus this process's unflushed deltas
+        table, column = self.COUNTER_TABLES[kind]
+        with self._flush_lock:
+            counts = {row[0]: row[1] for row in self._connect().execute(f"SELECT {column}, count FROM {table}")}
+            for (pending_kind, value), delta in self._unflushed().items():
+                if pending_kind == kind:
+                    counts[value] = counts.get(value, 0) + delta
+        return counts
+
+    def record_excuse(self, excuse_id, excuse_text, scenario, user_role, recipient, believability, when, language=None):
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO excuse_texts (text, scenario, language) VALUES (?, ?, ?)", (excuse_text, scenario, language))
+            text_id = conn.execute("SELECT id FROM excuse_texts WHERE text = ?", (excuse_text,)).fetchone()[0]
+            conn.execute(
+                "INSERT INTO excuses (id, text_id, scenario, user_role, recipient, believability, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (uuid.UUID(excuse_id).bytes, text_id, scenario, user_role, recipient, str(believability), int(when.timestamp()))
+            )
+        self.pending.incr(("scenario", scenario))
+        self.pending.incr(("day", when.strftime("%Y-%m-%d")))
+        self.pending.incr(("hour", when.hour))
+
+    def record_feedback(self, excuse_id, is_effective):
+        key = self._id_bytes(excuse_id)
+        if key is None:
+            return None
+        effective = 1 if is_effective else 0
+        conn = self._connect()
+        with conn:
+            # BEGIN IMMEDIATE takes the write lock up front so the two updates and the read are one atomic step
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT text_id FROM excuses WHERE id = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE excuses SET effective_count = effective_count + ?, total_feedback = total_feedback + 1 WHERE id = ?",
+                (effective, key)
+            )
+            conn.execute(
+                "UPDATE excuse_texts SET effective_count = effective_count + ?, total_feedback = total_feedback + 1 WHERE id = ?",
+                (effective, row["text_id"])
+            )
+            feedback = conn.execute("SELECT effective_count, total_feedback FROM excuses WHERE id = ?", (key,)).fetchone()
+        return {"effective_count": feedback["effective_count"], "total_feedback": feedback["total_feedback"]}
+
+    def top_excuses(self):
+        # Served straight from the partial expression index, so the cost is O(K) whatever the history size
+        rows = self._connect().execute(
+            "SELECT text, effective_count, total_feedback FROM excuse_texts WHERE total_feedback > 0 "
+            "ORDER BY (CAST(effective_count AS REAL) / total_feedback) DESC, id LIMIT ?",
+            (self.top_k,)
+        )
+        return [{"excuse_text": r["text"], "effective_count": r["effective_count"], "total_feedback": r["total_feedback"]} for r in rows]
+
+    def well_rated(self, scenario, language, min_feedback, min_ratio, limit):
+        rows = self._connect().execute(
+            "SELECT text FROM excuse_texts WHERE total_feedback > 0 AND total_feedback >= ? AND scenario = ? AND language = ? "
+            "AND CAST(effective_count AS REAL) / total_feedback >= ? "
+            "ORDER BY (CAST(effective_count AS REAL) / total_feedback) DESC, id LIMIT ?",
+            (max(1, min_feedback), scenario, language, min_ratio, limit)
+        )
+        return [row["text"] for row in rows]
+
+    def frequent_scenarios(self):
+        top = heapq.nlargest(self.top_k, self._counts("scenario").items(), key=lambda item: item[1])
+        return [{"scenario": scenario, "count": count} for scenario, count in top]
+
+    def total_generated(self):
+        return sum(self._counts("hour").values())
+
+    def busiest_hour(self):
+        hour_counts = self._counts("hour")
+        if not hour_counts:
+            return None
+        return min(hour_counts, key=lambda hour: (-hour_counts[hour], hour))
+
+    def prune(self):
+        cutoff = int(time.time() - self.retention_seconds)
+        with self._connect() as conn:
+            removed = conn.execute("DELETE FROM excuses WHERE created_at < ?", (cutoff,)).rowcount
+            overflow = conn.execute("SELECT COUNT(*) FROM excuses").fetchone()[0] - self.max_excuses
+            if overflow > 0:
+                removed += conn.execute(
+                    "DELETE FROM excuses WHERE rowid IN (SELECT rowid FROM excuses ORDER BY created_at LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+            # Keep texts that carry feedback for the rankings; drop the rest once no excuse refers to them
+            conn.execute(
+                "DELETE FROM excuse_texts WHERE total_feedback = 0 "
+                "AND NOT EXISTS (SELECT 1 FROM excuses WHERE excuses.text_id = excuse_texts.id)"
+            )
+        self.pruned += removed
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            "db_path": self.db_path,
+            "excuses": conn.execute("SELECT COUNT(*) FROM excuses").fetchone()[0],
+            "excuse_texts": conn.execute("SELECT COUNT(*) FROM excuse_texts").fetchone()[0],
+            "max_excuses": self.max_excuses,
+            "retention_days": self.retention_seconds / 86400,
+            "pruned": self.pruned
+        }
+
+
+state_store = StateStore(STATE_DB, EXCUSE_RETENTION_DAYS, EXCUSE_RETENTION_MAX_ROWS, flush_interval=STATE_FLUSH_INTERVAL)
+maintenance_tasks.append(state_store.prune)
+
+
+def _start_state_flusher():
+    threading.Thread(target=state_store.run_flusher, name="state-flusher", daemon=True).start()
+
+
+background_tasks.append(_start_state_flusher)
+after_fork_hooks.append(state_store.reset_after_fork)
+atexit.register(state_store.flush)
+
+LANGUAGE_MAP = {
+    "en": "English", "es": "Spanish", "fr": "French", "de": "German",
+    "it": "Italian", "pt": "Portuguese", "hi": "Hindi", "bn": "Bengali"
 }
 
-excuses_db = {}
+EMPTY_EXCUSE_MESSAGE = "Error generating excuse, please try again later."
+
+# Limits for /generate_batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Connection pool settings for the inference API, overridable per deployment
+HF_POOL_CONNECTIONS = int(os.getenv("HF_POOL_CONNECTIONS", "4"))
+HF_POOL_MAXSIZE = int(os.getenv("HF_POOL_MAXSIZE", "16"))
+HF_POOL_BLOCK = os.getenv("HF_POOL_BLOCK", "false").lower() in ("1", "true", "yes")
+HF_KEEPALIVE = os.getenv("HF_KEEPALIVE", "true").lower() in ("1", "true", "yes")
+HF_CONNECT_TIMEOUT = float(os.getenv("HF_CONNECT_TIMEOUT", "3.05"))
+HF_READ_TIMEOUT = float(os.getenv("HF_READ_TIMEOUT", "30"))
+# Retries within one inference call. Sustained failures are left to the circuit breaker and the adaptive
+# limiter, and 429s are never retried, since retrying a rate-limited upstream only adds load to it.
+HF_MAX_RETRIES = int(os.getenv("HF_MAX_RETRIES", "1"))
+HF_RETRY_BACKOFF = float(os.getenv("HF_RETRY_BACKOFF", "0.25"))
+
+
+class CountingRetry(Retry):
+    # urllib3 calls increment() once per retry it is about to perform
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        reason = f"http_{response.status}" if response is not None else type(error).__name__ if error else "unknown"
+        metrics.inc("upstream_retries_total", reason=reason)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        if HF_KEEPALIVE:
+            kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+_hf_session = None
+_hf_adapter = None
+_hf_session_lock = threading.Lock()
+
+
+def get_hf_session():
+    # One session per process, shared by every inference call so TCP/TLS connections are reused
+    global _hf_session, _hf_adapter
+    if _hf_session is None:
+        with _hf_session_lock:
+            if _hf_session is None:
+                session = requests.Session()
+                retries = CountingRetry(
+                    total=HF_MAX_RETRIES,
+                    backoff_factor=HF_RETRY_BACKOFF,
+                    backoff_max=2,
+                    status_forcelist=[500, 502, 503, 504],
+                    respect_retry_after_header=False
+                )
+                adapter = KeepAliveHTTPAdapter(
+                    pool_connections=HF_POOL_CONNECTIONS,
+                    pool_maxsize=HF_POOL_MAXSIZE,
+                    pool_block=HF_POOL_BLOCK,
+                    max_retries=retries
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "Authorization": f"Bearer {HUGGINGFACE_API_TOKEN}",
+                    "Content-Type": "application/json"
+                })
+                _hf_adapter = adapter
+                _hf_session = session
+    return _hf_session
+
+
+def _reset_hf_session():
+    # Pooled sockets belong to the parent process; each worker opens its own
+    global _hf_session, _hf_adapter, _hf_session_lock
+    _hf_session = None
+    _hf_adapter = None
+    _hf_session_lock = threading.Lock()
+
+
+after_fork_hooks.append(_reset_hf_session)
+
+
+def get_hf_pool_stats():
+    stats = {
+        "pool_connections": HF_POOL_CONNECTIONS,
+        "pool_maxsize": HF_POOL_MAXSIZE,
+        "pool_block": HF_POOL_BLOCK,
+        "keepalive": HF_KEEPALIVE,
+        "connect_timeout": HF_CONNECT_TIMEOUT,
+        "read_timeout": HF_READ_TIMEOUT,
+        "hosts": {}
+    }
+    if _hf_adapter is None:
+        return stats
+    pools = _hf_adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats["hosts"][f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+            "connections_opened": pool.num_connections,
+            "requests_sent": pool.num_requests,
+            "available_slots": pool.pool.qsize() if pool.pool is not None else 0,
+            "maxsize": pool.pool.maxsize if pool.pool is not None else HF_POOL_MAXSIZE
+        }
+    return stats
+
+
+# Post-processing for model output. Patterns are compiled once at import, per language and proof type.
+BASE_UNDESIRED_PREFIXES = [
+    "here's an excuse:",
+    "translation:",
+    "english:",
+    "spanish:",
+    "french:",
+    "german:",
+    "italian:",
+    "portuguese:",
+    "hindi:",
+    "bengali:",
+    "in english:",
+    "here's the excuse:",
+    "the excuse is:",
+    "your excuse:",
+    "excuse:"
+]
+BASE_TRANSLATION_LABELS = ["Translation", "English", "Spanish", "French", "German", "Italian", "Portuguese", "Hindi", "Bengali"]
+
+# Labels the model tends to use when it answers in the target language itself
+LANGUAGE_CLEANING_RULES = {
+    "es": {"prefixes": ["excusa:", "aquí tienes una excusa:"], "labels": ["Traducción", "Inglés"]},
+    "fr": {"prefixes": ["excuse :", "voici une excuse :"], "labels": ["Traduction", "Anglais"]},
+    "de": {"prefixes": ["ausrede:", "entschuldigung:"], "labels": ["Übersetzung", "Englisch"]},
+    "it": {"prefixes": ["scusa:"], "labels": ["Traduzione", "Inglese"]},
+    "pt": {"prefixes": ["desculpa:"], "labels": ["Tradução", "Inglês"]},
+    "hi": {"prefixes": ["बहाना:"], "labels": ["अनुवाद"]},
+    "bn": {"prefixes": ["অজুহাত:"], "labels": ["অনুবাদ"]},
+}
+PROOF_CLEANING_RULES = {
+    "doctor_note": {"prefixes": ["here's a medical detail:"], "max_words": 40},
+}
 
 
-def get_excuse_from_huggingface(prompt):
-    headers = {
-        "Authorization": f"Bearer {HUGGINGFACE_API_TOKEN}",
-        "Content-Type": "application/json"
-    }
+class OutputCleaner:
+    def __init__(self, name, prefixes, labels, max_words=None):
+        self.name = name
+        self.max_words = max_words
+        prefix_alternation = '|'.join(re.escape(p) for p in prefixes)
+        label_alternation = '|'.join(re.escape(label) for label in labels)
+        # One match does both jobs: skip a leading filler prefix and any colon after it (a colon with
+        # no prefix is kept as text), then capture up to the first translation label (or the end of the text)
+        self._pattern = re.compile(
+            r'(?:(?:' + prefix_alternation + r')\s*(?::\s*)?)?'
+            r'(?P<body>.*?)'
+            r'(?=\b(?:' + label_alternation + r')\s*:|\Z)',
+            re.IGNORECASE | re.DOTALL
+        )
+        self._prefixes = tuple(p.lower() for p in prefixes)
+        self._labels = tuple(label.lower() for label in labels)
+        self._longest_label = max((len(label) for label in labels), default=0)
+
+    def clean(self, raw_text):
+        text = raw_text.split("[/INST]", 1)[-1].replace('"', '').strip()
+        text = self._pattern.match(text).group("body").strip()
+        if self.max_words is not None:
+            words = text.split()
+            if len(words) > self.max_words:
+                text = " ".join(words[:self.max_words]) + "..."
+        return text
+
+    def partial(self, raw_text):
+        # Cleans output that is still being generated. Returns (the part of the cleaned text that later
+        # tokens cannot change, whether a translation label has already ended it). max_words is not applied.
+        text = raw_text.split("[/INST]", 1)[-1].replace('"', '').lstrip()
+        lowered = text.lower()
+        if any(len(lowered) < len(prefix) and prefix.startswith(lowered) for prefix in self._prefixes):
+            # Could still become a filler prefix such as "Here's an excuse:"
+            return "", False
+        match = self._pattern.match(text)
+        body = match.group("body").strip()
+        if match.end("body") < len(text):
+            return body, True
+        return body[:self._pending_label_start(body)].rstrip(), False
+
+    def _pending_label_start(self, text):
+        # Start of a trailing word that may still grow into "Translation:" and the like, else len(text)
+        for start in range(max(0, len(text) - self._longest_label), len(text)):
+            if start > 0 and (text[start - 1].isalnum() or text[start - 1] == "_"):
+                continue
+            tail = text[start:].lower()
+            if any(label.startswith(tail) for label in self._labels):
+                return start
+        return len(text)
+
+
+class IncrementalCleaner:
+    """Applies an OutputCleaner to model output that arrives a few tokens at a time."""
+
+    def __init__(self, cleaner):
+        self.cleaner = cleaner
+        self.raw = ""
+        self.sent = ""
+        self.finished = False
+
+    def feed(self, piece):
+        # Returns the newly stable cleaned text, which may be empty
+        self.raw += piece
+        stable, self.finished = self.cleaner.partial(self.raw)
+        if len(stable) <= len(self.sent) or not stable.startswith(self.sent):
+            return ""
+        delta = stable[len(self.sent):]
+        self.sent = stable
+        return delta
+
+    def result(self):
+        # Same as cleaning the whole output at once; streamed deltas are only a preview of this
+        return self.cleaner.clean(self.raw)
+
+
+# Compiled on first use per (language, proof type): all of them together cost more at import than
+# a worker that only serves a few languages ever needs
+@lru_cache(maxsize=None)
+def _build_output_cleaner(language, proof_type):
+    if proof_type is not None and proof_type not in PROOF_CLEANING_RULES:
+        raise KeyError(proof_type)
+    language_rules = LANGUAGE_CLEANING_RULES.get(language, {})
+    proof_rules = PROOF_CLEANING_RULES.get(proof_type, {})
+    name = language if proof_type is None else f"{language}:{proof_type}"
+    return OutputCleaner(
+        name,
+        BASE_UNDESIRED_PREFIXES + language_rules.get("prefixes", []) + proof_rules.get("prefixes", []),
+        BASE_TRANSLATION_LABELS + language_rules.get("labels", []),
+        max_words=proof_rules.get("max_words")
+    )
+
+
+def get_output_cleaner(language="en", proof_type=None):
+    return _build_output_cleaner(language if language in LANGUAGE_MAP else "en", proof_type)
+
+
+def get_excuse_from_huggingface(prompt, cleaner=None):
     payload = {
         "inputs": prompt,
         "parameters": {"max_new_tokens": 100, "temperature": 0.7, "top_p": 0.9}
     }
-    session = requests.Session()
-    retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-    session.mount("https://", HTTPAdapter(max_retries=retries))
+    session = get_hf_session()
+    start = time.perf_counter()
+    outcome = "error"
     try:
-        response = session.post(API_URL, headers=headers, json=payload)
+        response = session.post(API_URL, json=payload, timeout=(HF_CONNECT_TIMEOUT, HF_READ_TIMEOUT))
         response.raise_for_status()
         result = response.json()
-        print(f"Raw Hugging Face API response: {result}")
+        outcome = "ok"
+        logger.debug("inference raw response=%s", result)
 
         raw_text = ""
         if isinstance(result, list) and len(result) > 0 and "generated_text" in result[0]:
@@ -128,128 +1052,1041 @@ def get_excuse_from_huggingface(prompt):
         elif isinstance(result, dict) and "generated_text" in result:
             raw_text = result["generated_text"]
         else:
-            print("Warning: Hugging Face API response did not contain 'generated_text' in expected format.")
+            outcome = "malformed"
+            logger.warning("inference response did not contain 'generated_text' in the expected format")
             return None
         
-        if "[/INST]" in raw_text:
-            excuse = raw_text.split("[/INST]", 1)[1].strip()
-        else:
-            excuse = raw_text.strip()
-        
-        excuse = excuse.replace('"', '').strip()
-        
-        undesired_prefixes = [
-            "here's an excuse:",
-            "translation:",
-            "english:",
-            "spanish:",
-            "french:",
-            "german:",
-            "italian:",
-            "portuguese:",
-            "hindi:",
-            "bengali:",
-            "in english:",
-            "here's the excuse:",
-            "the excuse is:",
-            "your excuse:",
-            "excuse:"
-        ]
-        
-    
-        prefix_pattern = re.compile(r'^(?:' + '|'.join(re.escape(p) for p in undesired_prefixes) + r')\s*(?::\s*)?', re.IGNORECASE)
-
-        match = prefix_pattern.match(excuse)
-        if match:
-            excuse = excuse[match.end():].strip()
-        if re.search(r'\b(Translation|English|Spanish|French|German|Italian|Portuguese|Hindi|Bengali)\s*:', excuse, re.IGNORECASE):
-            parts = re.split(r'\b(Translation|English|Spanish|French|German|Italian|Portuguese|Hindi|Bengali)\s*:', excuse, 1, re.IGNORECASE)
-            if len(parts) > 1:
-                excuse = parts[0].strip()
-
-        print(f"Hugging Face API returned cleaned excuse: {excuse}")
-        return excuse if excuse else "Error generating excuse, please try again later."
+        with metrics.timer("cleaning_duration_seconds"):
+            excuse = (cleaner or get_output_cleaner()).clean(raw_text)
+        logger.debug("inference cleaned excuse=%s", excuse)
+        return excuse if excuse else EMPTY_EXCUSE_MESSAGE
     except requests.exceptions.RequestException as e:
-        print(f"Error calling Hugging Face API: {e}")
         if e.response is not None:
-            print(f"HTTP Status: {e.response.status_code}")
-            print(f"Response Content: {e.response.text}")
-        traceback.print_exc()
+            outcome = f"http_{e.response.status_code}"
+            logger.error("inference request failed status=%s error=%s body=%.500s", e.response.status_code, e, e.response.text)
+        else:
+            logger.error("inference request failed error=%s", e)
         return None
+    finally:
+        metrics.observe("inference_duration_seconds", time.perf_counter() - start, outcome=outcome)
 
-def generate_doctor_doc(excuse_id, scenario):
-    os.makedirs(PROOF_DIR, exist_ok=True)
-    filename = f"doctor_doc_{uuid.uuid4().hex}.pdf"
-    full_path = os.path.join(PROOF_DIR, filename)
-    print(f"Attempting to generate doctor note at: {full_path}")
-    
-    prompt = f"""
-    [INST] Generate a concise, realistic medical detail for a doctor's note supporting the scenario '{scenario}'.
-    Keep it under 50 words, professional, and believable (e.g., minor illness or issue). Do not include the excuse itself or any translations. [/INST]
+
+def stream_excuse_from_huggingface(prompt):
+    # Yields raw generated text piece by piece from the API's streaming mode (server-sent "data:" lines).
+    # Raises requests' exceptions, or ValueError for malformed or error events.
+    payload = {
+        "inputs": prompt,
+        "parameters": {"max_new_tokens": 100, "temperature": 0.7, "top_p": 0.9},
+        "stream": True
+    }
+    start = time.perf_counter()
+    outcome = "error"
+    first_token = True
+    response = get_hf_session().post(API_URL, json=payload, stream=True, timeout=(HF_CONNECT_TIMEOUT, HF_READ_TIMEOUT))
+    try:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            # Decoded here: requests would assume ISO-8859-1 for a text/event-stream without a charset
+            line = line.decode("utf-8")
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            if event.get("error"):
+                raise ValueError(f"inference stream error: {event['error']}")
+            token = event.get("token") or {}
+            if token.get("special") or not token.get("text"):
+                continue
+            if first_token:
+                first_token = False
+                metrics.observe("inference_first_token_seconds", time.perf_counter() - start)
+            yield token["text"]
+        outcome = "ok"
+    except GeneratorExit:
+        # The consumer stopped reading early, e.g. at a translation label
+        outcome = "ok"
+        raise
+    except requests.exceptions.RequestException as e:
+        if e.response is not None:
+            outcome = f"http_{e.response.status_code}"
+        logger.error("inference stream failed error=%s", e)
+        raise
+    except ValueError as e:
+        outcome = "malformed"
+        logger.error("inference stream failed error=%s", e)
+        raise
+    finally:
+        response.close()
+        metrics.observe("inference_duration_seconds", time.perf_counter() - start, outcome=outcome)
+
+# Identical in-flight prompts share a single upstream request (single-flight): the first caller makes the
+# blocking call and later callers wait on its future. This coalesces duplicate work and bounds upstream
+# concurrency; it does not free request threads while the model is answering.
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", str(HF_POOL_MAXSIZE)))
+INFERENCE_MIN_CONCURRENCY = int(os.getenv("INFERENCE_MIN_CONCURRENCY", "1"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", str(4 * INFERENCE_MAX_CONCURRENCY)))
+INFERENCE_WAIT_TIMEOUT = float(os.getenv("INFERENCE_WAIT_TIMEOUT", "60"))
+# Consecutive upstream failures that open the breaker, and seconds before a half-open probe is let through
+INFERENCE_BREAKER_FAILURES = int(os.getenv("INFERENCE_BREAKER_FAILURES", "5"))
+INFERENCE_BREAKER_RESET = float(os.getenv("INFERENCE_BREAKER_RESET", "30"))
+INFERENCE_BREAKER_PROBES = int(os.getenv("INFERENCE_BREAKER_PROBES", "1"))
+
+
+class InferenceUnavailable(Exception):
+    """Raised instead of calling the inference API while it is failing or saturated."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"inference unavailable ({reason}); retry in {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    # closed: calls go through. open: calls fail fast until reset_timeout has passed.
+    # half_open: up to `probes` calls test the upstream; one success closes, one failure re-opens.
+    STATES = ("closed", "open", "half_open")
+
+    def __init__(self, failure_threshold, reset_timeout, probes=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        self.transitions = ShardedCounter()
+
+    def _transition(self, state):
+        if state != self.state:
+            logger.warning("inference circuit breaker %s -> %s", self.state, state)
+            self.state = state
+            self.transitions.incr(state)
+
+    def rejecting(self):
+        # Read-only check for callers that want to fail fast before doing any work
+        return self.state == "open" and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._transition("half_open")
+                self._probes_in_flight = 0
+            if self.state == "half_open":
+                if self._probes_in_flight >= self.probes:
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def record(self, success):
+        with self._lock:
+            if self.state == "half_open":
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if success:
+                self.consecutive_failures = 0
+                self._transition("closed")
+                return
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition("open")
+
+    def retry_after(self):
+        if self.state != "open":
+            return 1.0
+        return max(1.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+class AdaptiveLimiter:
+    # Limit on concurrent upstream calls. Successes raise it by about one per window of calls, failures
+    # halve it (AIMD), so a struggling upstream sees less load instead of a growing pile of retrying calls.
+    # Waiters are served in arrival order; callers beyond max_queue are turned away immediately.
+    def __init__(self, max_limit, min_limit, max_queue):
+        self.max_limit = max_limit
+        self.min_limit = max(1, min(min_limit, max_limit))
+        self.max_queue = max_queue
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    def acquire(self, timeout=None):
+        # True once a slot is held, False when the queue is full, None when no slot freed up within timeout
+        with self._lock:
+            if self.in_flight < int(self.limit) and not self._waiters:
+                self.in_flight += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                return False
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                return None
+        # The slot was granted just as the wait timed out
+        return True
+
+    def release(self, success):
+        # success is None for a slot given back without calling upstream; the limit then stays as it is
+        with self._lock:
+            self.in_flight -= 1
+            if success:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif success is not None:
+                self.limit = max(self.min_limit, self.limit / 2)
+            while self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                self._waiters.popleft().set()
+
+
+class InferencePipeline:
+    # Single-flight coalescing, adaptive concurrency and the circuit breaker for inference calls. The first
+    # caller for a prompt makes the upstream call on its own thread; identical callers arriving meanwhile
+    # wait on the same future instead of calling again.
+    def __init__(self, max_concurrency, breaker, min_concurrency=1, max_queue=64):
+        self.max_concurrency = max_concurrency
+        self.breaker = breaker
+        self.limiter = AdaptiveLimiter(max_concurrency, min_concurrency, max_queue)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self.counters = ShardedCounter()
+
+    def _get_executor(self):
+        # Only submit() needs a background thread, for callers that stop waiting before the call finishes
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    workers = self.max_concurrency + self.limiter.max_queue
+                    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        return self._executor
+
+    def _call_upstream(self, prompt, cleaner, timeout):
+        admitted = self.limiter.acquire(timeout)
+        if admitted is None:
+            self.counters.incr("timeouts")
+            raise InferenceUnavailable("queue_timeout", 1.0)
+        if not admitted:
+            self.counters.incr("rejected_queue_full")
+            raise InferenceUnavailable("queue_full", 1.0)
+        success = None
+        try:
+            # Checked after waiting for a slot, so queued calls also stop once the breaker opens
+            if not self.breaker.allow():
+                self.counters.incr("rejected_open")
+                raise InferenceUnavailable("circuit_open", self.breaker.retry_after())
+            success = False
+            try:
+                self.counters.incr("upstream_calls")
+                result = get_excuse_from_huggingface(prompt, cleaner)
+                success = result is not None
+            finally:
+                self.breaker.record(success)
+            return result
+        finally:
+            self.limiter.release(success)
+
+    def _join(self, prompt, cleaner):
+        # Returns the future for this prompt and whether the caller has to run the call that completes it
+        key = (prompt, cleaner.name if cleaner else None)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counters.incr("coalesced")
+                return key, future, False
+            if self.breaker.rejecting():
+                # Fail fast instead of queueing behind a breaker that will refuse the call anyway
+                self.counters.incr("rejected_open")
+                raise InferenceUnavailable("circuit_open", self.breaker.retry_after())
+            future = self._inflight[key] = Future()
+        return key, future, True
+
+    def _lead(self, key, future, prompt, cleaner, timeout):
+        try:
+            result = self._call_upstream(prompt, cleaner, timeout)
+        except Exception as e:
+            self._forget(key, future)
+            future.set_exception(e)
+        else:
+            self._forget(key, future)
+            future.set_result(result)
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def submit(self, prompt, cleaner=None, timeout=None):
+        # Starts (or joins) the call in the background and returns its future
+        timeout = INFERENCE_WAIT_TIMEOUT if timeout is None else timeout
+        key, future, leader = self._join(prompt, cleaner)
+        if leader:
+            self._get_executor().submit(self._lead, key, future, prompt, cleaner, timeout)
+        return future
+
+    def reset_after_fork(self):
+        # The parent's worker threads do not exist in this process; the next submit() starts new ones
+        self._executor = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.limiter = AdaptiveLimiter(self.limiter.max_limit, self.limiter.min_limit, self.limiter.max_queue)
+
+    def stream(self, prompt, timeout=None):
+        # Yields raw text pieces of one streaming upstream call. Streams are not coalesced, but they take a
+        # limiter slot and go through the breaker like generate_blocking(), so both share one upstream budget.
+        if self.breaker.rejecting():
+            self.counters.incr("rejected_open")
+            raise InferenceUnavailable("circuit_open", self.breaker.retry_after())
+        timeout = INFERENCE_WAIT_TIMEOUT if timeout is None else timeout
+        admitted = self.limiter.acquire(timeout)
+        if admitted is None:
+            self.counters.incr("timeouts")
+            raise InferenceUnavailable("queue_timeout", 1.0)
+        if not admitted:
+            self.counters.incr("rejected_queue_full")
+            raise InferenceUnavailable("queue_full", 1.0)
+        limiter = self.limiter
+        success = None
+        try:
+            if not self.breaker.allow():
+                self.counters.incr("rejected_open")
+                raise InferenceUnavailable("circuit_open", self.breaker.retry_after())
+            success = False
+            try:
+                self.counters.incr("upstream_streams")
+                yield from stream_excuse_from_huggingface(prompt)
+                success = True
+            except GeneratorExit:
+                # Stopped by the reader, not by the upstream
+                success = True
+                raise
+            finally:
+                self.breaker.record(success)
+        finally:
+            limiter.release(success)
+
+    def generate_blocking(self, prompt, cleaner=None, timeout=None):
+        # Returns None on upstream errors and timeouts; raises InferenceUnavailable when the call was shed
+        timeout = INFERENCE_WAIT_TIMEOUT if timeout is None else timeout
+        key, future, leader = self._join(prompt, cleaner)
+        if leader:
+            # The slot wait is bounded by timeout; the HTTP call itself by the session's own timeouts
+            self._lead(key, future, prompt, cleaner, timeout)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self.counters.incr("timeouts")
+            logger.warning("inference call did not finish within %ss; giving up on this request", timeout)
+            return None
+
+    def stats(self):
+        counts = self.counters.snapshot()
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": len(self._inflight),
+            "upstream_calls": counts.get("upstream_calls", 0),
+            "upstream_streams": counts.get("upstream_streams", 0),
+            "coalesced": counts.get("coalesced", 0),
+            "timeouts": counts.get("timeouts", 0),
+            "rejected_open": counts.get("rejected_open", 0),
+            "rejected_queue_full": counts.get("rejected_queue_full", 0),
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "upstream_in_flight": self.limiter.in_flight,
+            "queue_depth": self.limiter.queue_depth,
+            "max_queue": self.limiter.max_queue,
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "failure_threshold": self.breaker.failure_threshold,
+                "reset_timeout": self.breaker.reset_timeout,
+                "transitions": self.breaker.transitions.snapshot()
+            }
+        }
+
+inference_pipeline = InferencePipeline(
+    INFERENCE_MAX_CONCURRENCY,
+    CircuitBreaker(INFERENCE_BREAKER_FAILURES, INFERENCE_BREAKER_RESET, INFERENCE_BREAKER_PROBES),
+    min_concurrency=INFERENCE_MIN_CONCURRENCY,
+    max_queue=INFERENCE_MAX_QUEUE
+)
+after_fork_hooks.append(inference_pipeline.reset_after_fork)
+
+
+# Cache of generated excuses keyed on the normalized /generate parameters
+EXCUSE_CACHE_MAX_KEYS = int(os.getenv("EXCUSE_CACHE_MAX_KEYS", "512"))
+EXCUSE_CACHE_TTL = float(os.getenv("EXCUSE_CACHE_TTL", "3600"))
+EXCUSE_CACHE_VARIANTS = int(os.getenv("EXCUSE_CACHE_VARIANTS", "3"))
+# Optional SQLite file so cached excuses survive restarts and are shared by workers on one host
+EXCUSE_CACHE_FILE = os.getenv("EXCUSE_CACHE_FILE")
+
+
+class ExcuseCache:
+    # LRU over prompt keys; each key holds up to `variants` excuses that are handed out in rotation
+    def __init__(self, max_keys, ttl, variants, disk_path=None):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.variants = variants
+        self.enabled = max_keys > 0 and variants > 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.disk_path = disk_path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.enabled and disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS excuse_cache ("
+                "cache_key TEXT PRIMARY KEY, variants TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        if self._db is not None:
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+
+    def _expired(self, entry, now):
+        return now - entry["created"] > self.ttl
+
+    def _load_from_disk(self, key):
+        row = self._db.execute("SELECT variants, created FROM excuse_cache WHERE cache_key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return {"created": row[1], "variants": json.loads(row[0]), "next": 0}
+
+    def _write_to_disk(self, key, entry, now):
+        self._db.execute(
+            "INSERT OR REPLACE INTO excuse_cache (cache_key, variants, created, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(entry["variants"], ensure_ascii=False), entry["created"], now)
+        )
+        self._db.execute(
+            "DELETE FROM excuse_cache WHERE cache_key NOT IN "
+            "(SELECT cache_key FROM excuse_cache ORDER BY accessed DESC LIMIT ?)",
+            (self.max_keys,)
+        )
+        self._db.commit()
+
+    def _evict(self):
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            entry = self._load_from_disk(key)
+            if entry is not None:
+                self._entries[key] = entry
+                self._evict()
+        if entry is not None and self._expired(entry, now):
+            self._entries.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM excuse_cache WHERE cache_key = ?", (key,))
+                self._db.commit()
+            entry = None
+        return entry
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._lookup(key, now)
+            # Keep missing until the key has its full set of variants so repeat visitors still see variety
+            if entry is None or len(entry["variants"]) < self.variants:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            excuse = entry["variants"][entry["next"] % len(entry["variants"])]
+            entry["next"] += 1
+            self.hits += 1
+            return excuse
+
+    def put(self, key, excuse):
+        if not self.enabled or not excuse:
+            return
+        now = time.time()
+        with self._lock:
+            entry = self._lookup(key, now)
+            if entry is None:
+                entry = {"created": now, "variants": [], "next": 0}
+                self._entries[key] = entry
+            if excuse not in entry["variants"] and len(entry["variants"]) < self.variants:
+                entry["variants"].append(excuse)
+            self._entries.move_to_end(key)
+            self._evict()
+            if self._db is not None:
+                self._write_to_disk(key, entry, now)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": "sqlite" if self._db is not None else "memory",
+                "keys": len(self._entries),
+                "max_keys": self.max_keys,
+                "variants_per_key": self.variants,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+@lru_cache(maxsize=1024)
+def build_excuse_prompt(scenario, user_role, recipient, urgency, believability, language):
+    target_language = LANGUAGE_MAP.get(language, "English")
+    return f"""
+    [INST] Generate a concise, realistic, and believable excuse for a {user_role} who needs an excuse for '{scenario}' to their {recipient}. The urgency is {urgency} and believability is {believability}/10 (1=simple, 10=highly detailed). The excuse should be **solely in {target_language}**.
+    Do NOT include any conversational filler, introductions, or explicit translations (e.g., do not say "Translation: [English excuse]"). Provide only the excuse itself.
+    [/INST]
     """
-    medical_detail = get_excuse_from_huggingface(prompt)
-    medical_detail = medical_detail.replace('"', '').strip() if medical_detail else "Unknown medical issue preventing attendance."
-    
-    # Further clean medical detail, specifically for doctor's note
-    if medical_detail.lower().startswith("here's a medical detail:"):
-        medical_detail = medical_detail[len("here's a medical detail:"):].strip()
-    if re.search(r'\b(Translation|English)\s*:', medical_detail, re.IGNORECASE):
-        medical_detail = re.split(r'\b(Translation|English)\s*:', medical_detail, 1, re.IGNORECASE)[0].strip()
 
-    if len(medical_detail.split()) > 40:
-        medical_detail = " ".join(medical_detail.split()[:40]) + "..."
 
+def make_excuse_cache_key(scenario, user_role, recipient, urgency, believability, language):
+    parts = [scenario, user_role, recipient, urgency, believability]
+    normalized = [" ".join(str(p).strip().lower().split()) for p in parts]
+    normalized.append(language if language in LANGUAGE_MAP else "en")
+    return "|".join(normalized)
+
+
+excuse_cache = ExcuseCache(EXCUSE_CACHE_MAX_KEYS, EXCUSE_CACHE_TTL, EXCUSE_CACHE_VARIANTS, EXCUSE_CACHE_FILE)
+after_fork_hooks.append(excuse_cache.reset_after_fork)
+
+
+# In-process excuse generation, used when the model is slow, failing or not configured, or when a client asks
+# for it. Excuses are assembled from the phrase tables below, or reuse past excuses that got good feedback.
+EXCUSE_ENGINE_MODES = ("fallback", "hedged", "local", "model")
+EXCUSE_ENGINE_MODE = os.getenv("EXCUSE_ENGINE_MODE", "fallback").lower()
+EXCUSE_HEDGE_DELAY = float(os.getenv("EXCUSE_HEDGE_DELAY", "1.5"))
+LOCAL_RATED_MIN_FEEDBACK = int(os.getenv("LOCAL_RATED_MIN_FEEDBACK", "3"))
+LOCAL_RATED_MIN_RATIO = float(os.getenv("LOCAL_RATED_MIN_RATIO", "0.7"))
+LOCAL_RATED_SHARE = float(os.getenv("LOCAL_RATED_SHARE", "0.5"))
+
+# Per language: an opener for each recipient, reasons per scenario, supporting details (believability >= 8)
+# and a closing for each role (believability >= 4)
+LOCAL_EXCUSE_PHRASES = {
+    "en": {
+        "stop": ".",
+        "apology": {"boss": "I apologize for this.", "teacher": "I'm sorry about this.", "friend": "Sorry!", "partner": "I'm so sorry, love.", None: "I'm sorry."},
+        "reasons": {
+            "late for work": ["My train was held outside the station for almost an hour because of a signal failure", "My car wouldn't start this morning and I had to wait for a jump-start"],
+            "missed class": ["I came down with a fever last night and couldn't get out of bed", "My bus broke down halfway there and the next one was full"],
+            "forgot anniversary": ["I had a surprise planned for the weekend and completely mixed up the date", "Work swallowed the whole week and I lost track of the dates"],
+            "missed deadline": ["My laptop crashed during an update and I lost the latest draft", "I was waiting on data from another team that only arrived this evening"],
+            "didn't text back": ["My phone died and I only got it charged late at night", "I was in back-to-back commitments all day and only just saw your message"],
+        },
+        "details": ["I have a photo of the notice if needed.", "I tried to let you know sooner, but I had no signal.", "It's already sorted out, so it won't happen again."],
+        "closing": {"employee": "I'll make up the time and stay late today.", "student": "I'll catch up on everything I missed.", "friend": "Let me make it up to you soon.", "parent": "Things at home are back under control now.", None: "I'll make it up to you."},
+    },
+    "es": {
+        "stop": ".",
+        "apology": {"boss": "Le pido disculpas.", "teacher": "Lo siento mucho.", "friend": "¡Perdona!", "partner": "Lo siento muchísimo, cariño.", None: "Lo siento."},
+        "reasons": {
+            "late for work": ["Mi tren estuvo detenido casi una hora por una avería en la señalización", "Mi coche no arrancó esta mañana y tuve que esperar a que me ayudaran"],
+            "missed class": ["Anoche me dio fiebre y no pude levantarme de la cama", "Mi autobús se averió a mitad de camino y el siguiente iba lleno"],
+            "forgot anniversary": ["Tenía una sorpresa preparada para el fin de semana y me confundí completamente de fecha", "El trabajo me absorbió toda la semana y se me mezclaron las fechas"],
+            "missed deadline": ["Mi portátil se bloqueó durante una actualización y perdí el último borrador", "Estaba esperando datos de otro equipo que no llegaron hasta esta tarde"],
+            "didn't text back": ["Se me apagó el móvil y no pude cargarlo hasta muy tarde", "Estuve ocupado todo el día sin parar y acabo de ver el mensaje"],
+        },
+        "details": ["Tengo una foto del aviso si hace falta.", "Intenté avisar antes, pero no tenía cobertura.", "Ya está solucionado para que no vuelva a pasar."],
+        "closing": {"employee": "Recuperaré el tiempo quedándome más tarde hoy.", "student": "Me pondré al día con todo lo que me perdí.", "friend": "Déjame compensártelo pronto.", "parent": "En casa ya está todo bajo control.", None: "Lo compensaré."},
+    },
+    "fr": {
+        "stop": ".",
+        "apology": {"boss": "Je vous prie de m'excuser.", "teacher": "Je suis vraiment désolé.", "friend": "Désolé !", "partner": "Je suis tellement désolé, mon cœur.", None: "Je suis désolé."},
+        "reasons": {
+            "late for work": ["Mon train est resté bloqué près d'une heure à cause d'une panne de signalisation", "Ma voiture n'a pas voulu démarrer ce matin et j'ai dû attendre de l'aide"],
+            "missed class": ["J'ai eu de la fièvre hier soir et je n'ai pas pu me lever", "Mon bus est tombé en panne à mi-chemin et le suivant était complet"],
+            "forgot anniversary": ["J'avais prévu une surprise pour le week-end et je me suis complètement trompé de date", "Le travail m'a absorbé toute la semaine et j'ai mélangé les dates"],
+            "missed deadline": ["Mon ordinateur a planté pendant une mise à jour et j'ai perdu la dernière version", "J'attendais des données d'une autre équipe qui ne sont arrivées que ce soir"],
+            "didn't text back": ["Mon téléphone était déchargé et je n'ai pu le recharger que tard dans la nuit", "J'ai enchaîné les obligations toute la journée et je viens seulement de voir le message"],
+        },
+        "details": ["J'ai une photo de l'avis si nécessaire.", "J'ai essayé de prévenir plus tôt, mais je n'avais pas de réseau.", "C'est déjà réglé et cela ne se reproduira pas."],
+        "closing": {"employee": "Je rattraperai le temps perdu en restant plus tard aujourd'hui.", "student": "Je rattraperai tout ce que j'ai manqué.", "friend": "Laisse-moi me rattraper très vite.", "parent": "Tout est rentré dans l'ordre à la maison.", None: "Je me rattraperai."},
+    },
+    "de": {
+        "stop": ".",
+        "apology": {"boss": "Bitte entschuldigen Sie.", "teacher": "Es tut mir sehr leid.", "friend": "Sorry!", "partner": "Es tut mir so leid, Schatz.", None: "Es tut mir leid."},
+        "reasons": {
+            "late for work": ["Mein Zug stand wegen einer Signalstörung fast eine Stunde vor dem Bahnhof", "Mein Auto ist heute Morgen nicht angesprungen und ich musste auf Starthilfe warten"],
+            "missed class": ["Ich hatte gestern Abend Fieber und kam nicht aus dem Bett", "Mein Bus hatte auf halber Strecke eine Panne und der nächste war voll"],
+            "forgot anniversary": ["Ich hatte eine Überraschung fürs Wochenende geplant und mich völlig im Datum vertan", "Die Arbeit hat mich die ganze Woche vereinnahmt und ich habe die Daten verwechselt"],
+            "missed deadline": ["Mein Laptop ist bei einem Update abgestürzt und der letzte Entwurf ist weg", "Ich habe auf Daten von einem anderen Team gewartet, die erst heute Abend kamen"],
+            "didn't text back": ["Mein Handy-Akku war leer und ich konnte es erst spät abends laden", "Ich hatte den ganzen Tag einen Termin nach dem anderen und habe die Nachricht gerade erst gesehen"],
+        },
+        "details": ["Ich habe ein Foto der Meldung, falls nötig.", "Ich wollte früher Bescheid geben, hatte aber keinen Empfang.", "Es ist bereits geklärt und wird nicht wieder vorkommen."],
+        "closing": {"employee": "Ich hole die Zeit nach und bleibe heute länger.", "student": "Ich hole alles nach, was ich verpasst habe.", "friend": "Lass mich das bald wiedergutmachen.", "parent": "Zu Hause ist jetzt wieder alles im Griff.", None: "Ich mache es wieder gut."},
+    },
+    "it": {
+        "stop": ".",
+        "apology": {"boss": "Le chiedo scusa.", "teacher": "Mi dispiace molto.", "friend": "Scusa!", "partner": "Mi dispiace tantissimo, amore.", None: "Mi dispiace."},
+        "reasons": {
+            "late for work": ["Il mio treno è rimasto fermo quasi un'ora per un guasto alla segnaletica", "La mia macchina non partiva stamattina e ho dovuto aspettare aiuto"],
+            "missed class": ["Ieri sera mi è venuta la febbre e non riuscivo ad alzarmi dal letto", "Il mio autobus si è guastato a metà strada e quello dopo era pieno"],
+            "forgot anniversary": ["Avevo organizzato una sorpresa per il fine settimana e ho confuso completamente la data", "Il lavoro mi ha assorbito tutta la settimana e ho fatto confusione con le date"],
+            "missed deadline": ["Il mio portatile si è bloccato durante un aggiornamento e ho perso l'ultima bozza", "Stavo aspettando i dati di un altro team, arrivati solo stasera"],
+            "didn't text back": ["Il telefono si è scaricato e sono riuscito a ricaricarlo solo a tarda sera", "Ho avuto impegni uno dopo l'altro tutto il giorno e ho appena visto il messaggio"],
+        },
+        "details": ["Ho una foto dell'avviso, se serve.", "Ho provato ad avvisare prima, ma non avevo campo.", "Ho già risolto e non succederà più."],
+        "closing": {"employee": "Recupererò il tempo restando più a lungo oggi.", "student": "Recupererò tutto quello che ho perso.", "friend": "Lascia che mi faccia perdonare presto.", "parent": "A casa adesso è tutto sotto controllo.", None: "Mi farò perdonare."},
+    },
+    "pt": {
+        "stop": ".",
+        "apology": {"boss": "Peço desculpas.", "teacher": "Sinto muito.", "friend": "Desculpa!", "partner": "Me desculpa mesmo, amor.", None: "Sinto muito."},
+        "reasons": {
+            "late for work": ["Meu trem ficou parado quase uma hora por causa de uma falha na sinalização", "Meu carro não pegou hoje de manhã e tive que esperar ajuda"],
+            "missed class": ["Tive febre ontem à noite e não consegui sair da cama", "Meu ônibus quebrou no meio do caminho e o próximo estava lotado"],
+            "forgot anniversary": ["Eu tinha planejado uma surpresa para o fim de semana e confundi completamente a data", "O trabalho tomou a semana inteira e eu me confundi com as datas"],
+            "missed deadline": ["Meu notebook travou durante uma atualização e perdi o último rascunho", "Eu estava esperando dados de outra equipe que só chegaram hoje à noite"],
+            "didn't text back": ["Meu celular descarregou e só consegui carregar tarde da noite", "Tive compromissos o dia inteiro e só agora vi a mensagem"],
+        },
+        "details": ["Tenho uma foto do aviso, se precisar.", "Tentei avisar antes, mas estava sem sinal.", "Já está resolvido e não vai se repetir."],
+        "closing": {"employee": "Vou compensar as horas ficando até mais tarde hoje.", "student": "Vou correr atrás de tudo o que perdi.", "friend": "Deixa eu compensar isso em breve.", "parent": "Em casa já está tudo sob controle.", None: "Vou compensar isso."},
+    },
+    "hi": {
+        "stop": "।",
+        "apology": {"boss": "मैं क्षमा चाहता हूँ।", "teacher": "मुझे बहुत खेद है।", "friend": "माफ़ करना!", "partner": "मुझे सच में माफ़ कर दो।", None: "मुझे खेद है।"},
+        "reasons": {
+            "late for work": ["सिग्नल खराब होने की वजह से मेरी ट्रेन लगभग एक घंटे तक स्टेशन के बाहर रुकी रही", "आज सुबह मेरी गाड़ी स्टार्ट नहीं हुई और मुझे मदद का इंतज़ार करना पड़ा"],
+            "missed class": ["कल रात मुझे बुखार हो गया और मैं बिस्तर से उठ नहीं पाया", "मेरी बस आधे रास्ते में खराब हो गई और अगली बस पूरी भरी हुई थी"],
+            "forgot anniversary": ["मैंने सप्ताहांत के लिए एक सरप्राइज़ प्लान किया था और तारीख़ में पूरी तरह गड़बड़ कर दी", "पूरे हफ़्ते काम में इतना उलझा रहा कि तारीख़ें आपस में मिल गईं"],
+            "missed deadline": ["अपडेट के दौरान मेरा लैपटॉप क्रैश हो गया और आख़िरी ड्राफ़्ट खो गया", "मैं दूसरी टीम के डेटा का इंतज़ार कर रहा था जो आज शाम ही आया"],
+            "didn't text back": ["मेरा फ़ोन बंद हो गया था और देर रात तक चार्ज नहीं हो पाया", "पूरा दिन एक के बाद एक काम में लगा रहा और अभी मैसेज देखा"],
+        },
+        "details": ["ज़रूरत हो तो मेरे पास सूचना की फ़ोटो है।", "मैंने पहले बताने की कोशिश की, लेकिन नेटवर्क नहीं था।", "मैंने इसे ठीक कर लिया है, ऐसा दोबारा नहीं होगा।"],
+        "closing": {"employee": "मैं आज देर तक रुककर समय की भरपाई कर दूँगा।", "student": "जो छूट गया है, मैं सब पूरा कर लूँगा।", "friend": "मुझे जल्द ही इसकी भरपाई करने दो।", "parent": "घर पर अब सब कुछ ठीक है।", None: "मैं इसकी भरपाई कर दूँगा।"},
+    },
+    "bn": {
+        "stop": "।",
+        "apology": {"boss": "আমি ক্ষমাপ্রার্থী।", "teacher": "আমি সত্যিই দুঃখিত।", "friend": "সরি!", "partner": "আমাকে সত্যিই ক্ষমা করো।", None: "আমি দুঃখিত।"},
+        "reasons": {
+            "late for work": ["সিগন্যালের সমস্যার কারণে আমার ট্রেন প্রায় এক ঘণ্টা স্টেশনের বাইরে দাঁড়িয়ে ছিল", "আজ সকালে আমার গাড়ি স্টার্ট হয়নি, তাই সাহায্যের জন্য অপেক্ষা করতে হয়েছে"],
+            "missed class": ["গত রাতে আমার জ্বর এসেছিল, বিছানা থেকে উঠতে পারিনি", "আমার বাস মাঝপথে খারাপ হয়ে গেল আর পরের বাসটা পুরো ভর্তি ছিল"],
+            "forgot anniversary": ["সপ্তাহান্তের জন্য একটা সারপ্রাইজ প্ল্যান করেছিলাম, কিন্তু তারিখটা পুরো গুলিয়ে ফেলেছি", "পুরো সপ্তাহ কাজে এত ব্যস্ত ছিলাম যে তারিখগুলো গুলিয়ে গেছে"],
+            "missed deadline": ["আপডেটের সময় আমার ল্যাপটপ ক্র্যাশ করে শেষ খসড়াটা হারিয়ে গেছে", "অন্য একটি দলের ডেটার জন্য অপেক্ষা করছিলাম, যা আজ সন্ধ্যায় এসেছে"],
+            "didn't text back": ["আমার ফোনের চার্জ শেষ হয়ে গিয়েছিল, অনেক রাতে চার্জ দিতে পেরেছি", "সারাদিন একটার পর একটা কাজে ব্যস্ত ছিলাম, এইমাত্র মেসেজটা দেখলাম"],
+        },
+        "details": ["দরকার হলে নোটিশের একটা ছবি আমার কাছে আছে।", "আগেই জানাতে চেয়েছিলাম, কিন্তু নেটওয়ার্ক ছিল না।", "বিষয়টা মিটিয়ে ফেলেছি, আর এমন হবে না।"],
+        "closing": {"employee": "আজ দেরি পর্যন্ত থেকে সময়টা পুষিয়ে দেব।", "student": "যা বাদ পড়েছে সব পুষিয়ে নেব।", "friend": "শীঘ্রই এটা পুষিয়ে দেওয়ার সুযোগ দাও।", "parent": "বাড়িতে এখন সব ঠিক আছে।", None: "আমি এটা পুষিয়ে দেব।"},
+    },
+}
+
+
+class LocalExcuseEngine:
+    def __init__(self, phrases, store, min_feedback, min_ratio, rated_share, refresh_interval=300):
+        self.phrases = phrases
+        self.store = store
+        self.min_feedback = min_feedback
+        self.min_ratio = min_ratio
+        self.rated_share = rated_share
+        self.refresh_interval = refresh_interval
+        # (scenario, language) -> (loaded_at, texts); refreshed lazily so a request costs one dict lookup
+        self._rated = {}
+        self._lock = threading.Lock()
+        self.counters = ShardedCounter()
+
+    def _well_rated(self, scenario, language):
+        entry = self._rated.get((scenario, language))
+        if entry is not None and time.monotonic() - entry[0] < self.refresh_interval:
+            return entry[1]
+        try:
+            texts = self.store.well_rated(scenario, language, self.min_feedback, self.min_ratio, 20)
+        except sqlite3.Error:
+            logger.exception("failed to load well-rated excuses scenario=%s language=%s", scenario, language)
+            texts = entry[1] if entry is not None else []
+        with self._lock:
+            self._rated[(scenario, language)] = (time.monotonic(), texts)
+        return texts
+
+    def generate(self, scenario, user_role, recipient, believability, language):
+        language = language if language in self.phrases else "en"
+        rated = self._well_rated(scenario, language)
+        if rated and random.random() < self.rated_share:
+            self.counters.incr("rated")
+            return random.choice(rated)
+
+        phrases = self.phrases[language]
+        try:
+            level = int(believability)
+        except (TypeError, ValueError):
+            level = 5
+        reasons = phrases["reasons"].get(scenario) or [reason for options in phrases["reasons"].values() for reason in options]
+        parts = [
+            phrases["apology"].get(str(recipient).lower(), phrases["apology"][None]),
+            random.choice(reasons) + phrases["stop"]
+        ]
+        if level >= 8:
+            parts.append(random.choice(phrases["details"]))
+        if level >= 4:
+            parts.append(phrases["closing"].get(str(user_role).lower(), phrases["closing"][None]))
+        self.counters.incr("templated")
+        return " ".join(parts)
+
+    def stats(self):
+        counts = self.counters.snapshot()
+        return {
+            "languages": len(self.phrases),
+            "templated": counts.get("templated", 0),
+            "rated": counts.get("rated", 0),
+            "rated_keys_loaded": len(self._rated)
+        }
+
+
+local_excuse_engine = LocalExcuseEngine(
+    LOCAL_EXCUSE_PHRASES, state_store, LOCAL_RATED_MIN_FEEDBACK, LOCAL_RATED_MIN_RATIO, LOCAL_RATED_SHARE
+)
+
+
+# Pre-generated excuses per (scenario, language, believability bucket), topped up in the background so
+# /generate can answer from memory. Pooled prompts use a generic role and recipient. Each worker process
+# keeps its own pool, so the refill rate is per process.
+EXCUSE_POOL_SIZE = int(os.getenv("EXCUSE_POOL_SIZE", "2"))
+EXCUSE_POOL_LANGUAGES = [language.strip() for language in os.getenv("EXCUSE_POOL_LANGUAGES", "en").split(",") if language.strip()]
+EXCUSE_POOL_REFILLS_PER_MINUTE = float(os.getenv("EXCUSE_POOL_REFILLS_PER_MINUTE", "6"))
+EXCUSE_POOL_TTL = float(os.getenv("EXCUSE_POOL_TTL", "21600"))
+# (bucket, highest believability in it, level the bucket's excuses are generated at)
+BELIEVABILITY_BUCKETS = (("low", 3, "2"), ("medium", 7, "5"), ("high", 10, "9"))
+
+
+def believability_bucket(believability):
     try:
-        c = canvas.Canvas(full_path, pagesize=letter)
-        c.setFont("Helvetica-Bold", 18)
-        c.drawCentredString(letter[0]/2, 750, "Doctor's Note")
-        
-        c.setFont("Helvetica", 10)
-        c.drawRightString(letter[0]-50, 780, f"Date: {datetime.now().strftime('%B %d, %Y')}")
+        level = int(believability)
+    except (TypeError, ValueError):
+        level = 5
+    for name, highest, _ in BELIEVABILITY_BUCKETS:
+        if level <= highest:
+            return name
+    return BELIEVABILITY_BUCKETS[-1][0]
+
+
+class ExcusePool:
+    # Each key holds up to `size` unused excuses, oldest first. One refiller thread tops up the key that has
+    # been short the longest, making at most `refills_per_minute` model calls, and defers while live requests
+    # are queued for an upstream slot or the circuit breaker is open.
+    def __init__(self, pipeline, scenarios, languages, size, refills_per_minute, ttl):
+        self.pipeline = pipeline
+        self.size = size
+        self.refills_per_minute = refills_per_minute
+        self.ttl = ttl
+        self.enabled = size > 0 and refills_per_minute > 0 and bool(languages)
+        self._pools = {
+            (scenario, language, bucket): deque()
+            for scenario in scenarios for language in languages for bucket, _, _ in BELIEVABILITY_BUCKETS
+        } if self.enabled else {}
+        # Keys below their target depth -> monotonic time they fell short; refill lag is measured from here
+        self._short_since = dict.fromkeys(self._pools, time.monotonic())
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.counters = ShardedCounter()
+
+    def pop(self, scenario, language, believability):
+        key = (scenario, language, believability_bucket(believability))
+        pool = self._pools.get(key)
+        if pool is None:
+            return None
+        now = time.monotonic()
+        excuse = None
+        with self._lock:
+            while pool and excuse is None:
+                text, created = pool.popleft()
+                if now - created <= self.ttl:
+                    excuse = text
+                else:
+                    self.counters.incr("expired")
+            self._short_since.setdefault(key, now)
+        self._wakeup.set()
+        self.counters.incr("hits" if excuse is not None else "misses")
+        return excuse
+
+    def _prune(self):
+        now = time.monotonic()
+        with self._lock:
+            for key, pool in self._pools.items():
+                while pool and now - pool[0][1] > self.ttl:
+                    pool.popleft()
+                    self.counters.incr("expired")
+                    self._short_since.setdefault(key, now)
+
+    def _next_key(self):
+        with self._lock:
+            if not self._short_since:
+                return None
+            return min(self._short_since, key=self._short_since.get)
+
+    def _refill(self, key):
+        scenario, language, bucket = key
+        level = next(level for name, _, level in BELIEVABILITY_BUCKETS if name == bucket)
+        prompt = build_excuse_prompt(scenario, "person", "contact", "medium", level, language)
+        try:
+            excuse = self.pipeline.generate_blocking(prompt, get_output_cleaner(language))
+        except InferenceUnavailable:
+            self.counters.incr("refills_shed")
+            return
+        if not excuse or excuse == EMPTY_EXCUSE_MESSAGE:
+            self.counters.incr("refills_failed")
+            return
+        now = time.monotonic()
+        lag = None
+        with self._lock:
+            pool = self._pools[key]
+            if any(text == excuse for text, _ in pool):
+                self.counters.incr("duplicates")
+                return
+            pool.append((excuse, now))
+            if len(pool) >= self.size:
+                short_since = self._short_since.pop(key, None)
+                if short_since is not None:
+                    lag = now - short_since
+        self.counters.incr("refills")
+        if lag is not None:
+            metrics.observe("excuse_pool_refill_lag_seconds", lag)
+
+    def run_refiller(self):
+        interval = 60.0 / self.refills_per_minute
+        while True:
+            try:
+                self._prune()
+                key = self._next_key()
+                if key is None:
+                    # Full: sleep until a pop, or long enough to notice expiring excuses
+                    self._wakeup.wait(min(60.0, self.ttl))
+                    self._wakeup.clear()
+                    continue
+                if self.pipeline.breaker.rejecting() or self.pipeline.limiter.queue_depth > 0:
+                    self.counters.incr("deferred")
+                else:
+                    self._refill(key)
+            except Exception:
+                metrics.inc("errors_total", stage="excuse_pool")
+                logger.exception("excuse pool refill failed")
+            time.sleep(interval)
+
+    def start(self):
+        if self.enabled:
+            threading.Thread(target=self.run_refiller, name="excuse-pool-refiller", daemon=True).start()
+
+    def reset_after_fork(self):
+        # Excuses pooled by the parent would be handed out by every worker, so each child fills its own
+        now = time.monotonic()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        for pool in self._pools.values():
+            pool.clear()
+        self._short_since = dict.fromkeys(self._pools, now)
+
+    def refill_lag(self):
+        # Seconds the longest-short key has been below its target depth
+        with self._lock:
+            oldest = min(self._short_since.values(), default=None)
+        return 0.0 if oldest is None else time.monotonic() - oldest
+
+    def depths(self):
+        with self._lock:
+            return {key: len(pool) for key, pool in self._pools.items()}
+
+    def stats(self):
+        counts = self.counters.snapshot()
+        depths = self.depths()
+        return {
+            "enabled": self.enabled,
+            "size": self.size,
+            "refills_per_minute": self.refills_per_minute,
+            "ttl_seconds": self.ttl,
+            "keys": len(depths),
+            "pooled": sum(depths.values()),
+            "short_keys": len(self._short_since),
+            "refill_lag_seconds": round(self.refill_lag(), 3),
+            "hits": counts.get("hits", 0),
+            "misses": counts.get("misses", 0),
+            "refills": counts.get("refills", 0),
+            "refills_failed": counts.get("refills_failed", 0),
+            "refills_shed": counts.get("refills_shed", 0),
+            "duplicates": counts.get("duplicates", 0),
+            "expired": counts.get("expired", 0),
+            "deferred": counts.get("deferred", 0)
+        }
+
+
+excuse_pool = ExcusePool(
+    inference_pipeline,
+    VALID_SCENARIOS,
+    [language for language in EXCUSE_POOL_LANGUAGES if language in LANGUAGE_MAP],
+    # Pooling only spends API budget when the model would be asked at all
+    EXCUSE_POOL_SIZE if HUGGINGFACE_API_TOKEN and EXCUSE_ENGINE_MODE != "local" else 0,
+    EXCUSE_POOL_REFILLS_PER_MINUTE,
+    EXCUSE_POOL_TTL
+)
+background_tasks.append(excuse_pool.start)
+after_fork_hooks.append(excuse_pool.reset_after_fork)
+
+
+# TrueType font for doctor's note text the standard Helvetica faces cannot show, such as a Greek or
+# Hindi diagnosis; empty uses the font found for chat screenshots
+DOCTOR_NOTE_FONT = os.getenv("DOCTOR_NOTE_FONT", "")
+
+
+class DoctorNoteTemplate:
+    """Doctor's note page drawn with ReportLab from a fixed layout.
+
+    The letterhead and the signature block are drawn once per document as
+    form XObjects and placed with doForm, so each note only lays out the
+    dates and the diagnosis. Text that Helvetica's WinAnsi encoding cannot
+    represent is set in a registered TrueType font, which ReportLab subsets
+    and embeds.
+    """
 
-        c.setFont("Helvetica", 12)
-        c.drawString(50, 700, "To Whom It May Concern,")
-        c.drawString(50, 680, f"This note confirms that a patient was seen on {datetime.now().strftime('%B %d, %Y')}.")
-        
-        c.setFont("Helvetica-Oblique", 12)
-        c.drawString(50, 650, "Diagnosis/Reason:")
-        c.setFont("Helvetica", 12)
-        
-        lines = simpleSplit(medical_detail, "Helvetica", 12, letter[0] - 100)
+    UNICODE_FONT = "DoctorNoteUnicode"
+
+    def __init__(self, pagesize=None, unicode_font_path=None):
+        # reportlab loads with the first template rather than at import
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.utils import simpleSplit
+        from reportlab.pdfgen.canvas import Canvas
+        self._canvas = Canvas
+        self._split = simpleSplit
+        self.pagesize = pagesize or letter
+        self.width, self.height = self.pagesize
+        self.unicode_font = self._register_font(unicode_font_path or DOCTOR_NOTE_FONT or get_font_path())
+
+        # (font, size, x, y, text, alignment)
+        self.letterhead = [
+            ("Helvetica-Bold", 18, self.width / 2, 750, "Doctor's Note", "centre"),
+            ("Helvetica", 12, 50, 700, "To Whom It May Concern,", "left"),
+            ("Helvetica-Oblique", 12, 50, 650, "Diagnosis/Reason:", "left"),
+        ]
+        # Laid out above the baseline and shifted below the diagnosis per note
+        self.closing_height = 105
+        self.closing = [
+            ("Helvetica", 12, 50, 105, "Patient is advised to rest and is excused from activities.", "left"),
+            ("Helvetica-Bold", 12, 50, 50, "Sincerely,", "left"),
+            ("Helvetica-Bold", 12, 50, 30, "Dr. A.I. Goodtrust, MD", "left"),
+            ("Helvetica-Bold", 12, 50, 15, "Neural Networks Clinic", "left"),
+            ("Helvetica-Bold", 12, 50, 0, "101 Digital Highway, AILand", "left"),
+        ]
+
+    def _register_font(self, path):
+        if not path:
+            return None
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        try:
+            pdfmetrics.registerFont(TTFont(self.UNICODE_FONT, path))
+        except Exception:
+            logger.warning("could not load doctor's note font path=%s; non-Latin text will not render", path, exc_info=True)
+            return None
+        return self.UNICODE_FONT
+
+    def _font_for(self, font, text):
+        if self.unicode_font is None:
+            return font
+        try:
+            text.encode("cp1252")
+        except UnicodeEncodeError:
+            return self.unicode_font
+        return font
+
+    def _draw(self, c, font, size, x, y, text, alignment="left"):
+        c.setFont(self._font_for(font, text), size)
+        if alignment == "centre":
+            c.drawCentredString(x, y, text)
+        elif alignment == "right":
+            c.drawRightString(x, y, text)
+        else:
+            c.drawString(x, y, text)
+
+    def _form(self, c, name, items):
+        c.beginForm(name)
+        for item in items:
+            self._draw(c, *item)
+        c.endForm()
+
+    def render(self, medical_detail, when=None):
+        when = when or datetime.now()
+        today = when.strftime('%B %d, %Y')
+        buffer = io.BytesIO()
+        c = self._canvas(buffer, pagesize=self.pagesize)
+        self._form(c, "letterhead", self.letterhead)
+        self._form(c, "closing", self.closing)
+
+        c.doForm("letterhead")
+        self._draw(c, "Helvetica", 10, self.width - 50, 780, f"Date: {today}", "right")
+        self._draw(c, "Helvetica", 12, 50, 680, f"This note confirms that a patient was seen on {today}.")
+        body_font = self._font_for("Helvetica", medical_detail)
         y_pos = 630
-        for line in lines:
-            c.drawString(50, y_pos, line)
+        for line in self._split(medical_detail, body_font, 12, self.width - 100):
+            self._draw(c, body_font, 12, 50, y_pos, line)
             y_pos -= 15
-        
         y_pos -= 30
-        c.drawString(50, y_pos, "Patient is advised to rest and is excused from activities.")
-        y_pos -= 15
-        c.drawString(50, y_pos, f"Expected return: { (datetime.now() + timedelta(days=2)).strftime('%B %d, %Y') }")
-        
-        c.setFont("Helvetica-Bold", 12)
-        y_pos -= 40
-        c.drawString(50, y_pos, "Sincerely,")
-        y_pos -= 20
-        c.drawString(50, y_pos, "Dr. A.I. Goodtrust, MD")
-        y_pos -= 15
-        c.drawString(50, y_pos, "Neural Networks Clinic")
-        y_pos -= 15
-        c.drawString(50, y_pos, "101 Digital Highway, AILand")
 
+        c.saveState()
+        c.translate(0, y_pos - self.closing_height)
+        c.doForm("closing")
+        c.restoreState()
+        self._draw(c, "Helvetica", 12, 50, y_pos - 15, f"Expected return: {(when + timedelta(days=2)).strftime('%B %d, %Y')}")
+        c.showPage()
         c.save()
-        print(f"Finished writing doctor note to: {full_path}")
-        
-        if os.path.exists(full_path):
-            print(f"Confirmation: PDF file EXISTS immediately after creation at: {full_path}")
-        else:
-            print(f"Warning: PDF file DOES NOT EXIST immediately after creation at: {full_path}. This is unexpected!")
-            
+        return buffer.getvalue()
+
+@lru_cache(maxsize=1)
+def get_doctor_note_template():
+    return DoctorNoteTemplate()
+
+
+# Keep rendered doctor's notes in memory and serve them from the proof job instead of writing to PROOF_DIR
+DOCTOR_NOTE_IN_MEMORY = os.getenv("DOCTOR_NOTE_IN_MEMORY", "false").lower() in ("1", "true", "yes")
+
+
+def generate_doctor_doc(excuse_id, scenario, in_memory=False):
+    prompt = f"""
+    [INST] Generate a concise, realistic medical detail for a doctor's note supporting the scenario '{scenario}'.
+    Keep it under 50 words, professional, and believable (e.g., minor illness or issue). Do not include the excuse itself or any translations. [/INST]
+    """
+    try:
+        medical_detail = inference_pipeline.generate_blocking(prompt, get_output_cleaner(proof_type="doctor_note"))
+    except InferenceUnavailable as e:
+        logger.info("doctor note using the default diagnosis: %s", e)
+        medical_detail = None
+    if not medical_detail or medical_detail == EMPTY_EXCUSE_MESSAGE:
+        medical_detail = "Unknown medical issue preventing attendance."
+
+    try:
+        with metrics.timer("proof_render_duration_seconds", format="pdf"):
+            pdf_bytes = get_doctor_note_template().render(medical_detail)
+    except Exception:
+        logger.exception("failed to render PDF scenario=%s excuse_id=%s", scenario, excuse_id)
+        return None
+    if in_memory:
+        return pdf_bytes
+
+    filename = f"doctor_doc_{uuid.uuid4().hex}.pdf"
+    full_path = proof_store.path_for(filename)
+    try:
+        with open(full_path, "wb") as f:
+            f.write(pdf_bytes)
+        logger.debug("doctor note written path=%s", full_path)
         return full_path
-    except Exception as e:
-        print(f"CRITICAL ERROR generating PDF for {scenario} (excuse_id: {excuse_id}): {e}")
-        traceback.print_exc()
+    except Exception:
+        logger.exception("failed to write PDF scenario=%s excuse_id=%s path=%s", scenario, excuse_id, full_path)
         return None
 
+# Probed on the first chat screenshot rather than at import
+@lru_cache(maxsize=1)
 def get_font_path():
     font_paths = [
         "C:/Windows/Fonts/arial.ttf",
@@ -261,149 +2098,180 @@ def get_font_path():
     for path in font_paths:
         if os.path.exists(path):
             return path
-    print("Warning: Arial.ttf or DejaVuSans.ttf not found. Using Pillow's default font.")
+    logger.warning("Arial.ttf or DejaVuSans.ttf not found; using Pillow's default font")
     return None
 
-ARIAL_FONT_PATH = get_font_path()
+CHAT_IMAGE_WIDTH = 600
+CHAT_MIN_IMAGE_HEIGHT = 400
+CHAT_FONT_SIZE = 18
+CHAT_MARGIN = 30
+CHAT_BUBBLE_PADDING_X = 15
+CHAT_BUBBLE_PADDING_Y = 10
+CHAT_BUBBLE_SPACING = 20
+CHAT_BUBBLE_MAX_WIDTH = CHAT_IMAGE_WIDTH * 0.7
+CHAT_BUBBLE_COLOR_FRIEND = (229, 229, 229)
+CHAT_BUBBLE_COLOR_YOU = (220, 248, 198)
+
+CHAT_FRIEND_MESSAGES = {
+    "late for work": "Hey, where are you? You're late for work!",
+    "missed class": "Did you miss class today? We had a pop quiz!",
+    "forgot anniversary": "Happy Anniversary! ... wait, did you forget?",
+    "missed deadline": "Just checking in, did you get that report done? Deadline was today.",
+    "didn't text back": "Hey, I texted you earlier. Everything okay? Why didn't you text back?"
+}
+CHAT_CLOSING_MESSAGE = "Oh, okay! Hope everything's alright. Take care!"
+
+# Fonts are parsed once per size and shared by every render thread.
+@lru_cache(maxsize=16)
+def load_font(size):
+    from PIL import ImageFont
+    font_path = get_font_path()
+    if font_path:
+        try:
+            return ImageFont.truetype(font_path, size)
+        except IOError:
+            logger.warning("could not load font path=%s; using default font", font_path, exc_info=True)
+        except Exception:
+            logger.exception("unexpected error loading font path=%s; using default font", font_path)
+    return ImageFont.load_default()
+
+# textbbox only needs a drawing context, not the canvas being rendered.
+@lru_cache(maxsize=1)
+def _measure_draw():
+    from PIL import Image, ImageDraw
+    return ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+@lru_cache(maxsize=8192)
+def measure_text(font, text):
+    """Rendered ink width of text, exactly as ImageDraw.textbbox reports it."""
+    try:
+        bbox = _measure_draw().textbbox((0, 0), text, font=font)
+        return bbox[2] - bbox[0]
+    except TypeError:
+        logger.warning("textbbox failed with current font; using approximate width text=%r", text)
+        return len(text) * (font.size * 0.6) if font else len(text) * 10
+
+@lru_cache(maxsize=8192)
+def measure_advance(font, text):
+    """Pen advance of text; additive across words, unlike the ink width."""
+    try:
+        return font.getlength(text)
+    except (AttributeError, TypeError):
+        return measure_text(font, text)
 
-def wrap_text(draw, text, font, max_width):
+def wrap_text(text, font, max_width):
+    """Greedy word wrap matching a textbbox check of every candidate line.
+
+    Line widths are estimated by summing cached word advances; only a
+    candidate close enough to max_width for side bearings or kerning to
+    matter is measured exactly, so each word costs O(1) amortized.
+    """
     lines = []
     if not text:
         return [""]
     words = text.split(' ')
+    space_width = measure_advance(font, ' ')
+    tolerance = getattr(font, "size", 10)
     current_line = []
-    
+    current_width = 0
+
     for word in words:
-        test_line = ' '.join(current_line + [word])
-        
-        try:
-            bbox = draw.textbbox((0, 0), test_line, font=font)
-            text_width = bbox[2] - bbox[0]
-        except TypeError:
-            text_width = len(test_line) * (font.size * 0.6) if font else len(test_line) * 10
-            print(f"Warning: textbbox failed with current font, using approximate width for '{test_line}'.")
+        word_width = measure_advance(font, word)
+        test_width = current_width + space_width + word_width if current_line else word_width
+        if test_width + tolerance <= max_width:
+            fits = True
+        elif test_width - tolerance > max_width:
+            fits = False
+        else:
+            fits = measure_text(font, ' '.join(current_line + [word])) <= max_width
 
-        if text_width <= max_width:
+        if fits:
             current_line.append(word)
+            current_width = test_width
         else:
             if not current_line:
                 lines.append(word)
                 current_line = []
+                current_width = 0
             else:
                 lines.append(' '.join(current_line))
                 current_line = [word]
+                current_width = word_width
     if current_line:
         lines.append(' '.join(current_line))
     return lines
 
+def layout_chat_bubble(text, font):
+    lines = wrap_text(text, font, CHAT_BUBBLE_MAX_WIDTH - (2 * CHAT_BUBBLE_PADDING_X))
+    line_height = font.size + 5
+    height = (len(lines) * line_height) + (2 * CHAT_BUBBLE_PADDING_Y)
+    width = max((measure_text(font, line) for line in lines), default=0) + (2 * CHAT_BUBBLE_PADDING_X)
+    return lines, min(width, CHAT_BUBBLE_MAX_WIDTH), height
 
-def generate_chat_screenshot(excuse_id, excuse, scenario):
-    os.makedirs(PROOF_DIR, exist_ok=True)
-    filename = f"chat_screenshot_{uuid.uuid4().hex}.png"
-    full_path = os.path.join(PROOF_DIR, filename)
-    print(f"Attempting to generate chat screenshot at: {full_path}")
-    
-    img_width = 600
-    img_height = 400 
-    img = Image.new("RGB", (img_width, img_height), color="white")
-    draw = ImageDraw.Draw(img)
 
-    font_size = 18
-    font = ImageFont.load_default()
-    if ARIAL_FONT_PATH:
-        try:
-            font = ImageFont.truetype(ARIAL_FONT_PATH, font_size)
-        except IOError as e:
-            print(f"Could not load specified font '{ARIAL_FONT_PATH}': {e}. Using default font.")
-            traceback.print_exc()
-            font = ImageFont.load_default()
-        except Exception as e:
-            print(f"Unexpected error loading font '{ARIAL_FONT_PATH}': {e}. Using default font.")
-            traceback.print_exc()
-            font = ImageFont.load_default()
-            
-    margin = 30
-    current_y = 30
-    line_height = font_size + 5
-
-    friend_text_template = {
-        "late for work": "Hey, where are you? You're late for work!",
-        "missed class": "Did you miss class today? We had a pop quiz!",
-        "forgot anniversary": "Happy Anniversary! ... wait, did you forget?",
-        "missed deadline": "Just checking in, did you get that report done? Deadline was today.",
-        "didn't text back": "Hey, I texted you earlier. Everything okay? Why didn't you text back?"
-    }
-    friend_initial_message = friend_text_template.get(scenario, "Hello?")
-    
-    bubble_color_friend = (229, 229, 229)
-    bubble_color_you = (220, 248, 198)
+def generate_chat_screenshot(excuse_id, excuse, scenario, in_memory=False):
+    from PIL import Image, ImageDraw
+    render_start = time.perf_counter()
 
-    wrapped_lines = wrap_text(draw, friend_initial_message, font, img_width * 0.7 - (2 * 15))
-    bubble_height = (len(wrapped_lines) * line_height) + (2 * 10)
-    
-    bubble_width = max((draw.textbbox((0,0), line, font=font)[2] - draw.textbbox((0,0), line, font=font)[0] for line in wrapped_lines), default=0) + (2 * 15)
-    bubble_width = min(bubble_width, img_width * 0.7)
-
-    draw.rounded_rectangle((margin, current_y, margin + bubble_width, current_y + bubble_height), radius=15, fill=bubble_color_friend)
-    text_y = current_y + 10
-    for line in wrapped_lines:
-        draw.text((margin + 15, text_y), line, fill="black", font=font)
-        text_y += line_height
-    current_y += bubble_height + 20
-
-    wrapped_lines = wrap_text(draw, excuse, font, img_width * 0.7 - (2 * 15))
-    bubble_height = (len(wrapped_lines) * line_height) + (2 * 10)
-
-    bubble_width = max((draw.textbbox((0,0), line, font=font)[2] - draw.textbbox((0,0), line, font=font)[0] for line in wrapped_lines), default=0) + (2 * 15)
-    bubble_width = min(bubble_width, img_width * 0.7)
-
-    you_x_start = img_width - margin - bubble_width
-    draw.rounded_rectangle((you_x_start, current_y, img_width - margin, current_y + bubble_height), radius=15, fill=bubble_color_you)
-    text_y = current_y + 10
-    for line in wrapped_lines:
-        draw.text((you_x_start + 15, text_y), line, fill="black", font=font)
-        text_y += line_height
-    current_y += bubble_height + 20
-
-    friend_closing_message = "Oh, okay! Hope everything's alright. Take care!"
-    wrapped_lines = wrap_text(draw, friend_closing_message, font, img_width * 0.7 - (2 * 15))
-    bubble_height = (len(wrapped_lines) * line_height) + (2 * 10)
-
-    bubble_width = max((draw.textbbox((0,0), line, font=font)[2] - draw.textbbox((0,0), line, font=font)[0] for line in wrapped_lines), default=0) + (2 * 15)
-    bubble_width = min(bubble_width, img_width * 0.7)
-
-    draw.rounded_rectangle((margin, current_y, margin + bubble_width, current_y + bubble_height), radius=15, fill=bubble_color_friend)
-    text_y = current_y + 10
-    for line in wrapped_lines:
-        draw.text((margin + 15, text_y), line, fill="black", font=font)
-        text_y += line_height
-    current_y += bubble_height + 20
+    font = load_font(CHAT_FONT_SIZE)
+    line_height = CHAT_FONT_SIZE + 5
 
+    messages = [
+        (CHAT_FRIEND_MESSAGES.get(scenario, "Hello?"), False),
+        (excuse, True),
+        (CHAT_CLOSING_MESSAGE, False),
+    ]
+    bubbles = []
+    current_y = CHAT_MARGIN
+    for text, from_you in messages:
+        lines, bubble_width, bubble_height = layout_chat_bubble(text, font)
+        bubbles.append((current_y, lines, bubble_width, bubble_height, from_you))
+        current_y += bubble_height + CHAT_BUBBLE_SPACING
+
+    img_height = CHAT_MIN_IMAGE_HEIGHT
     if current_y > img_height:
-        new_img_height = current_y + margin
-        new_img = Image.new("RGB", (img_width, new_img_height), color="white")
-        new_img.paste(img, (0, 0))
-        img = new_img
-        draw = ImageDraw.Draw(img)
+        img_height = current_y + CHAT_MARGIN
+    img = Image.new("RGB", (CHAT_IMAGE_WIDTH, img_height), color="white")
+    draw = ImageDraw.Draw(img)
 
+    for top, lines, bubble_width, bubble_height, from_you in bubbles:
+        if from_you:
+            x_start = CHAT_IMAGE_WIDTH - CHAT_MARGIN - bubble_width
+            x_end = CHAT_IMAGE_WIDTH - CHAT_MARGIN
+            fill = CHAT_BUBBLE_COLOR_YOU
+        else:
+            x_start = CHAT_MARGIN
+            x_end = CHAT_MARGIN + bubble_width
+            fill = CHAT_BUBBLE_COLOR_FRIEND
+        draw.rounded_rectangle((x_start, top, x_end, top + bubble_height), radius=15, fill=fill)
+        text_y = top + CHAT_BUBBLE_PADDING_Y
+        for line in lines:
+            draw.text((x_start + CHAT_BUBBLE_PADDING_X, text_y), line, fill="black", font=font)
+            text_y += line_height
+
+    if in_memory:
+        buffer = io.BytesIO()
+        try:
+            img.save(buffer, format="PNG")
+        except Exception:
+            logger.exception("failed to encode PNG scenario=%s excuse_id=%s", scenario, excuse_id)
+            return None
+        metrics.observe("proof_render_duration_seconds", time.perf_counter() - render_start, format="png")
+        return buffer.getvalue()
+
+    filename = f"chat_screenshot_{uuid.uuid4().hex}.png"
+    full_path = proof_store.path_for(filename)
     try:
         img.save(full_path)
-        print(f"Successfully generated chat screenshot: {full_path}")
-        if os.path.exists(full_path):
-            print(f"Confirmation: PNG file EXISTS immediately after creation at: {full_path}")
-        else:
-            print(f"Warning: PNG file DOES NOT EXIST immediately after creation at: {full_path}. This is unexpected!")
+        metrics.observe("proof_render_duration_seconds", time.perf_counter() - render_start, format="png")
+        logger.debug("chat screenshot written path=%s", full_path)
         return full_path
-    except Exception as e:
-        print(f"CRITICAL ERROR generating PNG for {scenario} (excuse_id: {excuse_id}): {e}")
-        traceback.print_exc()
+    except Exception:
+        logger.exception("failed to write PNG scenario=%s excuse_id=%s path=%s", scenario, excuse_id, full_path)
         return None
 
-def generate_location_log(excuse_id, scenario):
-    os.makedirs(PROOF_DIR, exist_ok=True)
-    filename = f"location_log_{uuid.uuid4().hex}.json"
-    full_path = os.path.join(PROOF_DIR, filename)
-    print(f"Attempting to generate location log at: {full_path}")
+def generate_location_log(excuse_id, scenario, in_memory=False):
+    render_start = time.perf_counter()
     
     base_lat = 22.5726
     base_lon = 88.3639
@@ -416,172 +2284,1110 @@ def generate_location_log(excuse_id, scenario):
         "event_type": "Unexpected Location Activity",
         "notes": f"Device detected unusual movement patterns related to '{scenario.replace('_', ' ').title()}'."
     }
+    if in_memory:
+        data = json.dumps(log, indent=2).encode("utf-8")
+        metrics.observe("proof_render_duration_seconds", time.perf_counter() - render_start, format="json")
+        return data
+
+    filename = f"location_log_{uuid.uuid4().hex}.json"
+    full_path = proof_store.path_for(filename)
     try:
         with open(full_path, "w") as f:
             json.dump(log, f, indent=2)
-        print(f"Successfully generated location log: {full_path}")
-        if os.path.exists(full_path):
-            print(f"Confirmation: JSON file EXISTS immediately after creation at: {full_path}")
-        else:
-            print(f"Warning: JSON file DOES NOT EXIST immediately after creation at: {full_path}. This is unexpected!")
+        metrics.observe("proof_render_duration_seconds", time.perf_counter() - render_start, format="json")
+        logger.debug("location log written path=%s", full_path)
         return full_path
-    except Exception as e:
-        print(f"CRITICAL ERROR generating JSON for {scenario} (excuse_id: {excuse_id}): {e}")
-        traceback.print_exc()
+    except Exception:
+        logger.exception("failed to write JSON scenario=%s excuse_id=%s path=%s", scenario, excuse_id, full_path)
         return None
 
-def _load_saved_excuses():
-    if not os.path.exists(SAVED_EXCUSES_FILE):
-        return {}
-    try:
-        with open(SAVED_EXCUSES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        print(f"Warning: {SAVED_EXCUSES_FILE} is empty or malformed. Starting with empty saved excuses.")
-        return {}
-    except Exception as e:
-        print(f"Error loading saved excuses from {SAVED_EXCUSES_FILE}: {e}")
-        return {}
+SAVED_EXCUSE_FIELDS = ("id", "excuse_text", "scenario", "user_role", "recipient", "language", "saved_at")
+
+
+class SavedExcuseStore(SQLiteStore):
+    # SQLite in WAL mode: single-row inserts/deletes, safe across threads and worker processes
+    def __init__(self, db_path, legacy_json_path=None):
+        super().__init__(db_path)
+        self.legacy_json_path = legacy_json_path
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS saved_excuses ("
+                "id TEXT PRIMARY KEY, excuse_text TEXT NOT NULL, scenario TEXT, user_role TEXT, "
+                "recipient TEXT, language TEXT, saved_at TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_saved_scenario_language ON saved_excuses (scenario, language)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_saved_saved_at ON saved_excuses (saved_at, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_saved_user_role ON saved_excuses (user_role, saved_at)")
+        if self.legacy_json_path:
+            self._migrate_json(conn, self.legacy_json_path)
+
+    def _migrate_json(self, conn, json_path):
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except json.JSONDecodeError:
+            logger.warning("%s is empty or malformed; skipping migration of saved excuses", json_path)
+            legacy = {}
+        except Exception:
+            logger.exception("failed to load saved excuses from %s", json_path)
+            return
+        rows = [
+            tuple(record.get(field) for field in SAVED_EXCUSE_FIELDS)
+            for record in legacy.values()
+            if isinstance(record, dict) and record.get("id") and record.get("excuse_text")
+        ]
+        with conn:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO saved_excuses ({', '.join(SAVED_EXCUSE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, ''))",
+                rows
+            )
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except OSError:
+            # Another worker migrated it first
+            pass
+        logger.info("migrated %d saved excuses from %s to %s", len(rows), json_path, self.db_path)
+
+    def add(self, record):
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO saved_excuses ({', '.join(SAVED_EXCUSE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                tuple(record.get(field) for field in SAVED_EXCUSE_FIELDS)
+            )
+
+    def delete(self, excuse_id):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM saved_excuses WHERE id = ?", (excuse_id,)).rowcount > 0
+
+    def _query(self, filters=None, after=None, limit=None):
+        clauses = []
+        params = []
+        for field in ("scenario", "language", "user_role"):
+            if filters and filters.get(field):
+                clauses.append(f"{field} = ?")
+                params.append(filters[field])
+        if filters and filters.get("since"):
+            clauses.append("saved_at >= ?")
+            params.append(filters["since"])
+        if filters and filters.get("until"):
+            clauses.append("saved_at < ?")
+            params.append(filters["until"])
+        if after is not None:
+            # Keyset pagination: rows strictly after the last (saved_at, id) the client has seen
+            clauses.append("(saved_at < ? OR (saved_at = ? AND id < ?))")
+            params.extend([after[0], after[0], after[1]])
+        sql = f"SELECT {', '.join(SAVED_EXCUSE_FIELDS)} FROM saved_excuses"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY saved_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._connect().execute(sql, params)
+
+    def page(self, filters=None, after=None, limit=50):
+        rows = [dict(row) for row in self._query(filters, after, limit + 1)]
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = (rows[-1]["saved_at"], rows[-1]["id"])
+        return rows, next_after
+
+    def iter(self, filters=None, after=None, limit=None, batch_size=500):
+        cursor = self._query(filters, after, limit)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM saved_excuses").fetchone()[0]
+
+
+saved_excuse_store = SavedExcuseStore(SAVED_EXCUSES_DB, SAVED_EXCUSES_FILE)
+after_fork_hooks.append(saved_excuse_store.reset_after_fork)
+
+# Per-client token buckets, shared by all worker processes through one SQLite file. A limit "N/S" allows
+# bursts of N and refills N tokens every S seconds; "0" turns it off. Endpoint limits count requests
+# (bundled proofs each count once); the inference limits count model calls, per client and across all
+# clients, so the upstream sees bounded load whoever is calling. Excuses, including batch items, are
+# charged for a model call only when they are about to make one. Every check takes SQLite's write lock
+# on RATE_LIMIT_DB, so checks from all workers run one at a time: a known ceiling of roughly 20,000 checks
+# per second in total, however many workers there are.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_DB = os.path.abspath(os.getenv("RATE_LIMIT_DB", os.path.join(app.root_path, 'excusify_ratelimit.db')))
+# Header naming the client when behind a proxy, e.g. X-Forwarded-For; the remote address otherwise
+RATE_LIMIT_CLIENT_HEADER = os.getenv("RATE_LIMIT_CLIENT_HEADER", "")
+RATE_LIMITS = {
+    "generate": os.getenv("RATE_LIMIT_GENERATE", "30/60"),
+    "batch": os.getenv("RATE_LIMIT_BATCH", "10/60"),
+    "proof": os.getenv("RATE_LIMIT_PROOF", "20/60"),
+    "speech": os.getenv("RATE_LIMIT_SPEECH", "20/60"),
+    "inference": os.getenv("RATE_LIMIT_INFERENCE", "20/60"),
+    "inference_global": os.getenv("RATE_LIMIT_INFERENCE_GLOBAL", "240/60"),
+}
 
-def _save_saved_excuses(data):
+metrics.counter("rate_limited_total", "Requests and batch items refused by a rate limit, by endpoint and the limit that refused them.")
+RATE_LIMITED_MESSAGE = "Too many requests, please slow down."
+
+
+def parse_rate_limit(name, value):
+    # "N/S" -> (capacity N, refill rate N/S per second); None when the limit is off
+    capacity, _, seconds = str(value).strip().partition("/")
     try:
-        with open(SAVED_EXCUSES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving excuses to {SAVED_EXCUSES_FILE}: {e}")
+        capacity = float(capacity or 0)
+        seconds = float(seconds or 1)
+    except ValueError:
+        capacity = seconds = math.nan
+    if capacity == 0:
+        return None
+    if not (capacity > 0 and seconds > 0 and math.isfinite(capacity) and math.isfinite(seconds)):
+        raise ValueError(f"Invalid rate limit {name}={value!r}: expected 'burst/seconds' with positive numbers, e.g. '30/60', or '0' to turn it off.")
+    return capacity, capacity / seconds
+
+
+class RateLimiter(SQLiteStore):
+    def __init__(self, db_path, limits, enabled=True):
+        super().__init__(db_path)
+        self.enabled = enabled
+        self.limits = {}
+        for name, value in limits.items():
+            parsed = parse_rate_limit(f"RATE_LIMIT_{name.upper()}", value)
+            if parsed is not None:
+                self.limits[name] = parsed
+        self.counters = ShardedCounter()
+        self.pruned = 0
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "bucket TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def acquire(self, charges):
+        # charges: (limit name, client key, cost). Takes every cost or none of them and returns
+        # (allowed, retry_after, refusing limit). A cost above the burst size takes a full bucket,
+        # so every request can get through once the client has waited long enough.
+        charges = [(name, key, min(cost, self.limits[name][0])) for name, key, cost in charges if cost > 0 and name in self.limits]
+        if not self.enabled or not charges:
+            self.counters.incr("allowed")
+            return True, 0.0, None
+        # Wall-clock time, since buckets are shared with other processes
+        now = time.time()
+        refused, wait, updates = None, 0.0, []
+        conn = self._connect()
+        with conn:
+            # Takes the write lock up front so the read-refill-take below is atomic across workers
+            conn.execute("BEGIN IMMEDIATE")
+            for name, key, cost in charges:
+                capacity, rate = self.limits[name]
+                bucket = f"{name}:{key}"
+                row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE bucket = ?", (bucket,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                if tokens < cost:
+                    needed = (cost - tokens) / rate
+                    if needed > wait:
+                        refused, wait = name, needed
+                updates.append((bucket, tokens - cost, now))
+            if refused is None:
+                conn.executemany(
+                    "INSERT INTO rate_buckets (bucket, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(bucket) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    updates
+                )
+        if refused is not None:
+            self.counters.incr(("rejected", refused))
+            return False, wait, refused
+        self.counters.incr("allowed")
+        return True, 0.0, None
+
+    def prune(self):
+        # A bucket untouched for longer than its refill time is full again, which is what a missing row means
+        if not self.enabled or not self.limits:
+            return
+        idle = max(capacity / rate for capacity, rate in self.limits.values())
+        with self._connect() as conn:
+            removed = conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (time.time() - idle,)).rowcount
+        self.pruned += removed
+
+    def stats(self):
+        counts = self.counters.snapshot()
+        stats = {
+            "enabled": self.enabled,
+            "limits": {name: {"burst": capacity, "per_second": rate} for name, (capacity, rate) in self.limits.items()},
+            "allowed": counts.get("allowed", 0),
+            "rejected": {name: counts.get(("rejected", name), 0) for name in self.limits},
+            "pruned": self.pruned
+        }
+        if self.enabled:
+            stats["buckets"] = self._connect().execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+        return stats
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_DB, RATE_LIMITS, RATE_LIMIT_ENABLED)
+maintenance_tasks.append(rate_limiter.prune)
+after_fork_hooks.append(rate_limiter.reset_after_fork)
+
+
+def rate_limit_client():
+    if RATE_LIMIT_CLIENT_HEADER:
+        # X-Forwarded-For style lists name the original client first
+        client = request.headers.get(RATE_LIMIT_CLIENT_HEADER, "").split(",")[0].strip()
+        if client:
+            return client
+    return request.remote_addr or "unknown"
+
+
+# Cost functions take the request's JSON body and return (requests, model calls). Excuses pay for their
+# model call only when they make one, through model_call_budget, so cache and pool hits are free.
+def request_cost(data):
+    return 1, 0
+
+
+def proof_cost(data):
+    # Only the doctor's note asks the model, for a diagnosis
+    proof_type = data.get("proof_type", "doctor_note") if isinstance(data, dict) else None
+    return 1, int(proof_type == "doctor_note" and bool(HUGGINGFACE_API_TOKEN))
+
+
+def proof_bundle_cost(data):
+    proof_types = data.get("proof_types") if isinstance(data, dict) else None
+    if not proof_types:
+        proof_types = list(PROOF_TYPES)
+    if not isinstance(proof_types, list):
+        return 1, 0
+    return len(set(map(str, proof_types))), int("doctor_note" in proof_types and bool(HUGGINGFACE_API_TOKEN))
+
+
+def rate_limit_retry_after(seconds):
+    return max(1, math.ceil(seconds))
+
+
+def model_call_budget(client, endpoint):
+    # For work metered as it runs: returns a function that takes one model call from the client's and the
+    # global inference budgets, returning None when allowed or the seconds to wait; None when limits are off
+    if not rate_limiter.enabled:
+        return None
+
+    def take():
+        try:
+            allowed, retry_after, refused = rate_limiter.acquire([("inference", client, 1), ("inference_global", "*", 1)])
+        except sqlite3.Error:
+            metrics.inc("errors_total", stage="rate_limit")
+            logger.exception("rate limiter failed, allowing model call db=%s", rate_limiter.db_path)
+            return None
+        if allowed:
+            return None
+        metrics.inc("rate_limited_total", endpoint=endpoint, limit=refused)
+        return rate_limit_retry_after(retry_after)
+    return take
+
+
+def rate_limited(limit, cost=request_cost):
+    # Charges the client's `limit` bucket and the inference budgets before running the view
+    def decorator(view):
+        @wraps(view)
+        def limited_view(*args, **kwargs):
+            if not rate_limiter.enabled:
+                return view(*args, **kwargs)
+            calls, model_calls = cost(request.get_json(silent=True))
+            client = rate_limit_client()
+            charges = [(limit, client, calls), ("inference", client, model_calls), ("inference_global", "*", model_calls)]
+            try:
+                allowed, retry_after, refused = rate_limiter.acquire(charges)
+            except sqlite3.Error:
+                # An unavailable limiter must not take the API down with it
+                metrics.inc("errors_total", stage="rate_limit")
+                logger.exception("rate limiter failed, allowing request db=%s", rate_limiter.db_path)
+                return view(*args, **kwargs)
+            if allowed:
+                return view(*args, **kwargs)
+            metrics.inc("rate_limited_total", endpoint=request.endpoint, limit=refused)
+            logger.debug("rate limited client=%s endpoint=%s limit=%s", client, request.endpoint, refused)
+            retry_after = rate_limit_retry_after(retry_after)
+            response = jsonify({"error": RATE_LIMITED_MESSAGE, "retry_after": retry_after})
+            response.headers["Retry-After"] = str(retry_after)
+            return response, 429
+        return limited_view
+    return decorator
+
 
 @app.route("/")
 def home():
     return render_template("index.html")
 
-@app.route("/generate", methods=["POST"])
-def generate_excuse():
-    data = request.get_json()
-    scenario = data.get("scenario", "generic situation")
-    user_role = data.get("user_role", "generic")
-    recipient = data.get("recipient", "generic")
-    urgency = data.get("urgency", "medium")
-    believability = data.get("believability", "5")
-    language = data.get("language", "en")
-
-    if scenario not in VALID_SCENARIOS:
-        return jsonify({"excuse": "Invalid scenario provided.", "excuse_id": None}), 400
-    
-    language_map = {
-        "en": "English", "es": "Spanish", "fr": "French", "de": "German",
-        "it": "Italian", "pt": "Portuguese", "hi": "Hindi", "bn": "Bengali"
-    }
-    target_language = language_map.get(language, "English")
+def _cache_late_model_excuse(cache_key, future):
+    # A hedged request already answered locally; keep the model's answer for the next identical request
+    if future.cancelled() or future.exception() is not None:
+        return
+    excuse = future.result()
+    if excuse and excuse != EMPTY_EXCUSE_MESSAGE:
+        excuse_cache.put(cache_key, excuse)
+
+
+def _excuse_from_model(cache_key, prompt, language, mode):
+    # Returns (excuse or None, error response or None); None for both means "answer locally"
+    cleaner = get_output_cleaner(language)
+    try:
+        if mode == "hedged":
+            future = inference_pipeline.submit(prompt, cleaner)
+            try:
+                excuse = future.result(EXCUSE_HEDGE_DELAY)
+            except FutureTimeoutError:
+                future.add_done_callback(lambda f: _cache_late_model_excuse(cache_key, f))
+                metrics.inc("excuse_requests_total", source="model", outcome="hedged_out")
+                return None, None
+        else:
+            excuse = inference_pipeline.generate_blocking(prompt, cleaner)
+    except InferenceUnavailable as e:
+        metrics.inc("excuse_requests_total", source="model", outcome="shed")
+        if mode != "model":
+            return None, None
+        return None, ({
+            "excuse": "The excuse generator is busy right now. Please try again shortly.",
+            "excuse_id": None,
+            "retry_after": int(math.ceil(e.retry_after))
+        }, 503)
 
-    prompt = f"""
-    [INST] Generate a concise, realistic, and believable excuse for a {user_role} who needs an excuse for '{scenario}' to their {recipient}. The urgency is {urgency} and believability is {believability}/10 (1=simple, 10=highly detailed). The excuse should be **solely in {target_language}**.
-    Do NOT include any conversational filler, introductions, or explicit translations (e.g., do not say "Translation: [English excuse]"). Provide only the excuse itself.
-    [/INST]
-    """
-    
-    excuse = get_excuse_from_huggingface(prompt)
     if excuse is None:
-        print("Failed to get excuse from AI. Check API key, model access, and network.")
-        return jsonify({"excuse": "Failed to get excuse from AI. Please try again.", "excuse_id": None}), 500
-    
+        metrics.inc("excuse_requests_total", source="model", outcome="failed")
+        logger.warning("failed to get excuse from the model; check API key, model access and network")
+        if mode != "model":
+            return None, None
+        return None, ({"excuse": "Failed to get excuse from AI. Please try again.", "excuse_id": None}, 500)
+    if excuse == EMPTY_EXCUSE_MESSAGE:
+        metrics.inc("excuse_requests_total", source="model", outcome="empty")
+        return (excuse, None) if mode == "model" else (None, None)
+    excuse_cache.put(cache_key, excuse)
+    metrics.inc("excuse_requests_total", source="model", outcome="ok")
+    return excuse, None
+
+
+def _parse_excuse_request(data):
+    # Returns (parameters, error response or None)
+    params = {
+        "scenario": data.get("scenario", "generic situation"),
+        "user_role": data.get("user_role", "generic"),
+        "recipient": data.get("recipient", "generic"),
+        "urgency": data.get("urgency", "medium"),
+        "believability": data.get("believability", "5"),
+        "language": data.get("language", "en"),
+        "mode": str(data.get("mode") or EXCUSE_ENGINE_MODE).lower()
+    }
+    if params["scenario"] not in VALID_SCENARIOS:
+        return params, ({"excuse": "Invalid scenario provided.", "excuse_id": None}, 400)
+    if params["mode"] not in EXCUSE_ENGINE_MODES:
+        return params, ({"excuse": f"Invalid mode provided. Use one of: {', '.join(EXCUSE_ENGINE_MODES)}.", "excuse_id": None}, 400)
+    return params, None
+
+
+def _local_reason(params):
+    # Why an answer would come from the local engine; None when the model should be asked first
+    if params["mode"] == "local":
+        return "primary"
+    if params["mode"] != "model" and not HUGGINGFACE_API_TOKEN:
+        return "unconfigured"
+    return None
+
+
+def _excuse_cache_key(params):
+    return make_excuse_cache_key(params["scenario"], params["user_role"], params["recipient"], params["urgency"], params["believability"], params["language"])
+
+
+def _excuse_prompt(params):
+    return build_excuse_prompt(params["scenario"], params["user_role"], params["recipient"], params["urgency"], params["believability"], params["language"])
+
+
+def _local_excuse(params, reason):
+    metrics.inc("excuse_requests_total", source="local", outcome=reason)
+    return local_excuse_engine.generate(params["scenario"], params["user_role"], params["recipient"], params["believability"], params["language"])
+
+
+def _stored_excuse(params, cache_key):
+    # An exact cached answer first, then a pre-generated one for the scenario, language and believability
+    excuse = excuse_cache.get(cache_key)
+    if excuse is not None:
+        metrics.inc("excuse_requests_total", source="cache", outcome="ok")
+        return excuse, "cache"
+    excuse = excuse_pool.pop(params["scenario"], params["language"], params["believability"])
+    if excuse is not None:
+        metrics.inc("excuse_requests_total", source="pool", outcome="ok")
+        return excuse, "pool"
+    return None, None
+
+
+def _record_generated_excuse(params, excuse, source):
     excuse_id = str(uuid.uuid4())
     
-    current_time_iso = datetime.now().isoformat()
-    excuses_db[excuse_id] = {
-        "excuse_text": excuse,
-        "scenario": scenario,
-        "user_role": user_role,
-        "recipient": recipient,
-        "believability": believability,
-        "timestamp": current_time_iso,
-        "feedback": {"effective_count": 0, "total_feedback": 0}
-    }
+    state_store.record_excuse(excuse_id, excuse, params["scenario"], params["user_role"], params["recipient"], params["believability"], datetime.now(), language=params["language"])
+
+    logger.debug("generated excuse excuse_id=%s source=%s", excuse_id, source)
+    return {"excuse": excuse, "excuse_id": excuse_id, "source": source}
+
+
+def _create_excuse(data, model_budget=None):
+    # model_budget, when given, is asked before each model call (see model_call_budget)
+    params, error = _parse_excuse_request(data)
+    if error is not None:
+        return error
+    mode = params["mode"]
+
+    excuse = None
+    source = "local"
+    local_reason = _local_reason(params)
+    if local_reason is None:
+        local_reason = "fallback" if mode == "fallback" else "hedged"
+        cache_key = _excuse_cache_key(params)
+        excuse, source = _stored_excuse(params, cache_key)
+        retry_after = model_budget() if excuse is None and model_budget is not None else None
+        if retry_after is not None:
+            if mode == "model":
+                return {"excuse": RATE_LIMITED_MESSAGE, "excuse_id": None, "retry_after": retry_after}, 429
+            local_reason = "rate_limited"
+        elif excuse is None:
+            excuse, error = _excuse_from_model(cache_key, _excuse_prompt(params), params["language"], mode)
+            if error is not None:
+                return error
+            source = "model"
+
+    if excuse is None:
+        excuse = _local_excuse(params, local_reason)
+        source = "local"
     
-    insights_db["frequent_scenarios"][scenario] = insights_db["frequent_scenarios"].get(scenario, 0) + 1
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    insights_db["daily_counts"][today_str] = insights_db["daily_counts"].get(today_str, 0) + 1
+    return _record_generated_excuse(params, excuse, source), 200
+
+@app.route("/generate", methods=["POST"])
+@rate_limited("generate")
+def generate_excuse():
+    payload, status = _create_excuse(request.get_json(), model_call_budget(rate_limit_client(), request.endpoint))
+    response = jsonify(payload)
+    if "retry_after" in payload:
+        response.headers["Retry-After"] = str(payload["retry_after"])
+    return response, status
+
+def _sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _stream_model_excuse(cache_key, prompt, language, mode):
+    # Yields "delta" events as cleaned text becomes stable; returns (excuse or None, error payload or None)
+    # with the same meaning as _excuse_from_model
+    incremental = IncrementalCleaner(get_output_cleaner(language))
+    try:
+        pieces = inference_pipeline.stream(prompt)
+        try:
+            for piece in pieces:
+                delta = incremental.feed(piece)
+                if delta:
+                    yield _sse_event("delta", {"text": delta})
+                if incremental.finished:
+                    # A translation label ends the excuse; stop paying for the rest of the generation
+                    break
+        finally:
+            pieces.close()
+    except InferenceUnavailable as e:
+        metrics.inc("excuse_requests_total", source="model", outcome="shed")
+        if mode != "model":
+            return None, None
+        return None, {
+            "error": "The excuse generator is busy right now. Please try again shortly.",
+            "status": 503,
+            "retry_after": int(math.ceil(e.retry_after))
+        }
+    except (requests.exceptions.RequestException, ValueError):
+        metrics.inc("excuse_requests_total", source="model", outcome="failed")
+        logger.warning("failed to stream excuse from the model; check API key, model access and network")
+        if mode != "model":
+            return None, None
+        return None, {"error": "Failed to get excuse from AI. Please try again.", "status": 500}
+
+    with metrics.timer("cleaning_duration_seconds"):
+        excuse = incremental.result()
+    if not excuse:
+        metrics.inc("excuse_requests_total", source="model", outcome="empty")
+        return (EMPTY_EXCUSE_MESSAGE, None) if mode == "model" else (None, None)
+    excuse_cache.put(cache_key, excuse)
+    metrics.inc("excuse_requests_total", source="model", outcome="ok")
+    return excuse, None
+
+
+def _stream_excuse(params, model_budget=None):
+    # An SSE comment goes out first so headers reach the browser before the model has produced anything
+    yield ": generating\n\n"
+    try:
+        excuse = None
+        source = "local"
+        local_reason = _local_reason(params)
+        if local_reason is None:
+            # Hedging is unnecessary here: partial text already shows while the model is writing
+            local_reason = "fallback"
+            cache_key = _excuse_cache_key(params)
+            excuse, source = _stored_excuse(params, cache_key)
+            retry_after = model_budget() if excuse is None and model_budget is not None else None
+            if retry_after is not None:
+                if params["mode"] == "model":
+                    yield _sse_event("error", {"error": RATE_LIMITED_MESSAGE, "status": 429, "retry_after": retry_after})
+                    return
+                local_reason = "rate_limited"
+            elif excuse is None:
+                excuse, error = yield from _stream_model_excuse(cache_key, _excuse_prompt(params), params["language"], params["mode"])
+                if error is not None:
+                    yield _sse_event("error", error)
+                    return
+                source = "model"
+        if excuse is None:
+            excuse = _local_excuse(params, local_reason)
+            source = "local"
+        if source != "model":
+            yield _sse_event("delta", {"text": excuse})
+        # The id is only issued once the excuse is complete; "done" also carries the authoritative text
+        yield _sse_event("done", _record_generated_excuse(params, excuse, source))
+    except Exception:
+        metrics.inc("errors_total", stage="stream")
+        logger.exception("failed to stream excuse")
+        yield _sse_event("error", {"error": "Unexpected server error while generating the excuse.", "status": 500})
+
+@app.route("/generate_stream", methods=["POST"])
+@rate_limited("generate")
+def generate_excuse_stream():
+    params, error = _parse_excuse_request(request.get_json(silent=True) or {})
+    if error is not None:
+        payload, status = error
+        return jsonify(payload), status
+    model_budget = model_call_budget(rate_limit_client(), request.endpoint)
+    response = Response(stream_with_context(_stream_excuse(params, model_budget)), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Keeps nginx-style proxies from buffering the whole stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/generate_batch", methods=["POST"])
+@rate_limited("batch", request_cost)
+def generate_excuse_batch():
+    data = request.get_json(silent=True)
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Provide a non-empty list of parameter sets in 'items'."}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"A batch may contain at most {BATCH_MAX_ITEMS} items."}), 400
+    # Items run outside the request context, so the client is resolved here
+    model_budget = model_call_budget(rate_limit_client(), request.endpoint)
+
+    def run_item(item):
+        if not isinstance(item, dict):
+            return {"error": "Each item must be an object of /generate parameters.", "status": 400}
+        payload, status = _create_excuse(item, model_budget)
+        if status != 200:
+            error = {"error": payload["excuse"], "status": status}
+            if "retry_after" in payload:
+                error["retry_after"] = payload["retry_after"]
+            return error
+        return {**payload, "status": status}
+
+    def stream_results():
+        executor = ThreadPoolExecutor(max_workers=min(BATCH_MAX_CONCURRENCY, len(items)), thread_name_prefix="batch")
+        try:
+            futures = {executor.submit(run_item, item): index for index, item in enumerate(items)}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception:
+                    metrics.inc("errors_total", stage="batch")
+                    logger.exception("failed to generate batch item index=%s", futures[future])
+                    result = {"error": "Unexpected server error while generating this item.", "status": 500}
+                yield json.dumps({"index": futures[future], **result}, ensure_ascii=False) + "\n"
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return Response(stream_with_context(stream_results()), mimetype="application/x-ndjson")
+
+# Text-to-speech: audio files are named by a hash of (language, text) and synthesized on a worker pool
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "2"))
+# Seconds after which a synthesis still marked pending is presumed lost with its worker and may be restarted
+TTS_PENDING_TIMEOUT = float(os.getenv("TTS_PENDING_TIMEOUT", "300"))
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")
+
+
+class GTTSEngine:
+    name = "gtts"
+
+    def preload(self):
+        importlib.import_module("gtts")
+
+    def synthesize(self, text, language, path):
+        from gtts import gTTS
+        gTTS(text=text, lang=language).save(path)
+
+
+def load_tts_engine(spec):
+    # "gtts" or an import path such as "mypackage.engines:StubEngine"; engines may offer preload()
+    if spec == "gtts":
+        return GTTSEngine()
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+class SpeechSynthesizer:
+    # Synthesis state is kept as marker files beside the audio in the store, so every worker process sees
+    # the same pending and failed requests: <file>.pending while a worker synthesizes, <file>.failed after.
+    def __init__(self, engine, store, workers, pending_timeout=300.0):
+        self.engine = engine
+        self.store = store
+        self.workers = workers
+        self.pending_timeout = pending_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.counters = ShardedCounter()
+
+    def reset_after_fork(self):
+        # The parent's worker threads do not exist here; syntheses it had queued are its own to finish
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tts")
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def audio_key(text, language):
+        return hashlib.sha256(f"{language}\n{text}".encode("utf-8")).hexdigest()[:40]
+
+    @staticmethod
+    def filename(audio_key):
+        return f"tts_{audio_key}.mp3"
+
+    def path(self, audio_key):
+        return self.store.path_for(self.filename(audio_key))
+
+    @staticmethod
+    def _remove_marker(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _pending_age(self, path):
+        try:
+            return time.time() - os.stat(f"{path}.pending").st_mtime
+        except OSError:
+            return None
+
+    def _claim(self, path):
+        # Atomically marks the synthesis pending; False when a live worker already has it
+        for _ in range(2):
+            try:
+                os.close(os.open(f"{path}.pending", os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                age = self._pending_age(path)
+                if age is not None and age <= self.pending_timeout:
+                    return False
+                self._remove_marker(f"{path}.pending")
+                continue
+            self._remove_marker(f"{path}.failed")
+            return True
+        return False
+
+    def _synthesize(self, audio_key, text, language):
+        final_path = self.path(audio_key)
+        # Write to a temp name first so a half-written mp3 is never served as finished
+        tmp_path = f"{final_path}.{uuid.uuid4().hex}{FileStore.TEMP_SUFFIX}"
+        try:
+            with metrics.timer("tts_duration_seconds", engine=self.engine.name):
+                self.engine.synthesize(text, language, tmp_path)
+            os.replace(tmp_path, final_path)
+            self.store.register(final_path)
+            logger.debug("synthesized audio file=%s engine=%s", self.filename(audio_key), self.engine.name)
+        except Exception as e:
+            metrics.inc("errors_total", stage="tts")
+            logger.exception("failed to synthesize speech audio_key=%s", audio_key)
+            try:
+                with open(f"{final_path}.failed", "w", encoding="utf-8") as f:
+                    f.write(str(e))
+            except OSError:
+                logger.exception("failed to record speech failure audio_key=%s", audio_key)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            self._remove_marker(f"{final_path}.pending")
+            with self._lock:
+                self._inflight.pop(audio_key, None)
+
+    def request(self, text, language):
+        audio_key = self.audio_key(text, language)
+        path = self.path(audio_key)
+        if os.path.exists(path):
+            self.store.touch(path)
+            self.counters.incr("cache_hits")
+            return audio_key, True
+        with self._lock:
+            if audio_key in self._inflight or not self._claim(path):
+                self.counters.incr("deduplicated")
+                return audio_key, False
+            try:
+                self._inflight[audio_key] = self._executor.submit(self._synthesize, audio_key, text, language)
+            except RuntimeError:
+                self._remove_marker(f"{path}.pending")
+                raise
+            self.counters.incr("syntheses")
+        return audio_key, False
+
+    def status(self, audio_key):
+        path = self.path(audio_key)
+        if os.path.exists(path):
+            return {"status": "done"}
+        age = self._pending_age(path)
+        if age is not None:
+            if age <= self.pending_timeout:
+                return {"status": "pending"}
+            return {"status": "failed", "error": "Speech synthesis did not finish. Please try again."}
+        try:
+            with open(f"{path}.failed", encoding="utf-8") as f:
+                return {"status": "failed", "error": f.read()}
+        except OSError:
+            return None
+
+    def stats(self):
+        counts = self.counters.snapshot()
+        with self._lock:
+            return {
+                "engine": self.engine.name,
+                "in_flight": len(self._inflight),
+                "cache_hits": counts.get("cache_hits", 0),
+                "syntheses": counts.get("syntheses", 0),
+                "deduplicated": counts.get("deduplicated", 0)
+            }
+
+
+speech_synthesizer = SpeechSynthesizer(load_tts_engine(TTS_ENGINE), audio_store, TTS_WORKERS, TTS_PENDING_TIMEOUT)
+after_fork_hooks.append(speech_synthesizer.reset_after_fork)
 
-    print(f"Generated excuse ID: {excuse_id}")
-    return jsonify({"excuse": excuse, "excuse_id": excuse_id})
 
 @app.route("/speak_excuse", methods=["POST"])
+@rate_limited("speech", request_cost)
 def speak_excuse():
     data = request.get_json()
     excuse_text = data.get("excuse", "")
-    excuse_id = data.get("excuse_id", str(uuid.uuid4()))
     language_code = data.get("language", "en")
 
     if not excuse_text:
         return jsonify({"error": "No excuse text provided"}), 400
 
     try:
-        tts = gTTS(text=excuse_text, lang=language_code)
+        audio_key, ready = speech_synthesizer.request(excuse_text, language_code)
+    except Exception as e:
+        metrics.inc("errors_total", stage="tts")
+        logger.exception("failed to queue speech")
+        return jsonify({"error": str(e)}), 500
 
-        audio_filename = f"excuse_{excuse_id}_{language_code}.mp3"
-        audio_filepath = os.path.join(AUDIO_OUTPUT_DIR, audio_filename)
-        
-        print(f"Attempting to save audio to: {audio_filepath}")
-        tts.save(audio_filepath)
-        
-        time.sleep(0.5)
+    audio_url = url_for('serve_audio_file', filename=speech_synthesizer.filename(audio_key))
+    if ready:
+        return jsonify({"audio_url": audio_url, "status": "done"})
+    status_url = url_for('get_speech_status', audio_key=audio_key)
+    return jsonify({"audio_url": audio_url, "status": "pending", "status_url": status_url}), 202
+
+@app.route("/speak_status/<audio_key>", methods=["GET"])
+def get_speech_status(audio_key):
+    status = speech_synthesizer.status(audio_key)
+    if status is None:
+        return jsonify({"error": "Audio request not found."}), 404
+    if status["status"] == "done":
+        status["audio_url"] = url_for('serve_audio_file', filename=speech_synthesizer.filename(audio_key))
+    return jsonify(status)
+
+
+# Proofs are rendered on a worker pool; clients poll /proof_status/<job_id> for the result
+PROOF_WORKERS = int(os.getenv("PROOF_WORKERS", "4"))
+PROOF_JOB_TTL = float(os.getenv("PROOF_JOB_TTL", "900"))
+PROOF_TYPES = ("doctor_note", "chat_screenshot", "location_log")
+
+proof_executor = ThreadPoolExecutor(max_workers=PROOF_WORKERS, thread_name_prefix="proof")
+
+
+def _reset_proof_executor():
+    # An executor copied from the parent has no worker threads in this process
+    global proof_executor
+    proof_executor = ThreadPoolExecutor(max_workers=PROOF_WORKERS, thread_name_prefix="proof")
+
+
+after_fork_hooks.append(_reset_proof_executor)
+
+
+class ProofJobStore(SQLiteStore):
+    # Proof jobs live in the shared state database, so any worker process can answer /proof_status and
+    # /proof_download for a job another worker runs. Proofs served from /proof_download are stored in the
+    # proof FileStore; the row keeps only their file name, so rendering never contends for the write lock.
+    FIELDS = ("job_id", "excuse_id", "proof_type", "status", "proof_url", "error", "created_at", "updated_at")
+
+    def __init__(self, db_path, ttl, file_store):
+        super().__init__(db_path)
+        self.ttl = ttl
+        self.file_store = file_store
+        self.pruned = 0
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS proof_jobs ("
+                "job_id TEXT PRIMARY KEY, excuse_id TEXT, proof_type TEXT NOT NULL, status TEXT NOT NULL, "
+                "proof_url TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "file_name TEXT)"
+            )
+            # Tables created when rendered proofs were stored in the row
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(proof_jobs)")}
+            if "file_name" not in columns:
+                try:
+                    conn.execute("ALTER TABLE proof_jobs ADD COLUMN file_name TEXT")
+                except sqlite3.OperationalError:
+                    # Added by another worker in the meantime
+                    pass
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_proof_jobs_updated_at ON proof_jobs (updated_at)")
+
+    def create(self, job_id, excuse_id, proof_type):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO proof_jobs (job_id, excuse_id, proof_type, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, excuse_id, proof_type, now, now)
+            )
+
+    def update(self, job_id, status, proof_url=None, error=None, file_name=None):
+        # file_name: a proof in the FileStore served from /proof_download
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE proof_jobs SET status = ?, proof_url = ?, error = ?, file_name = COALESCE(?, file_name), "
+                "updated_at = ? WHERE job_id = ?",
+                (status, proof_url, error, file_name, time.time(), job_id)
+            )
+
+    def delete(self, job_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM proof_jobs WHERE job_id = ?", (job_id,))
+
+    def get(self, job_id):
+        row = self._connect().execute(f"SELECT {', '.join(self.FIELDS)} FROM proof_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {field: row[field] for field in self.FIELDS if row[field] is not None}
+
+    def file_name(self, job_id):
+        row = self._connect().execute("SELECT file_name FROM proof_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row["file_name"] if row is not None else None
+
+    def prune(self):
+        # Finished jobs expire after the TTL; unfinished ones after twice that, once their worker has gone away
+        now = time.time()
+        expired = "updated_at < ? AND (status IN ('done', 'failed') OR updated_at < ?)"
+        cutoffs = (now - self.ttl, now - 2 * self.ttl)
+        with self._connect() as conn:
+            file_names = [row[0] for row in conn.execute(f"SELECT file_name FROM proof_jobs WHERE {expired} AND file_name IS NOT NULL", cutoffs)]
+            removed = conn.execute(f"DELETE FROM proof_jobs WHERE {expired}", cutoffs).rowcount
+        # Proofs served through their job go with it
+        for file_name in file_names:
+            self.file_store.discard(file_name)
+        self.pruned += removed
+
+    def status_counts(self):
+        return {row[0]: row[1] for row in self._connect().execute("SELECT status, COUNT(*) FROM proof_jobs GROUP BY status")}
+
+
+proof_job_store = ProofJobStore(STATE_DB, PROOF_JOB_TTL, proof_store)
+maintenance_tasks.append(proof_job_store.prune)
+after_fork_hooks.append(proof_job_store.reset_after_fork)
 
-        if os.path.exists(audio_filepath):
-            print(f"SUCCESS: Audio file '{audio_filename}' found on disk at {audio_filepath}")
-        else:
-            print(f"ERROR: Audio file '{audio_filename}' NOT FOUND on disk at {audio_filepath} after tts.save()")
-            return jsonify({"error": "Failed to save audio file to disk."}), 500
 
-        audio_url = url_for('serve_audio_file', filename=audio_filename)
-        print(f"Generated audio URL: {audio_url}")
-        return jsonify({"audio_url": audio_url})
+def _build_proof(proof_type, excuse_id, excuse, scenario, in_memory=False):
+    # A stored file's path, or the file's bytes when in_memory is set; None on failure
+    if proof_type == "doctor_note":
+        return generate_doctor_doc(excuse_id, scenario, in_memory=in_memory)
+    if proof_type == "chat_screenshot":
+        return generate_chat_screenshot(excuse_id, excuse, scenario, in_memory=in_memory)
+    return generate_location_log(excuse_id, scenario, in_memory=in_memory)
+
+
+def _run_proof_job(job_id, proof_type, excuse_id, excuse, scenario):
+    proof_job_store.update(job_id, status="running")
+    try:
+        if proof_type == "doctor_note" and DOCTOR_NOTE_IN_MEMORY:
+            pdf_bytes = generate_doctor_doc(excuse_id, scenario, in_memory=True)
+            if not pdf_bytes:
+                proof_job_store.update(job_id, status="failed", error="Failed to generate proof file (internal generation error). Check server logs for exact reason.")
+                return
+            logger.debug("proof job finished in memory job_id=%s", job_id)
+            file_name = f"doctor_doc_{job_id}.pdf"
+            proof_store.write(file_name, pdf_bytes)
+            proof_job_store.update(job_id, status="done", proof_url=f"/proof_download/{job_id}", file_name=file_name)
+            return
+        proof_path = _build_proof(proof_type, excuse_id, excuse, scenario)
+        if not proof_path:
+            metrics.inc("errors_total", stage="proof")
+            logger.error("proof generation returned no file job_id=%s proof_type=%s", job_id, proof_type)
+            proof_job_store.update(job_id, status="failed", error="Failed to generate proof file (internal generation error). Check server logs for exact reason.")
+            return
+        if not os.path.exists(proof_path):
+            metrics.inc("errors_total", stage="proof")
+            logger.error("proof file missing after generation reported success job_id=%s path=%s", job_id, proof_path)
+            proof_job_store.update(job_id, status="failed", error="Proof file was not found on the server after creation attempt.")
+            return
+        proof_store.register(proof_path)
+        file_basename = os.path.basename(proof_path)
+        logger.debug("proof job finished job_id=%s proof_url=/proofs/%s", job_id, file_basename)
+        proof_job_store.update(job_id, status="done", proof_url=f"/proofs/{file_basename}")
     except Exception as e:
-        print(f"Error generating speech: {e}")
-        traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        metrics.inc("errors_total", stage="proof")
+        logger.exception("unhandled error in proof job job_id=%s", job_id)
+        proof_job_store.update(job_id, status="failed", error=f"Failed to generate proof due to an unexpected server error: ({e}).")
 
 
 @app.route("/generate_proof/<excuse_id>", methods=["POST"])
+@rate_limited("proof", proof_cost)
 def generate_proof(excuse_id):
     data = request.get_json() or {}
     proof_type = data.get("proof_type", "doctor_note")
     excuse = data.get("excuse", "")
     scenario = data.get("scenario", "generic situation")
-    print(f"\n--- Attempting to generate proof: excuse_id={excuse_id}, proof_type={proof_type}, scenario={scenario} ---")
-    
-    proof_path = None
+    logger.debug("queueing proof excuse_id=%s proof_type=%s scenario=%s", excuse_id, proof_type, scenario)
+
+    if proof_type not in PROOF_TYPES:
+        logger.debug("invalid proof type requested proof_type=%s", proof_type)
+        return jsonify({"error": "Invalid proof type."}), 400
+
+    job_id = uuid.uuid4().hex
+    proof_job_store.create(job_id, excuse_id, proof_type)
     try:
-        if proof_type == "doctor_note":
-            proof_path = generate_doctor_doc(excuse_id, scenario)
-        elif proof_type == "chat_screenshot":
-            proof_path = generate_chat_screenshot(excuse_id, excuse, scenario)
-        elif proof_type == "location_log":
-            proof_path = generate_location_log(excuse_id, scenario)
-        else:
-            print(f"Error: Invalid proof type '{proof_type}' requested.")
-            return jsonify({"error": "Invalid proof type."}), 400
+        proof_executor.submit(_run_proof_job, job_id, proof_type, excuse_id, excuse, scenario)
+    except RuntimeError as e:
+        metrics.inc("errors_total", stage="proof")
+        logger.error("could not queue proof job job_id=%s error=%s", job_id, e)
+        proof_job_store.delete(job_id)
+        return jsonify({"error": "Proof workers are unavailable. Please try again."}), 503
+
+    status_url = url_for('get_proof_status', job_id=job_id)
+    response = jsonify({"job_id": job_id, "status": "queued", "status_url": status_url})
+    response.headers["Location"] = status_url
+    return response, 202
+
+# Member name and compression for each proof in a bundle; PNG data is already compressed
+PROOF_BUNDLE_FILES = {
+    "doctor_note": ("doctor_note.pdf", zipfile.ZIP_DEFLATED),
+    "chat_screenshot": ("chat_screenshot.png", zipfile.ZIP_STORED),
+    "location_log": ("location_log.json", zipfile.ZIP_DEFLATED),
+}
 
-        if not proof_path:
-            print(f"CRITICAL: Proof generation function returned None for {proof_type}. This indicates a failure within the generation process itself. Check logs above for details.")
-            return jsonify({"error": "Failed to generate proof file (internal generation error). Check server logs for exact reason."}), 500
 
-        print(f"Proof file path returned by generator: {proof_path}")
-        
-        time.sleep(0.1)
+class ZipChunkSink:
+    # Write-only file object without tell()/seek(): zipfile then writes data descriptors instead of seeking
+    # back to patch headers, so every finished member can be sent to the client straight away
+    def __init__(self):
+        self._chunks = []
 
-        file_exists = os.path.exists(proof_path)
-        print(f"Result of os.path.exists('{proof_path}'): {file_exists}")
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
 
-        if not file_exists:
-            print(f"CRITICAL: Proof file NOT FOUND on disk at {proof_path} even after generation reported success. This is likely a path mismatch or a rare race condition.")
-            return jsonify({"error": f"Proof file was not found on the server at {proof_path} after creation attempt. Path mismatch or race condition."}), 500
+    def flush(self):
+        pass
 
-        file_basename = os.path.basename(proof_path)
-        print(f"Successfully located generated proof file. Sending proof_url: /proofs/{file_basename}")
-        return jsonify({"proof_url": f"/proofs/{file_basename}"})
-    except Exception as e:
-        print(f"UNHANDLED ERROR in /generate_proof/<excuse_id> route: {e}")
-        traceback.print_exc()
-        return jsonify({"error": f"Failed to generate proof due to an unexpected server error: ({e}). Please check server logs for details."}), 500
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+@app.route("/generate_proof_bundle/<excuse_id>", methods=["POST"])
+@rate_limited("proof", proof_bundle_cost)
+def generate_proof_bundle(excuse_id):
+    data = request.get_json(silent=True) or {}
+    proof_types = data.get("proof_types") or list(PROOF_TYPES)
+    excuse = data.get("excuse", "")
+    scenario = data.get("scenario", "generic situation")
+
+    if not isinstance(proof_types, list) or any(proof_type not in PROOF_TYPES for proof_type in proof_types):
+        return jsonify({"error": f"proof_types must be a list of: {', '.join(PROOF_TYPES)}."}), 400
+    proof_types = list(dict.fromkeys(proof_types))
+
+    # Rendering starts before the response does, so a 503 can still be returned
+    started = time.perf_counter()
+    futures = {}
+    try:
+        for proof_type in proof_types:
+            futures[proof_executor.submit(_build_proof, proof_type, excuse_id, excuse, scenario, in_memory=True)] = proof_type
+    except RuntimeError as e:
+        for future in futures:
+            future.cancel()
+        metrics.inc("errors_total", stage="proof")
+        logger.error("could not queue proof bundle excuse_id=%s error=%s", excuse_id, e)
+        return jsonify({"error": "Proof workers are unavailable. Please try again."}), 503
+
+    def stream_bundle():
+        sink = ZipChunkSink()
+        manifest = {"excuse_id": excuse_id, "files": [], "failed": []}
+        try:
+            with zipfile.ZipFile(sink, "w") as archive:
+                # Members are added in the order they finish rendering
+                for future in as_completed(futures):
+                    proof_type = futures[future]
+                    try:
+                        content = future.result()
+                    except Exception:
+                        logger.exception("unhandled error rendering bundled proof excuse_id=%s proof_type=%s", excuse_id, proof_type)
+                        content = None
+                    if not content:
+                        metrics.inc("errors_total", stage="proof")
+                        manifest["failed"].append(proof_type)
+                        continue
+                    name, compression = PROOF_BUNDLE_FILES[proof_type]
+                    member = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                    member.compress_type = compression
+                    archive.writestr(member, content)
+                    manifest["files"].append(name)
+                    yield sink.drain()
+                archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+            # Closing the archive wrote the central directory
+            yield sink.drain()
+            metrics.observe("proof_render_duration_seconds", time.perf_counter() - started, format="zip")
+        finally:
+            for future in futures:
+                future.cancel()
+
+    safe_id = re.sub(r"[^A-Za-z0-9_-]", "", excuse_id)[:64] or "excuse"
+    response = Response(stream_with_context(stream_bundle()), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f'attachment; filename="proofs_{safe_id}.zip"'
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
+
+@app.route("/proof_status/<job_id>", methods=["GET"])
+def get_proof_status(job_id):
+    job = proof_job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Proof job not found."}), 404
+    return jsonify(job)
+
+@app.route("/proof_download/<job_id>", methods=["GET"])
+def download_proof_file(job_id):
+    download_name = proof_job_store.file_name(job_id)
+    full_filepath = proof_store.resolve(download_name) if download_name else None
+    if full_filepath is None:
+        return jsonify({"error": "This proof is no longer available. Please generate it again."}), 404
+    proof_store.touch(full_filepath)
+    with metrics.timer("file_serve_duration_seconds", kind="proof_download"):
+        response = send_file(
+            full_filepath,
+            mimetype=PROOF_MIMETYPES.get(os.path.splitext(download_name)[1].lower(), 'application/octet-stream'),
+            as_attachment=True,
+            download_name=download_name,
+            max_age=PROOF_CACHE_MAX_AGE
+        )
+    # Only the client that queued the job knows its id
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
 
 @app.route('/feedback', methods=['POST'])
 def submit_feedback():
@@ -589,56 +3395,21 @@ def submit_feedback():
     excuse_id = data.get('excuse_id')
     is_effective = data.get('is_effective')
 
-    if excuse_id not in excuses_db:
+    current_feedback = state_store.record_feedback(excuse_id, is_effective)
+    if current_feedback is None:
         return jsonify({"error": "Excuse not found."}), 404
 
-    excuse_data = excuses_db[excuse_id]
-    
-    if excuse_data["excuse_text"] not in insights_db["excuse_feedback"]:
-        insights_db["excuse_feedback"][excuse_data["excuse_text"]] = {"effective_count": 0, "total_feedback": 0}
-
-    excuse_data["feedback"]["total_feedback"] += 1
-    if is_effective:
-        excuse_data["feedback"]["effective_count"] += 1
-
-    insights_db["excuse_feedback"][excuse_data["excuse_text"]]["total_feedback"] += 1
-    if is_effective:
-        insights_db["excuse_feedback"][excuse_data["excuse_text"]]["effective_count"] += 1
-
-    return jsonify({"message": "Feedback received!", "current_feedback": excuse_data["feedback"]})
+    return jsonify({"message": "Feedback received!", "current_feedback": current_feedback})
 
 @app.route('/insights')
 def get_insights():
-    ranked_excuses = sorted(
-        [
-            {"excuse_text": text, **data}
-            for text, data in insights_db["excuse_feedback"].items()
-            if data["total_feedback"] > 0
-        ],
-        key=lambda x: x["effective_count"] / x["total_feedback"],
-        reverse=True
-    )[:5]
-
-    frequent_scenarios_list = sorted(
-        [{"scenario": s, "count": c} for s, c in insights_db["frequent_scenarios"].items()],
-        key=lambda x: x["count"],
-        reverse=True
-    )[:5]
-
-    total_excuses_generated = sum(insights_db["daily_counts"].values())
-    
+    ranked_excuses = state_store.top_excuses()
+    frequent_scenarios_list = state_store.frequent_scenarios()
+
     predicted_excuse_time = "No clear pattern yet (generate more excuses!)"
-    if total_excuses_generated > 5:
-        hour_counts = {}
-        for excuse_id, excuse_data in excuses_db.items():
-            timestamp_str = excuse_data['timestamp']
-            dt_object = datetime.fromisoformat(timestamp_str)
-            hour = dt_object.hour
-            hour_counts[hour] = hour_counts.get(hour, 0) + 1
-        
-        if hour_counts:
-            busiest_hour = max(hour_counts, key=hour_counts.get)
-            predicted_excuse_time = f"{busiest_hour}:00 - {busiest_hour+1}:00 (based on past activity)"
+    if state_store.total_generated() > 5:
+        busiest_hour = state_store.busiest_hour()
+        if busiest_hour is not None:
             if busiest_hour == 0: predicted_excuse_time = "12 AM - 1 AM (based on past activity)"
             elif busiest_hour == 12: predicted_excuse_time = "12 PM - 1 PM (based on past activity)"
             elif busiest_hour > 12: predicted_excuse_time = f"{busiest_hour - 12} PM - {busiest_hour - 11} PM (based on past activity)"
@@ -651,6 +3422,106 @@ def get_insights():
     }
     return jsonify(insights)
 
+@app.route('/stats')
+def get_stats():
+    return jsonify({
+        "http_pool": get_hf_pool_stats(),
+        "excuse_cache": excuse_cache.stats(),
+        "inference": inference_pipeline.stats(),
+        "local_engine": local_excuse_engine.stats(),
+        "excuse_pool": excuse_pool.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "tts": speech_synthesizer.stats(),
+        "storage": {"proofs": proof_store.stats(), "audio": audio_store.stats()},
+        "state": state_store.stats()
+    })
+
+def _component_metrics():
+    # Gauges and totals the components already track for /stats, re-exported for scrapers
+    cache = excuse_cache.stats()
+    yield "excuse_cache_lookups_total", "counter", "Excuse cache lookups, by result.", {"result": "hit"}, cache["hits"]
+    yield "excuse_cache_lookups_total", "counter", "Excuse cache lookups, by result.", {"result": "miss"}, cache["misses"]
+    yield "excuse_cache_evictions_total", "counter", "Excuse cache entries evicted.", {}, cache["evictions"]
+    yield "excuse_cache_keys", "gauge", "Distinct excuse requests currently cached.", {}, cache["keys"]
+
+    pool = excuse_pool.stats()
+    yield "excuse_pool_lookups_total", "counter", "Pre-generated excuse pool lookups, by result.", {"result": "hit"}, pool["hits"]
+    yield "excuse_pool_lookups_total", "counter", "Pre-generated excuse pool lookups, by result.", {"result": "miss"}, pool["misses"]
+    for outcome, field in (("ok", "refills"), ("failed", "refills_failed"), ("shed", "refills_shed"), ("duplicate", "duplicates"), ("deferred", "deferred")):
+        yield "excuse_pool_refill_attempts_total", "counter", "Background pool refill attempts, by outcome.", {"outcome": outcome}, pool[field]
+    yield "excuse_pool_expired_total", "counter", "Pooled excuses dropped unused after EXCUSE_POOL_TTL.", {}, pool["expired"]
+    yield "excuse_pool_refill_lag_current_seconds", "gauge", "How long the longest-short pool key has been below its target depth.", {}, pool["refill_lag_seconds"]
+    for (scenario, language, bucket), depth in excuse_pool.depths().items():
+        yield "excuse_pool_depth", "gauge", "Unused pre-generated excuses, by scenario, language and believability bucket.", {"scenario": scenario, "language": language, "bucket": bucket}, depth
+
+    limits = rate_limiter.stats()
+    yield "rate_limit_decisions_total", "counter", "Rate limit checks, by result.", {"result": "allowed"}, limits["allowed"]
+    if "buckets" in limits:
+        yield "rate_limit_buckets", "gauge", "Token buckets currently tracked in RATE_LIMIT_DB.", {}, limits["buckets"]
+
+    inference = inference_pipeline.stats()
+    yield "inference_in_flight", "gauge", "Distinct prompts currently waiting on the inference API.", {}, inference["in_flight"]
+    yield "inference_upstream_calls_total", "counter", "Calls made to the inference API.", {}, inference["upstream_calls"]
+    yield "inference_coalesced_total", "counter", "Requests served by joining an identical in-flight call.", {}, inference["coalesced"]
+    yield "inference_timeouts_total", "counter", "Requests that gave up waiting for the inference API.", {}, inference["timeouts"]
+    yield "inference_rejected_total", "counter", "Calls shed without reaching the inference API, by reason.", {"reason": "circuit_open"}, inference["rejected_open"]
+    yield "inference_rejected_total", "counter", "Calls shed without reaching the inference API, by reason.", {"reason": "queue_full"}, inference["rejected_queue_full"]
+    yield "inference_upstream_in_flight", "gauge", "Calls currently running against the inference API.", {}, inference["upstream_in_flight"]
+    yield "inference_queue_depth", "gauge", "Calls waiting for an upstream concurrency slot.", {}, inference["queue_depth"]
+    yield "inference_concurrency_limit", "gauge", "Current adaptive limit on concurrent upstream calls.", {}, inference["concurrency_limit"]
+    breaker = inference["breaker"]
+    for state in CircuitBreaker.STATES:
+        yield "inference_circuit_state", "gauge", "1 for the circuit breaker's current state.", {"state": state}, int(breaker["state"] == state)
+        yield "inference_circuit_transitions_total", "counter", "Circuit breaker transitions, by new state.", {"state": state}, breaker["transitions"].get(state, 0)
+
+    for host, pool in get_hf_pool_stats()["hosts"].items():
+        yield "http_pool_connections_opened_total", "counter", "Connections opened to the inference API host.", {"host": host}, pool["connections_opened"]
+        yield "http_pool_available_slots", "gauge", "Idle slots in the inference API connection pool.", {"host": host}, pool["available_slots"]
+
+    tts = speech_synthesizer.stats()
+    yield "tts_cache_hits_total", "counter", "Speech requests served from stored audio.", {}, tts["cache_hits"]
+    yield "tts_syntheses_total", "counter", "Speech syntheses started.", {}, tts["syntheses"]
+    yield "tts_deduplicated_total", "counter", "Speech requests joined to a synthesis already running.", {}, tts["deduplicated"]
+    yield "tts_in_flight", "gauge", "Speech syntheses currently running or queued.", {}, tts["in_flight"]
+
+    for kind, store in (("proofs", proof_store), ("audio", audio_store)):
+        stored = store.stats()
+        yield "storage_bytes", "gauge", "Approximate bytes held by a file store.", {"store": kind}, stored["approx_bytes"]
+        yield "storage_files", "gauge", "Approximate files held by a file store.", {"store": kind}, stored["approx_files"]
+        yield "storage_expired_total", "counter", "Files deleted after their TTL.", {"store": kind}, stored["expired"]
+        yield "storage_evicted_total", "counter", "Files deleted to stay within quota.", {"store": kind}, stored["evicted"]
+
+    job_states = proof_job_store.status_counts()
+    for status in ("queued", "running", "done", "failed"):
+        yield "proof_jobs", "gauge", "Tracked proof jobs of all workers, by status.", {"status": status}, job_states.get(status, 0)
+
+
+metrics.add_collector(_component_metrics)
+
+
+@app.before_request
+def _start_request_timer():
+    request.environ["excusify.start"] = time.perf_counter()
+
+
+@app.after_request
+def _record_request_duration(response):
+    start = request.environ.get("excusify.start")
+    if start is not None:
+        metrics.observe(
+            "http_request_duration_seconds",
+            time.perf_counter() - start,
+            endpoint=request.endpoint or "unmatched",
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route('/save_excuse', methods=['POST'])
 def save_excuse():
     data = request.get_json()
@@ -663,9 +3534,8 @@ def save_excuse():
     if not excuse_text:
         return jsonify({"error": "Excuse text is required to save."}), 400
 
-    saved_excuses = _load_saved_excuses()
     new_id = str(uuid.uuid4())
-    saved_excuses[new_id] = {
+    saved_excuse_store.add({
         "id": new_id,
         "excuse_text": excuse_text,
         "scenario": scenario,
@@ -673,23 +3543,100 @@ def save_excuse():
         "recipient": recipient,
         "language": language,
         "saved_at": datetime.now().isoformat()
-    }
-    _save_saved_excuses(saved_excuses)
+    })
     return jsonify({"message": "Excuse saved successfully!", "id": new_id}), 201
 
+def _encode_saved_cursor(after):
+    return base64.urlsafe_b64encode(json.dumps(after).encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_saved_cursor(cursor):
+    try:
+        saved_at, excuse_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(saved_at), str(excuse_id)
+    except (ValueError, TypeError):
+        return None
+
+def _parse_saved_date(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value).isoformat()
+
 @app.route('/get_saved_excuses', methods=['GET'])
 def get_saved_excuses():
-    saved_excuses = _load_saved_excuses()
-    return jsonify(list(saved_excuses.values()))
+    # Newest first, one page per call; follow next_cursor for more. ?format=ndjson streams every match instead.
+    try:
+        filters = {
+            "scenario": request.args.get('scenario'),
+            "language": request.args.get('language'),
+            "user_role": request.args.get('user_role'),
+            "since": _parse_saved_date(request.args.get('since')),
+            "until": _parse_saved_date(request.args.get('until'))
+        }
+    except ValueError:
+        return jsonify({"error": "since/until must be ISO 8601 dates, e.g. 2024-05-01 or 2024-05-01T09:30:00."}), 400
+
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        after = _decode_saved_cursor(cursor)
+        if after is None:
+            return jsonify({"error": "Invalid cursor."}), 400
+
+    limit = request.args.get('limit', type=int)
+    if request.args.get('format') == 'ndjson':
+        rows = saved_excuse_store.iter(filters, after, limit)
+        return Response(
+            stream_with_context(json.dumps(row, ensure_ascii=False) + "\n" for row in rows),
+            mimetype="application/x-ndjson"
+        )
+
+    limit = max(1, min(limit or SAVED_EXCUSES_PAGE_SIZE, SAVED_EXCUSES_MAX_PAGE_SIZE))
+    items, next_after = saved_excuse_store.page(filters, after, limit)
+    return jsonify({
+        "items": items,
+        "next_cursor": _encode_saved_cursor(next_after) if next_after else None
+    })
 
 @app.route('/delete_saved_excuse/<excuse_id>', methods=['DELETE'])
 def delete_saved_excuse(excuse_id):
-    saved_excuses = _load_saved_excuses()
-    if excuse_id in saved_excuses:
-        del saved_excuses[excuse_id]
-        _save_saved_excuses(saved_excuses)
+    if saved_excuse_store.delete(excuse_id):
         return jsonify({"message": "Excuse deleted successfully!"}), 200
     return jsonify({"error": "Excuse not found."}), 404
 
+# Heavy subsystems load on first use, which keeps boot fast for workers that only serve /generate.
+# PRELOAD_SUBSYSTEMS=all, or a list such as "pdf,imaging", loads them at import instead: useful in a
+# gunicorn master started with --preload, so forked workers share the loaded modules.
+PRELOADABLE_SUBSYSTEMS = ("cleaners", "pdf", "imaging", "tts")
+PRELOAD_SUBSYSTEMS = os.getenv("PRELOAD_SUBSYSTEMS", "")
+
+
+def preload_subsystems(names):
+    """Loads the named subsystems now instead of on first use; returns seconds spent on each."""
+    timings = {}
+    for name in names:
+        start = time.perf_counter()
+        if name == "cleaners":
+            for language in LANGUAGE_MAP:
+                for proof_type in [None] + list(PROOF_CLEANING_RULES):
+                    get_output_cleaner(language, proof_type)
+        elif name == "pdf":
+            get_doctor_note_template()
+        elif name == "imaging":
+            measure_text(load_font(CHAT_FONT_SIZE), CHAT_CLOSING_MESSAGE)
+        elif name == "tts":
+            preload = getattr(speech_synthesizer.engine, "preload", None)
+            if preload is not None:
+                preload()
+        else:
+            logger.warning("ignoring unknown subsystem in PRELOAD_SUBSYSTEMS name=%s; use %s or all", name, ", ".join(PRELOADABLE_SUBSYSTEMS))
+            continue
+        timings[name] = round(time.perf_counter() - start, 4)
+    return timings
+
+
+_preload_names = [name.strip().lower() for name in PRELOAD_SUBSYSTEMS.split(",") if name.strip()]
+if _preload_names:
+    logger.info("preloaded subsystems %s", preload_subsystems(PRELOADABLE_SUBSYSTEMS if "all" in _preload_names else _preload_names))
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""Micro-benchmark for the model output cleaning stage.
+
+Compares the precompiled OutputCleaner in app.py with the per-call
+implementation it replaced, on a corpus of representative raw model
+outputs, and checks that both produce the same text.
+
+    python bench/bench_cleaning.py --iterations 20000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app  # noqa: E402
+
+# Raw generated_text values in the shapes Mixtral returns for the /generate prompt
+MODEL_OUTPUTS = [
+    '[INST] Generate a concise excuse ... [/INST] "I\'m so sorry, my train was delayed by a signal failure and I\'m about 20 minutes out."',
+    "[INST] ... [/INST] Here's an excuse: My laptop crashed right before I could submit the report, and IT is restoring it now.",
+    "[INST] ... [/INST] Excuse: I had a family emergency this morning and had to take my mother to the clinic.",
+    '[INST] ... [/INST] "Lo siento, mi coche se averió en la autopista." Translation: Sorry, my car broke down on the highway.',
+    "[INST] ... [/INST] Désolé, j'avais une forte migraine et je n'ai pas pu venir en cours. English: Sorry, I had a bad migraine.",
+    "[INST] ... [/INST] The excuse is: my phone died and I didn't see your message until late tonight.",
+    "[INST] ... [/INST] In English: I completely lost track of time at the hospital with my sister.",
+    "[INST] ... [/INST] Es tut mir leid, mein Zug ist ausgefallen. German: (this is the German version)",
+    "[INST] ... [/INST] मुझे माफ करना, मेरी तबीयत अचानक खराब हो गई थी। Hindi: Sorry, I suddenly fell ill.",
+    "[INST] ... [/INST]",
+    "No instruction marker here, just an excuse about a flat tyre on the way in.",
+    "[INST] ... [/INST] Your excuse: The power went out in our building and my alarm never went off.",
+]
+
+
+def legacy_clean(raw_text):
+    if "[/INST]" in raw_text:
+        excuse = raw_text.split("[/INST]", 1)[1].strip()
+    else:
+        excuse = raw_text.strip()
+    excuse = excuse.replace('"', '').strip()
+    undesired_prefixes = [
+        "here's an excuse:", "translation:", "english:", "spanish:", "french:", "german:", "italian:",
+        "portuguese:", "hindi:", "bengali:", "in english:", "here's the excuse:", "the excuse is:",
+        "your excuse:", "excuse:"
+    ]
+    prefix_pattern = re.compile(r'^(?:' + '|'.join(re.escape(p) for p in undesired_prefixes) + r')\s*(?::\s*)?', re.IGNORECASE)
+    match = prefix_pattern.match(excuse)
+    if match:
+        excuse = excuse[match.end():].strip()
+    if re.search(r'\b(Translation|English|Spanish|French|German|Italian|Portuguese|Hindi|Bengali)\s*:', excuse, re.IGNORECASE):
+        parts = re.split(r'\b(Translation|English|Spanish|French|German|Italian|Portuguese|Hindi|Bengali)\s*:', excuse, 1, re.IGNORECASE)
+        if len(parts) > 1:
+            excuse = parts[0].strip()
+    return excuse
+
+
+def time_it(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for raw in MODEL_OUTPUTS:
+            func(raw)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    cleaner = app.get_output_cleaner("en")
+    mismatches = [(raw, legacy_clean(raw), cleaner.clean(raw)) for raw in MODEL_OUTPUTS if legacy_clean(raw) != cleaner.clean(raw)]
+    for raw, old, new in mismatches:
+        print(f"MISMATCH\n  raw:    {raw!r}\n  legacy: {old!r}\n  new:    {new!r}")
+
+    calls = args.iterations * len(MODEL_OUTPUTS)
+    legacy_seconds = time_it(legacy_clean, args.iterations)
+    new_seconds = time_it(cleaner.clean, args.iterations)
+    print(f"legacy:  {legacy_seconds * 1e6 / calls:8.2f} us/call")
+    print(f"cleaner: {new_seconds * 1e6 / calls:8.2f} us/call  ({legacy_seconds / new_seconds:.1f}x faster)")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Import-time and cold-start benchmark for app.py.
+
+Each sample imports app.py in a fresh interpreter with throwaway databases
+and measures the import itself, then the first use of each lazily loaded
+subsystem: output cleaning, the doctor's note PDF, chat screenshot text
+measurement and the speech engine. Samples are taken with the default lazy
+loading and with PRELOAD_SUBSYSTEMS=all, which is what a gunicorn master
+started with --preload pays once before forking its workers.
+
+    python bench/bench_import.py --samples 10
+    python bench/bench_import.py --top 15 --json startup.json
+
+--top also runs one import under -X importtime and lists the modules with
+the largest cumulative import cost.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Runs in the child interpreter and prints one JSON object of timings in seconds
+SAMPLE_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+timings = {"import": time.perf_counter() - start}
+
+def first_use(name, func):
+    start = time.perf_counter()
+    func()
+    timings[name] = time.perf_counter() - start
+
+first_use("first_clean", lambda: app.get_output_cleaner("es").clean("[/INST] Excusa: Lo siento. Translation: Sorry."))
+first_use("first_doctor_note", lambda: app.get_doctor_note_template().render("Mild fever and fatigue."))
+first_use("first_text_measure", lambda: app.measure_text(app.load_font(app.CHAT_FONT_SIZE), "Sorry, my train was late."))
+first_use("first_tts_engine", lambda: getattr(app.speech_synthesizer.engine, "preload", lambda: None)())
+print(json.dumps(timings))
+"""
+
+CONFIGURATIONS = {
+    "lazy": {},
+    "preload_all": {"PRELOAD_SUBSYSTEMS": "all"},
+}
+
+
+def child_env(workdir, extra):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "STATE_DB": os.path.join(workdir, "excusify_state.db"),
+        "SAVED_EXCUSES_DB": os.path.join(workdir, "saved_excuses.db"),
+        "RATE_LIMIT_DB": os.path.join(workdir, "excusify_ratelimit.db"),
+        "LOG_LEVEL": "WARNING",
+        "PRELOAD_SUBSYSTEMS": "",
+    })
+    env.update(extra)
+    return env
+
+
+def run_sample(workdir, extra):
+    result = subprocess.run(
+        [sys.executable, "-c", SAMPLE_SCRIPT], cwd=workdir, env=child_env(workdir, extra),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def top_imports(workdir, count):
+    # -X importtime writes "import time: self [us] | cumulative | imported package" lines to stderr
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=workdir, env=child_env(workdir, {}),
+        capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        # Nesting is shown as two spaces per level after the separator's own space
+        name = parts[2][1:].rstrip()
+        # Only direct imports of app.py and its own body, not every nested module
+        if name.startswith("  ") and not name.startswith("   "):
+            modules.append((int(parts[1]) / 1e6, name.strip()))
+        elif name == "app":
+            modules.append((int(parts[0].split(":")[1]) / 1e6, "app (module body)"))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=5, help="fresh interpreters per configuration")
+    parser.add_argument("--top", type=int, default=0, help="also list the N most expensive imports of app.py")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="excusify-import-") as workdir:
+        for name, extra in CONFIGURATIONS.items():
+            samples = [run_sample(workdir, extra) for _ in range(args.samples)]
+            report[name] = {
+                stage: round(statistics.median(sample[stage] for sample in samples) * 1000, 2)
+                for stage in samples[0]
+            }
+        imports = top_imports(workdir, args.top) if args.top else []
+
+    stages = list(next(iter(report.values())))
+    print(f"Median of {args.samples} fresh interpreters, milliseconds\n")
+    print(f"{'stage':<22}" + "".join(f"{name:>14}" for name in report))
+    for stage in stages:
+        print(f"{stage:<22}" + "".join(f"{report[name][stage]:>14}" for name in report))
+    if imports:
+        print("\nLargest imports of app.py (cumulative ms)")
+        for seconds, module in imports:
+            print(f"{seconds * 1000:>10.1f}  {module}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "samples": args.samples,
+                "median_ms": report,
+                "top_imports_ms": [[module, round(seconds * 1000, 2)] for seconds, module in imports]
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
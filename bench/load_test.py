@@ -0,0 +1,337 @@
+"""Offline load test for the Excusify HTTP API.
+
+Starts the stub upstreams from bench/stub_server.py and, unless --target
+points at an already running server, an in-process copy of app.py wired
+to them with throwaway databases. Worker threads then drive the selected
+endpoints for a fixed duration. The report gives throughput, error counts
+and p50/p95/p99 latency per endpoint.
+
+    python bench/load_test.py --concurrency 16 --duration 30
+    python bench/load_test.py --endpoints generate,proof_doctor_note --error-rate 0.05 \\
+        --burst-every 10 --burst-length 2 --json results.json
+
+Proof and speech timings cover the whole job: the POST, polling the status
+URL until it is done, and downloading the file. Generated proofs and audio
+go to the app's usual directories, where the file store quotas apply.
+generate_stream times the whole event stream; its time to the first
+partial excuse is reported separately as generate_stream_first_delta.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from bench.stub_server import add_behaviour_arguments, behaviours_from_args, make_stub_server  # noqa: E402
+
+SCENARIOS = ["late for work", "missed class", "forgot anniversary", "missed deadline", "didn't text back"]
+ROLES = ["employee", "student", "friend", "parent"]
+RECIPIENTS = ["boss", "teacher", "friend", "partner"]
+LANGUAGES = ["en", "es", "fr", "de"]
+POLL_INTERVAL = 0.05
+JOB_TIMEOUT = 120
+
+
+class BenchFailure(Exception):
+    pass
+
+
+def random_params():
+    return {
+        "scenario": random.choice(SCENARIOS),
+        "user_role": random.choice(ROLES),
+        "recipient": random.choice(RECIPIENTS),
+        "urgency": random.choice(["high", "medium", "low"]),
+        "believability": str(random.randint(1, 10)),
+        "language": random.choice(LANGUAGES),
+    }
+
+
+def check(response, *expected):
+    if response.status_code not in expected:
+        raise BenchFailure(f"HTTP {response.status_code}")
+    return response
+
+
+def wait_for_job(session, base_url, status_url):
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while time.monotonic() < deadline:
+        status = check(session.get(base_url + status_url), 200).json()
+        if status["status"] == "done":
+            return status
+        if status["status"] == "failed":
+            raise BenchFailure("job failed")
+        time.sleep(POLL_INTERVAL)
+    raise BenchFailure("job timed out")
+
+
+def op_generate(session, base_url):
+    check(session.post(f"{base_url}/generate", json=random_params()), 200)
+
+
+def op_generate_stream(session, base_url):
+    start = time.perf_counter()
+    first_delta = None
+    event = None
+    with session.post(f"{base_url}/generate_stream", json=random_params(), stream=True) as response:
+        check(response, 200)
+        for line in response.iter_lines():
+            line = line.decode("utf-8")
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                if event == "delta" and first_delta is None:
+                    first_delta = time.perf_counter() - start
+                elif event == "error":
+                    raise BenchFailure(f"stream error {json.loads(line[5:]).get('status')}")
+                elif event == "done":
+                    return {"generate_stream_first_delta": first_delta}
+    raise BenchFailure("stream ended early")
+
+
+def make_proof_op(proof_type):
+    def op(session, base_url):
+        params = random_params()
+        body = {"proof_type": proof_type, "scenario": params["scenario"], "excuse": random.choice(SCENARIOS)}
+        job = check(session.post(f"{base_url}/generate_proof/bench-{random.getrandbits(32):x}", json=body), 202).json()
+        status = wait_for_job(session, base_url, job["status_url"])
+        check(session.get(base_url + status["proof_url"]), 200)
+    return op
+
+
+def op_proof_bundle(session, base_url):
+    params = random_params()
+    body = {"scenario": params["scenario"], "excuse": random.choice(SCENARIOS)}
+    response = check(session.post(f"{base_url}/generate_proof_bundle/bench-{random.getrandbits(32):x}", json=body), 200)
+    if not response.content.startswith(b"PK"):
+        raise BenchFailure("not a zip archive")
+
+
+def op_speak(session, base_url):
+    # A small vocabulary so some requests hit stored audio, as repeated excuses do in practice
+    text = f"{random.choice(SCENARIOS)} excuse number {random.randint(1, 50)}"
+    response = check(session.post(f"{base_url}/speak_excuse", json={"excuse": text, "language": "en"}), 200, 202)
+    data = response.json()
+    if response.status_code == 202:
+        wait_for_job(session, base_url, data["status_url"])
+    check(session.get(base_url + data["audio_url"]), 200)
+
+
+def op_insights(session, base_url):
+    check(session.get(f"{base_url}/insights"), 200)
+
+
+def op_save_excuse(session, base_url):
+    params = random_params()
+    body = {
+        "excuse_text": f"Bench excuse {random.getrandbits(48):x}",
+        "scenario": params["scenario"],
+        "user_role": params["user_role"],
+        "recipient": params["recipient"],
+        "language": params["language"],
+    }
+    check(session.post(f"{base_url}/save_excuse", json=body), 201)
+
+
+def op_list_saved(session, base_url):
+    page = check(session.get(f"{base_url}/get_saved_excuses", params={"limit": 20}), 200).json()
+    if page["next_cursor"]:
+        check(session.get(f"{base_url}/get_saved_excuses", params={"limit": 20, "cursor": page["next_cursor"]}), 200)
+
+
+def op_save_and_delete(session, base_url):
+    saved = check(session.post(f"{base_url}/save_excuse", json={"excuse_text": "Bench excuse to delete"}), 201).json()
+    check(session.delete(f"{base_url}/delete_saved_excuse/{saved['id']}"), 200)
+
+
+OPERATIONS = {
+    "generate": op_generate,
+    "generate_stream": op_generate_stream,
+    "proof_doctor_note": make_proof_op("doctor_note"),
+    "proof_chat_screenshot": make_proof_op("chat_screenshot"),
+    "proof_location_log": make_proof_op("location_log"),
+    "proof_bundle": op_proof_bundle,
+    "speak_excuse": op_speak,
+    "insights": op_insights,
+    "save_excuse": op_save_excuse,
+    "get_saved_excuses": op_list_saved,
+    "delete_saved_excuse": op_save_and_delete,
+}
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed, error=None):
+        with self._lock:
+            if error is None:
+                self.latencies.setdefault(name, []).append(elapsed)
+            else:
+                self.errors.setdefault(name, {}).setdefault(error, 0)
+                self.errors[name][error] += 1
+
+    def summary(self, wall_time):
+        report = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(name, []))
+            errors = self.errors.get(name, {})
+            report[name] = {
+                "ok": len(values),
+                "errors": sum(errors.values()),
+                "error_kinds": dict(errors),
+                "throughput_rps": round(len(values) / wall_time, 2) if wall_time else 0.0,
+                "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+            }
+        return report
+
+
+def worker(base_url, schedule, stop_at, recorder):
+    session = requests.Session()
+    for name in schedule:
+        if time.monotonic() >= stop_at:
+            break
+        start = time.perf_counter()
+        try:
+            # Operations may return extra named timings, such as the time to a stream's first event
+            extra = OPERATIONS[name](session, base_url)
+        except BenchFailure as e:
+            recorder.record(name, time.perf_counter() - start, str(e))
+        except requests.RequestException as e:
+            recorder.record(name, time.perf_counter() - start, type(e).__name__)
+        else:
+            recorder.record(name, time.perf_counter() - start)
+            for extra_name, elapsed in (extra or {}).items():
+                if elapsed is not None:
+                    recorder.record(extra_name, elapsed)
+
+
+def start_local_app(stub_url, workdir, disable_cache, rate_limit=False):
+    # app.py reads its configuration at import time, so the environment is set first
+    os.environ.setdefault("HUGGINGFACE_API_TOKEN", "bench")
+    os.environ["HF_API_URL"] = f"{stub_url}/models/stub"
+    os.environ["TTS_ENGINE"] = "bench.stub_server:StubTTSEngine"
+    os.environ["EXCUSIFY_TTS_STUB_URL"] = f"{stub_url}/tts"
+    os.environ["STATE_DB"] = os.path.join(workdir, "excusify_state.db")
+    os.environ["SAVED_EXCUSES_DB"] = os.path.join(workdir, "saved_excuses.db")
+    os.environ["RATE_LIMIT_DB"] = os.path.join(workdir, "excusify_ratelimit.db")
+    # Every worker here is the same client, so the per-client limits would measure only themselves
+    os.environ["RATE_LIMIT_ENABLED"] = "true" if rate_limit else "false"
+    # Injected upstream failures are expected and counted in the report; keep them out of the output
+    os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+    if disable_cache:
+        os.environ["EXCUSE_CACHE_MAX_KEYS"] = "0"
+        os.environ["EXCUSE_POOL_SIZE"] = "0"
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def print_report(report, wall_time, concurrency):
+    print(f"\n{wall_time:.1f}s wall time, {concurrency} workers\n")
+    header = f"{'endpoint':<28}{'ok':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, row in report.items():
+        print(f"{name:<28}{row['ok']:>8}{row['errors']:>8}{row['throughput_rps']:>9}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+        for kind, count in row["error_kinds"].items():
+            print(f"    {count} x {kind}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", help="base URL of a running app (default: start one in-process against the stubs)")
+    parser.add_argument("--stub-port", type=int, default=0, help="port for the stub upstreams (default: any free port)")
+    parser.add_argument("--endpoints", default=",".join(OPERATIONS), help=f"comma-separated subset of: {', '.join(OPERATIONS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to drive load")
+    parser.add_argument("--no-cache", action="store_true", help="disable the excuse cache and pool so every /generate reaches the stub")
+    parser.add_argument("--rate-limit", action="store_true", help="keep per-client rate limiting on; refused requests count as HTTP 429 errors")
+    parser.add_argument("--seed", type=int, help="random seed for request parameters and stub behaviour")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in names if name not in OPERATIONS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    inference, tts = behaviours_from_args(args)
+    stub = make_stub_server("127.0.0.1", args.stub_port, inference, tts)
+    threading.Thread(target=stub.serve_forever, name="bench-stub", daemon=True).start()
+    stub_url = f"http://127.0.0.1:{stub.server_port}"
+
+    app_server = None
+    with tempfile.TemporaryDirectory(prefix="excusify-bench-") as workdir:
+        if args.target:
+            base_url = args.target.rstrip("/")
+            print(f"Driving {base_url}; start it with HF_API_URL={stub_url}/models/stub, "
+                  f"TTS_ENGINE=bench.stub_server:StubTTSEngine and EXCUSIFY_TTS_STUB_URL={stub_url}/tts")
+        else:
+            base_url, app_server = start_local_app(stub_url, workdir, args.no_cache, args.rate_limit)
+            print(f"Started app at {base_url} against stubs at {stub_url}")
+
+        recorder = Recorder()
+        started = time.monotonic()
+        stop_at = started + args.duration
+        threads = []
+        for index in range(args.concurrency):
+            # Each worker cycles through the endpoints from a different offset so the mix stays even
+            offset = index % len(names)
+            schedule = itertools.cycle(names[offset:] + names[:offset])
+            thread = threading.Thread(target=worker, args=(base_url, schedule, stop_at, recorder), name=f"bench-{index}")
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        wall_time = time.monotonic() - started
+
+        if app_server is not None:
+            app_server.shutdown()
+    stub.shutdown()
+
+    report = recorder.summary(wall_time)
+    print_report(report, wall_time, args.concurrency)
+    print(f"\nStub upstream outcomes: inference={dict(inference.counts)} tts={dict(tts.counts)}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"wall_time_s": round(wall_time, 2), "concurrency": args.concurrency, "endpoints": report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
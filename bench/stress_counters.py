@@ -0,0 +1,154 @@
+"""Stress test for the sharded insight counters.
+
+Hammers ShardedCounter and StateStore.record_excuse/flush from many
+threads, including short-lived ones whose shards are retired mid-run and
+two StateStore instances flushing into one database like two worker
+processes, then checks that no update was lost or counted twice.
+tests/test_counters.py checks the same invariants on a small load as
+part of the test suite; this script is for long runs at higher counts.
+
+    python bench/stress_counters.py --threads 32 --per-thread 2000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+WORKDIR = tempfile.mkdtemp(prefix="excusify-stress-")
+# app.py reads its configuration at import time
+os.environ["STATE_DB"] = os.path.join(WORKDIR, "excusify_state.db")
+os.environ["SAVED_EXCUSES_DB"] = os.path.join(WORKDIR, "saved_excuses.db")
+os.environ["RATE_LIMIT_DB"] = os.path.join(WORKDIR, "excusify_ratelimit.db")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+import app  # noqa: E402
+
+SCENARIOS = app.VALID_SCENARIOS
+
+
+def run_threads(count, target, *args):
+    threads = [threading.Thread(target=target, args=(index,) + args) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def stress_sharded_counter(threads, per_thread, waves):
+    counter = app.ShardedCounter()
+    stop = threading.Event()
+    regressions = []
+
+    def reader():
+        # Totals only ever grow while shards are being retired and folded
+        last = 0
+        while not stop.is_set():
+            total = sum(counter.snapshot().values())
+            if total < last:
+                regressions.append((last, total))
+            last = total
+
+    def writer(index):
+        key = SCENARIOS[index % len(SCENARIOS)]
+        for _ in range(per_thread):
+            counter.incr(key)
+            counter.incr("all")
+
+    reading = threading.Thread(target=reader)
+    reading.start()
+    started = time.perf_counter()
+    for _ in range(waves):
+        run_threads(threads, writer)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    reading.join()
+
+    totals = counter.snapshot()
+    expected_all = threads * per_thread * waves
+    assert totals["all"] == expected_all, f"lost updates: {totals['all']} != {expected_all}"
+    for offset, scenario in enumerate(SCENARIOS):
+        writers = len(range(offset, threads, len(SCENARIOS)))
+        assert totals.get(scenario, 0) == writers * per_thread * waves, f"wrong total for {scenario!r}"
+    assert not regressions, f"snapshot went backwards {len(regressions)} times, e.g. {regressions[0]}"
+    # Every writer and the reader have exited, so their shards must have been folded away
+    counter.snapshot()
+    live_shards = len(counter._shards)
+    assert live_shards == 0, f"{live_shards} shards kept after {threads * waves} threads exited"
+    print(f"ShardedCounter: {expected_all * 2} increments from {threads * waves} threads in {elapsed:.2f}s, "
+          f"{live_shards} live shards, totals exact")
+
+
+def stress_state_store(threads, per_thread):
+    db_path = os.path.join(WORKDIR, "stress_state.db")
+    # Two stores on one file stand in for two worker processes
+    stores = [app.StateStore(db_path, retention_days=30, max_excuses=10 ** 9) for _ in range(2)]
+    stop = threading.Event()
+    flush_errors = []
+
+    def flusher(store):
+        while not stop.is_set():
+            try:
+                store.flush()
+            except Exception as e:
+                flush_errors.append(e)
+            time.sleep(0.005)
+
+    def writer(index):
+        store = stores[index % len(stores)]
+        scenario = SCENARIOS[index % len(SCENARIOS)]
+        when = datetime(2024, 1, 1 + index % 28, index % 24)
+        for number in range(per_thread):
+            store.record_excuse(str(uuid.uuid4()), f"excuse {index}-{number % 50}", scenario, "employee", "boss", 5, when)
+
+    flushers = [threading.Thread(target=flusher, args=(store,)) for store in stores]
+    for thread in flushers:
+        thread.start()
+    started = time.perf_counter()
+    run_threads(threads, writer)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in flushers:
+        thread.join()
+    for store in stores:
+        store.flush()
+
+    assert not flush_errors, f"flush failed: {flush_errors[0]!r}"
+    expected = threads * per_thread
+    for store in stores:
+        assert store.total_generated() == expected, f"hour counts {store.total_generated()} != {expected}"
+        scenarios = {row["scenario"]: row["count"] for row in store.frequent_scenarios()}
+        assert sum(scenarios.values()) == expected, f"scenario counts {sum(scenarios.values())} != {expected}"
+    conn = stores[0]._connect()
+    for table in ("scenario_counts", "daily_counts", "hour_counts"):
+        flushed = conn.execute(f"SELECT SUM(count) FROM {table}").fetchone()[0]
+        assert flushed == expected, f"{table} holds {flushed}, expected {expected}"
+    rows = conn.execute("SELECT COUNT(*) FROM excuses").fetchone()[0]
+    assert rows == expected, f"{rows} excuse rows, expected {expected}"
+    print(f"StateStore: {expected} excuses recorded by {threads} threads through 2 stores in {elapsed:.2f}s, "
+          f"counters exact after flush")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--per-thread", type=int, default=2000, help="counter increments per thread; StateStore writes use a tenth")
+    parser.add_argument("--waves", type=int, default=5, help="rounds of short-lived counter threads")
+    args = parser.parse_args()
+
+    try:
+        stress_sharded_counter(args.threads, args.per_thread, args.waves)
+        stress_state_store(args.threads, max(1, args.per_thread // 10))
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Local stand-ins for the Hugging Face inference API and text-to-speech.
+
+Lets app.py run without network access for benchmarks and load tests.
+Both endpoints take configurable latency, error rate and periodic 429
+bursts. Inference requests with "stream": true are answered token by token
+as server-sent events, like the real API's streaming mode:
+
+    python bench/stub_server.py --port 8765 --latency-ms 400 --error-rate 0.02 \\
+        --burst-every 30 --burst-length 3
+
+then start the app against it:
+
+    HF_API_URL=http://127.0.0.1:8765/models/stub \\
+    TTS_ENGINE=bench.stub_server:StubTTSEngine \\
+    EXCUSIFY_TTS_STUB_URL=http://127.0.0.1:8765/tts python app.py
+
+bench/load_test.py does all of this itself when no --target is given.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+STUB_EXCUSES = [
+    "My train was held outside the station for forty minutes because of a signal failure.",
+    "The building's water main burst this morning and I had to wait for the plumber.",
+    "My laptop crashed during an update and took the draft with it; IT is restoring it now.",
+    "I woke up with a migraine and could barely look at a screen until noon.",
+    "My phone died overnight, so my alarm never went off and I missed your messages.",
+    "There was a multi-car accident on the ring road and traffic did not move for an hour.",
+]
+
+# A few hundred bytes that start like an MPEG audio frame; the app only stores and serves them
+STUB_AUDIO = b"\xff\xfb\x90\x64" + bytes(412)
+
+
+class StubBehaviour:
+    """Latency and failure profile for one stubbed upstream."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, burst_every=0.0, burst_length=0.0,
+                 first_token_share=0.2):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        # Streamed responses wait this share of the latency before the first token, the rest between tokens
+        self.first_token_share = first_token_share
+        self.started = time.monotonic()
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def _count(self, outcome):
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    def in_burst(self):
+        if self.burst_every <= 0 or self.burst_length <= 0:
+            return False
+        return (time.monotonic() - self.started) % self.burst_every < self.burst_length
+
+    def outcome(self, share=1.0):
+        """Sleep for `share` of the simulated latency, then return 'ok', 'rate_limited' or 'error'."""
+        if self.in_burst():
+            # Rate limiters answer immediately
+            self._count("rate_limited")
+            return "rate_limited"
+        delay = (self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) * share
+        if delay > 0:
+            time.sleep(delay / 1000)
+        result = "error" if random.random() < self.error_rate else "ok"
+        self._count(result)
+        return result
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set by make_stub_server
+    inference = None
+    tts = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload).encode("utf-8"), headers=headers)
+
+    def _send_failure(self, outcome, behaviour):
+        if outcome == "rate_limited":
+            retry_after = max(1, int(behaviour.burst_length))
+            self._send_json(429, {"error": "Rate limit reached. Please retry later."}, {"Retry-After": str(retry_after)})
+        else:
+            self._send_json(503, {"error": "Model is currently loading", "estimated_time": 20.0})
+
+    def _stream_tokens(self, text, token_delay):
+        # text-generation-inference style: one "data:" event per token, the full text on the last one
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        tokens = re.findall(r"\s*\S+", text)
+        for index, token in enumerate(tokens):
+            if token_delay > 0:
+                time.sleep(token_delay)
+            last = index == len(tokens) - 1
+            event = {
+                "token": {"id": index, "text": token, "logprob": 0.0, "special": False},
+                "generated_text": text if last else None,
+                "details": None
+            }
+            try:
+                self.wfile.write(f"data:{json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading, e.g. after a translation label
+                return
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "Invalid JSON."})
+            return
+
+        if self.path.startswith("/tts"):
+            outcome = self.tts.outcome()
+            if outcome != "ok":
+                self._send_failure(outcome, self.tts)
+                return
+            self._send(200, STUB_AUDIO, content_type="audio/mpeg")
+            return
+
+        stream = isinstance(payload, dict) and bool(payload.get("stream"))
+        share = self.inference.first_token_share if stream else 1.0
+        outcome = self.inference.outcome(share)
+        if outcome != "ok":
+            self._send_failure(outcome, self.inference)
+            return
+        if stream:
+            # Streaming mode only sends the new tokens, not the prompt
+            text = f"Excuse: \"{random.choice(STUB_EXCUSES)}\""
+            token_count = len(text.split())
+            self._stream_tokens(text, self.inference.latency_ms * (1 - share) / 1000 / token_count)
+            return
+        # Same shape as the real API, including the echoed prompt and a filler prefix to clean
+        prompt = payload.get("inputs", "") if isinstance(payload, dict) else ""
+        generated = f"{prompt} Excuse: \"{random.choice(STUB_EXCUSES)}\""
+        self._send_json(200, [{"generated_text": generated}])
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, {"inference": dict(self.inference.counts), "tts": dict(self.tts.counts)})
+            return
+        self._send_json(404, {"error": "Not found."})
+
+
+def make_stub_server(host, port, inference, tts):
+    handler = type("BoundStubHandler", (StubHandler,), {"inference": inference, "tts": tts})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class StubTTSEngine:
+    """TTS engine for TTS_ENGINE=bench.stub_server:StubTTSEngine, backed by the stub's /tts route."""
+
+    name = "stub"
+
+    def __init__(self):
+        self.url = os.getenv("EXCUSIFY_TTS_STUB_URL", "http://127.0.0.1:8765/tts")
+        self._session = requests.Session()
+
+    def synthesize(self, text, language, path):
+        response = self._session.post(self.url, json={"text": text, "lang": language}, timeout=30)
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            f.write(response.content)
+
+
+def add_behaviour_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="mean inference latency")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="uniform +/- jitter on inference latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of inference calls answered with 503")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="seconds between 429 bursts (0 disables)")
+    parser.add_argument("--burst-length", type=float, default=0.0, help="seconds each 429 burst lasts")
+    parser.add_argument("--first-token-share", type=float, default=0.2,
+                        help="share of the inference latency spent before the first streamed token")
+    parser.add_argument("--tts-latency-ms", type=float, default=150.0, help="mean text-to-speech latency")
+    parser.add_argument("--tts-error-rate", type=float, default=0.0, help="fraction of TTS calls answered with 503")
+
+
+def behaviours_from_args(args):
+    inference = StubBehaviour(args.latency_ms, args.jitter_ms, args.error_rate, args.burst_every, args.burst_length,
+                              args.first_token_share)
+    tts = StubBehaviour(args.tts_latency_ms, args.tts_latency_ms / 3, args.tts_error_rate, args.burst_every, args.burst_length)
+    return inference, tts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    inference, tts = behaviours_from_args(args)
+    server = make_stub_server(args.host, args.port, inference, tts)
+    print(f"Stub inference API: http://{args.host}:{args.port}/models/stub")
+    print(f"Stub TTS endpoint:  http://{args.host}:{args.port}/tts")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
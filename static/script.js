@@ -72,11 +72,13 @@ async function speakExcuse() {
     });
 
     if (!response.ok) {
-      const errorText = await response.text();
-      throw new Error(`HTTP error! Status: ${response.status} - ${errorText}`);
+      throw await httpError(response);
     }
 
-    const data = await response.json();
+    let data = await response.json();
+    if (data.status === 'pending') {
+      data = await waitForJob(data.status_url, 300);
+    }
     const audioUrl = data.audio_url;
 
     if (audioUrl) {
@@ -90,7 +92,7 @@ async function speakExcuse() {
     }
   } catch (error) {
     console.error('Error generating or playing audio:', error);
-    alert('Error generating or playing audio. Please try again.');
+    alert(slowDownMessage(error) || 'Error generating or playing audio. Please try again.');
   } finally {
     speakExcuseBtn.innerHTML = originalButtonHtml;
     speakExcuseBtn.disabled = false;
@@ -127,26 +129,22 @@ async function generateExcuse() {
   generateExcuseBtn.innerHTML =
     '<div class="spinner spinner-small"></div> Generating...';
 
-  try {
-    const response = await fetch('/generate', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        scenario,
-        user_role,
-        recipient,
-        urgency,
-        believability,
-        language,
-      }),
-    });
+  const params = {
+    scenario,
+    user_role,
+    recipient,
+    urgency,
+    believability,
+    language,
+  };
 
-    if (!response.ok) {
-      const errorText = await response.text();
-      throw new Error(`HTTP error! status: ${response.status} - ${errorText}`);
+  try {
+    // Partial text is shown while the model is still writing; /generate is
+    // the fallback for browsers or servers without streaming
+    let data = await streamExcuse(params, showPartialExcuse);
+    if (!data) {
+      data = await requestExcuse(params);
     }
-
-    const data = await response.json();
     console.log('Excuse response:', data);
 
     currentExcuseId = data.excuse_id;
@@ -164,7 +162,7 @@ async function generateExcuse() {
     fetchInsights();
   } catch (error) {
     excuseOutputDiv.classList.remove('generating');
-    excuseOutputDiv.innerHTML = `<p class="error-message">Error: Failed to generate excuse. Please try again.</p>`;
+    excuseOutputDiv.innerHTML = `<p class="error-message">${slowDownMessage(error) || 'Error: Failed to generate excuse. Please try again.'}</p>`;
     console.error('Excuse generation error:', error);
   } finally {
     generateExcuseBtn.disabled = false;
@@ -172,6 +170,114 @@ async function generateExcuse() {
   }
 }
 
+// An Error for a failed response; 429s carry the server's Retry-After seconds
+async function httpError(response) {
+  const errorText = await response.text();
+  const error = new Error(`HTTP error! status: ${response.status} - ${errorText}`);
+  if (response.status === 429) {
+    error.retryAfter = Number(response.headers.get('Retry-After')) || null;
+  }
+  return error;
+}
+
+function slowDownMessage(error) {
+  if (!error || !error.retryAfter) {
+    return null;
+  }
+  return `You're going a bit fast. Please try again in ${error.retryAfter} seconds.`;
+}
+
+async function requestExcuse(params) {
+  const response = await fetch('/generate', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(params),
+  });
+
+  if (!response.ok) {
+    throw await httpError(response);
+  }
+
+  return response.json();
+}
+
+// Reads the server-sent events of /generate_stream, calling onText with the
+// excuse so far. Resolves with the final { excuse, excuse_id, source } from the
+// "done" event, or with null when streaming is unavailable.
+async function streamExcuse(params, onText) {
+  if (!window.ReadableStream || !window.TextDecoder) {
+    return null;
+  }
+
+  const response = await fetch('/generate_stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(params),
+  });
+
+  if (response.status === 404 || response.status === 405 || !response.body) {
+    return null;
+  }
+  if (!response.ok) {
+    throw await httpError(response);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let text = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const { event, data } = parseSseEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+
+      if (event === 'delta') {
+        text += data.text;
+        onText(text);
+      } else if (event === 'done') {
+        reader.cancel();
+        return data;
+      } else if (event === 'error') {
+        reader.cancel();
+        const error = new Error(`Stream error! status: ${data.status} - ${data.error}`);
+        if (data.status === 429) {
+          error.retryAfter = data.retry_after || null;
+        }
+        throw error;
+      }
+    }
+  }
+  throw new Error('Excuse stream ended before the excuse was complete.');
+}
+
+function parseSseEvent(block) {
+  let event = 'message';
+  const dataLines = [];
+  block.split('\n').forEach((line) => {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trimStart());
+    }
+  });
+  // Comment-only blocks (keep-alives) carry no data
+  return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+}
+
+function showPartialExcuse(text) {
+  excuseOutputDiv.classList.remove('generating');
+  excuseOutputDiv.innerHTML = '<b>Excuse:</b> ';
+  // Appended as a text node: the model's partial output is not trusted as HTML
+  excuseOutputDiv.append(text);
+}
+
 async function generateProof() {
   if (!currentExcuseId || !currentScenario || !currentExcuseText) {
     proofOutputDiv.style.display = 'block';
@@ -200,10 +306,10 @@ async function generateProof() {
       }),
     });
     if (!response.ok) {
-      const errorText = await response.text();
-      throw new Error(`HTTP error! status: ${response.status} - ${errorText}`);
+      throw await httpError(response);
     }
-    const data = await response.json();
+    const job = await response.json();
+    const data = await waitForJob(job.status_url);
     console.log('Proof response:', data);
     if (data.error) {
       proofOutputDiv.innerHTML = `<p class="error-message">Error: ${data.error}</p>`;
@@ -227,7 +333,7 @@ async function generateProof() {
 
     proofOutputDiv.innerHTML = downloadMessage;
   } catch (error) {
-    proofOutputDiv.innerHTML = `<p class="error-message">Error: Failed to generate proof. Please try again.</p>`;
+    proofOutputDiv.innerHTML = `<p class="error-message">${slowDownMessage(error) || 'Error: Failed to generate proof. Please try again.'}</p>`;
     console.error('Proof generation error:', error);
   } finally {
     generateProofBtn.disabled = false;
@@ -235,6 +341,23 @@ async function generateProof() {
   }
 }
 
+// Poll a queued server job (proof or audio) until it reports done or failed
+async function waitForJob(statusUrl, intervalMs = 500, timeoutMs = 120000) {
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    const response = await fetch(statusUrl);
+    if (!response.ok) {
+      throw await httpError(response);
+    }
+    const job = await response.json();
+    if (job.status === 'done' || job.status === 'failed') {
+      return job;
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+  throw new Error('Timed out waiting for the server to finish.');
+}
+
 // Function to submit feedback
 async function submitFeedback(isEffective) {
   if (!currentExcuseId) {
@@ -370,22 +493,39 @@ async function saveExcuse() {
   }
 }
 
-async function loadSavedExcuses() {
+// Saved excuses are fetched one page at a time; "Load More" follows the server cursor
+let loadedSavedExcuses = [];
+
+async function loadSavedExcuses(cursor = null) {
   try {
-    const response = await fetch('/get_saved_excuses');
-    const savedExcuses = await response.json();
+    const url = cursor
+      ? `/get_saved_excuses?cursor=${encodeURIComponent(cursor)}`
+      : '/get_saved_excuses';
+    const response = await fetch(url);
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP error! Status: ${response.status} - ${errorText}`);
+    }
+    const page = await response.json();
 
-    savedExcusesList.innerHTML = '';
+    if (!cursor) {
+      loadedSavedExcuses = [];
+      savedExcusesList.innerHTML = '';
+    }
+    const existingLoadMore = document.getElementById('loadMoreSavedBtn');
+    if (existingLoadMore) {
+      existingLoadMore.remove();
+    }
 
-    if (savedExcuses.length === 0) {
+    if (!cursor && page.items.length === 0) {
       savedExcusesList.innerHTML =
         '<p>No saved excuses yet. Generate and save one!</p>';
       return;
     }
 
-    savedExcuses.sort((a, b) => new Date(b.saved_at) - new Date(a.saved_at));
+    loadedSavedExcuses = loadedSavedExcuses.concat(page.items);
 
-    savedExcuses.forEach((excuse) => {
+    page.items.forEach((excuse) => {
       const excuseDiv = document.createElement('div');
       excuseDiv.classList.add('saved-excuse-item');
       const savedDate = new Date(excuse.saved_at);
@@ -412,20 +552,29 @@ async function loadSavedExcuses() {
                     }">Delete</button>
                 </div>
             `;
+      excuseDiv
+        .querySelector('.use-saved-btn')
+        .addEventListener('click', (event) =>
+          useSavedExcuse(event.target.dataset.id, loadedSavedExcuses)
+        );
+      excuseDiv
+        .querySelector('.delete-saved-btn')
+        .addEventListener('click', (event) =>
+          deleteSavedExcuse(event.target.dataset.id)
+        );
       savedExcusesList.appendChild(excuseDiv);
     });
 
-    document.querySelectorAll('.use-saved-btn').forEach((button) => {
-      button.addEventListener('click', (event) =>
-        useSavedExcuse(event.target.dataset.id, savedExcuses)
+    if (page.next_cursor) {
+      const loadMoreBtn = document.createElement('button');
+      loadMoreBtn.id = 'loadMoreSavedBtn';
+      loadMoreBtn.classList.add('btn', 'btn-primary');
+      loadMoreBtn.textContent = 'Load More';
+      loadMoreBtn.addEventListener('click', () =>
+        loadSavedExcuses(page.next_cursor)
       );
-    });
-
-    document.querySelectorAll('.delete-saved-btn').forEach((button) => {
-      button.addEventListener('click', (event) =>
-        deleteSavedExcuse(event.target.dataset.id)
-      );
-    });
+      savedExcusesList.appendChild(loadMoreBtn);
+    }
   } catch (error) {
     console.error('Error loading saved excuses:', error);
     savedExcusesList.innerHTML =
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Keep any SQLite store a test opens through app out of the working tree
+_STATE_DIR = tempfile.mkdtemp(prefix="excusify-tests-")
+for _name, _file in (("STATE_DB", "state.db"), ("SAVED_EXCUSES_DB", "saved.db"), ("RATE_LIMIT_DB", "ratelimit.db")):
+    os.environ.setdefault(_name, os.path.join(_STATE_DIR, _file))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
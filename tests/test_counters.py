@@ -0,0 +1,139 @@
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app import VALID_SCENARIOS, ShardedCounter, StateStore
+
+THREADS = 16
+PER_THREAD = 500
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_sharded_counter_keeps_every_increment():
+    counter = ShardedCounter()
+
+    def writer(index):
+        for _ in range(PER_THREAD):
+            counter.incr("all")
+            counter.incr(index % 3, 2)
+
+    run_threads(THREADS, writer)
+    totals = counter.snapshot()
+    assert totals["all"] == THREADS * PER_THREAD
+    for key in range(3):
+        assert totals[key] == 2 * PER_THREAD * len(range(key, THREADS, 3))
+
+
+def test_sharded_counter_folds_shards_of_exited_threads():
+    counter = ShardedCounter()
+    stop = threading.Event()
+    regressions = []
+
+    def reader():
+        last = 0
+        while not stop.is_set():
+            total = counter.snapshot().get("all", 0)
+            if total < last:
+                regressions.append((last, total))
+            last = total
+
+    def writer(index):
+        for _ in range(PER_THREAD // 10):
+            counter.incr("all")
+
+    reading = threading.Thread(target=reader)
+    reading.start()
+    waves = 5
+    for _ in range(waves):
+        run_threads(THREADS, writer)
+    stop.set()
+    reading.join()
+
+    assert counter.snapshot()["all"] == waves * THREADS * (PER_THREAD // 10)
+    assert not regressions
+    # Every writer and the reader have exited, so no shard may be left behind
+    assert counter._shards == {}
+
+
+@pytest.fixture
+def state_db(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def record_from_threads(stores, per_thread):
+    def writer(index):
+        store = stores[index % len(stores)]
+        scenario = VALID_SCENARIOS[index % len(VALID_SCENARIOS)]
+        when = datetime(2024, 1, 1 + index % 28, index % 24)
+        for number in range(per_thread):
+            store.record_excuse(str(uuid.uuid4()), f"excuse {index}-{number % 5}", scenario, "employee", "boss", 5, when)
+
+    run_threads(THREADS, writer)
+
+
+def flushed_totals(store):
+    conn = store._connect()
+    return {table: conn.execute(f"SELECT COALESCE(SUM(count), 0) FROM {table}").fetchone()[0]
+            for table in ("scenario_counts", "daily_counts", "hour_counts")}
+
+
+def test_state_store_flushed_totals_match_memory(state_db):
+    store = StateStore(state_db, retention_days=30, max_excuses=10 ** 9)
+    per_thread = 20
+    expected = THREADS * per_thread
+    record_from_threads([store], per_thread)
+
+    in_memory = {row["scenario"]: row["count"] for row in store.frequent_scenarios()}
+    assert store.total_generated() == expected
+    assert flushed_totals(store) == {"scenario_counts": 0, "daily_counts": 0, "hour_counts": 0}
+
+    store.flush()
+    assert flushed_totals(store) == {"scenario_counts": expected, "daily_counts": expected, "hour_counts": expected}
+    assert {row["scenario"]: row["count"] for row in store.frequent_scenarios()} == in_memory
+    assert store.total_generated() == expected
+    # A second flush has nothing left to add
+    store.flush()
+    assert flushed_totals(store)["hour_counts"] == expected
+
+
+def test_state_stores_flushing_concurrently_lose_nothing(state_db):
+    # Two stores on one file stand in for two worker processes
+    stores = [StateStore(state_db, retention_days=30, max_excuses=10 ** 9) for _ in range(2)]
+    stop = threading.Event()
+    errors = []
+
+    def flusher(store):
+        while not stop.is_set():
+            try:
+                store.flush()
+            except Exception as e:
+                errors.append(e)
+            stop.wait(0.005)
+
+    flushers = [threading.Thread(target=flusher, args=(store,)) for store in stores]
+    for thread in flushers:
+        thread.start()
+    per_thread = 20
+    record_from_threads(stores, per_thread)
+    stop.set()
+    for thread in flushers:
+        thread.join()
+    for store in stores:
+        store.flush()
+
+    expected = THREADS * per_thread
+    assert not errors
+    assert flushed_totals(stores[0]) == {"scenario_counts": expected, "daily_counts": expected, "hour_counts": expected}
+    for store in stores:
+        assert store.total_generated() == expected
+        assert sum(row["count"] for row in store.frequent_scenarios()) == expected
+    assert stores[0]._connect().execute("SELECT COUNT(*) FROM excuses").fetchone()[0] == expected
@@ -0,0 +1,45 @@
+import json
+import os
+
+import pytest
+
+from app import IncrementalCleaner, get_output_cleaner
+from bench.bench_cleaning import legacy_clean
+
+with open(os.path.join(os.path.dirname(__file__), "data", "model_outputs.json"), encoding="utf-8") as f:
+    RECORDED = json.load(f)
+
+
+def case_id(case):
+    return f"{case['language']}:{case.get('proof_type') or 'excuse'}"
+
+
+@pytest.mark.parametrize("case", RECORDED, ids=case_id)
+def test_clean_recorded_output(case):
+    cleaner = get_output_cleaner(case["language"], case.get("proof_type"))
+    assert cleaner.clean(case["raw"]) == case["expected"]
+
+
+@pytest.mark.parametrize("case", [c for c in RECORDED if c["language"] == "en" and not c.get("proof_type")], ids=case_id)
+def test_english_cleaning_matches_legacy(case):
+    assert get_output_cleaner("en").clean(case["raw"]) == legacy_clean(case["raw"])
+
+
+@pytest.mark.parametrize("case", RECORDED, ids=case_id)
+def test_streamed_cleaning_matches_clean(case):
+    cleaner = get_output_cleaner(case["language"], case.get("proof_type"))
+    incremental = IncrementalCleaner(cleaner)
+    # Streamed responses carry only the completion, not the echoed prompt
+    raw = case["raw"].split("[/INST]", 1)[-1]
+    streamed = "".join(incremental.feed(raw[i:i + 3]) for i in range(0, len(raw), 3))
+    assert incremental.result() == cleaner.clean(raw)
+    if not case.get("proof_type"):
+        # max_words only applies to the final result, so previews are checked for excuses only
+        assert incremental.result().startswith(streamed)
+
+
+def test_colon_without_prefix_is_kept():
+    cleaner = get_output_cleaner("en")
+    assert cleaner.clean(": I missed the bus.") == ": I missed the bus."
+    assert legacy_clean(": I missed the bus.") == ": I missed the bus."
+    assert cleaner.clean("Excuse: : I missed the bus.") == "I missed the bus."